@@ -4,21 +4,57 @@ Data analysis script for blackjack statistics
 Provides detailed analysis of collected game data
 """
 
-import sqlite3
 import json
 from datetime import datetime
 import argparse
+import os
+import tempfile
+import time
+import numpy as np
 from tabulate import tabulate
 
+from archive import HandArchive
+from database import (
+    HAND_CLASSES, Database, backup_snapshot, connect_readonly, enable_incremental_vacuum,
+    situation_outcomes, upcard_rank
+)
+from confidence import (
+    bootstrap_mean, bootstrap_proportions, bootstrap_ratio,
+    mean_interval, ratio_interval, wilson_interval
+)
+
+# Dealer upcard rank characters, in display order (X and face cards count as 10)
+UPCARD_RANKS = ['2', '3', '4', '5', '6', '7', '8', '9', 'X', 'A']
+TEN_RANKS = ('X', 'K', 'Q', 'J')
+
+def upcard_label(rank):
+    """Display label for an upcard rank; every table shows the ten-value rank as '10'"""
+    return '10' if rank == 'X' else rank
+
+def parse_upcard(text):
+    """Upcard rank for a --upcard argument (2-9, 10/J/Q/K/X, A), or None if it is not one"""
+    text = text.strip().upper()
+    if text == '10':
+        return 'X'
+    return upcard_rank(text) if len(text) == 1 else None
+
 class BlackjackAnalyzer:
-    def __init__(self, db_path='database/blackjack_data.db'):
+    def __init__(self, db_path='database/blackjack_data.db', resamples=2000, confidence=0.95, seed=None,
+                 archive_dir=None):
         self.db_path = db_path
+        self.archive = HandArchive(archive_dir) if archive_dir else None
+        self.resamples = resamples
+        self.confidence = confidence
+        self.seed = seed
     
     def analyze(self):
         """Run comprehensive analysis"""
-        conn = sqlite3.connect(self.db_path)
+        conn = connect_readonly(self.db_path)
         cursor = conn.cursor()
         
+        # One read transaction, so every section sees the same WAL snapshot
+        cursor.execute('BEGIN')
+        
         print("\n" + "="*60)
         print(" BLACKJACK DATA ANALYSIS")
         print("="*60)
@@ -26,6 +62,12 @@ class BlackjackAnalyzer:
         # Overall statistics
         self._print_overall_stats(cursor)
         
+        # Hands moved to cold storage
+        self._print_archive_stats()
+        
+        # Uncertainty of the headline numbers
+        self._print_confidence_intervals(cursor)
+        
         # Win/Loss breakdown
         self._print_outcome_breakdown(cursor)
         
@@ -54,15 +96,27 @@ class BlackjackAnalyzer:
             WHERE status IN ('WON', 'LOST', 'PUSHED', 'BLACKJACK')
         ''')
         
-        result = cursor.fetchone()
-        if result and result[0] > 0:
-            total, wins, losses, pushes, blackjacks, wagered, payout = result
+        total, wins, losses, pushes, blackjacks, wagered, payout = (value or 0 for value in cursor.fetchone())
+        
+        # Compacted hands left the hands table; count them with the live ones
+        archived = len(self.archive) if self.archive else 0
+        if archived:
+            status = self.archive.statuses()
+            total += archived
+            wins += int(np.count_nonzero((status == 'WON') | (status == 'BLACKJACK')))
+            losses += int(np.count_nonzero(status == 'LOST'))
+            pushes += int(np.count_nonzero(status == 'PUSHED'))
+            blackjacks += int(np.count_nonzero(status == 'BLACKJACK'))
+            wagered += int(self.archive.column('wager').sum())
+            payout += int(self.archive.column('payout').sum())
+        
+        if total > 0:
             win_rate = (wins / total * 100) if total > 0 else 0
             house_edge = ((wagered - payout) / wagered * 100) if wagered > 0 else 0
             
             print("\n### OVERALL STATISTICS ###")
             data = [
-                ['Total Hands', total],
+                ['Total Hands', f"{total} ({archived} archived)" if archived else total],
                 ['Wins', f"{wins} ({win_rate:.1f}%)"],
                 ['Losses', f"{losses} ({losses/total*100:.1f}%)"],
                 ['Pushes', f"{pushes} ({pushes/total*100:.1f}%)"],
@@ -74,6 +128,124 @@ class BlackjackAnalyzer:
             ]
             print(tabulate(data, headers=['Metric', 'Value'], tablefmt='grid'))
     
+    def load_hand_arrays(self, cursor):
+        """
+        Load finished hands from the live table and the archive into NumPy arrays
+        
+        Returns:
+            Dict of equal-length arrays: wager, net (result relative to the
+            wager, matching get_statistics), win (bool) and upcard (rank char,
+            face cards folded into 'X')
+        """
+        cursor.execute('''
+            SELECT wager_amount, payout, status, SUBSTR(dealer_cards, 3, 1) as upcard
+            FROM hands
+            WHERE status IN ('WON', 'LOST', 'PUSHED', 'BLACKJACK')
+        ''')
+        rows = cursor.fetchall()
+        n = len(rows)
+        
+        wagers, payouts, statuses, upcards = zip(*rows) if rows else ((), (), (), ())
+        wager = np.fromiter((w or 0 for w in wagers), dtype=np.int64, count=n)
+        payout = np.fromiter((p or 0 for p in payouts), dtype=np.int64, count=n)
+        status = np.array(statuses, dtype='U9')
+        upcard = np.array(['X' if u in TEN_RANKS else (u or '') for u in upcards], dtype='U1')
+        
+        # Archived hands are scanned straight from the memory-mapped columns
+        if self.archive and len(self.archive) > 0:
+            wager = np.concatenate((wager, self.archive.column('wager')))
+            payout = np.concatenate((payout, self.archive.column('payout')))
+            status = np.concatenate((status, self.archive.statuses()))
+            upcard = np.concatenate((upcard, self.archive.upcards()))
+        
+        win = (status == 'WON') | (status == 'BLACKJACK')
+        net = np.where(win, payout - wager, np.where(status == 'LOST', -wager, 0))
+        
+        return {'wager': wager, 'net': net, 'win': win, 'upcard': upcard}
+    
+    def _print_archive_stats(self):
+        """Print statistics for hands held in the columnar archive"""
+        if not self.archive or len(self.archive) == 0:
+            return
+        
+        status = self.archive.statuses()
+        wager = self.archive.column('wager')
+        payout = self.archive.column('payout')
+        timestamps = self.archive.column('timestamp')
+        total = len(status)
+        wins = int(np.count_nonzero((status == 'WON') | (status == 'BLACKJACK')))
+        losses = int(np.count_nonzero(status == 'LOST'))
+        pushes = int(np.count_nonzero(status == 'PUSHED'))
+        wagered = int(wager.sum())
+        paid = int(payout.sum())
+        
+        print("\n### ARCHIVED HANDS ###")
+        data = [
+            ['Archived Hands', total],
+            ['From', datetime.fromtimestamp(float(timestamps.min())).strftime('%Y-%m-%d')],
+            ['To', datetime.fromtimestamp(float(timestamps.max())).strftime('%Y-%m-%d')],
+            ['Wins', f"{wins} ({wins/total*100:.1f}%)"],
+            ['Losses', f"{losses} ({losses/total*100:.1f}%)"],
+            ['Pushes', f"{pushes} ({pushes/total*100:.1f}%)"],
+            ['Total Wagered', wagered],
+            ['Total Payout', paid],
+            ['Net Result', paid - wagered]
+        ]
+        print(tabulate(data, headers=['Metric', 'Value'], tablefmt='grid'))
+    
+    def _format_interval(self, interval, scale=1, digits=2):
+        """Format an interval dict as 'low .. high'"""
+        if not interval:
+            return 'n/a'
+        return f"{interval['low'] * scale:.{digits}f} .. {interval['high'] * scale:.{digits}f}"
+    
+    def _print_confidence_intervals(self, cursor):
+        """Print analytic and bootstrap confidence intervals for EV, ROI and win rate"""
+        hands = self.load_hand_arrays(cursor)
+        net, wager, win = hands['net'], hands['wager'], hands['win']
+        if len(net) < 2:
+            return
+        
+        level = f"{self.confidence * 100:g}%"
+        print(f"\n### CONFIDENCE INTERVALS ({level}, {self.resamples} resamples) ###")
+        
+        ev_boot = bootstrap_mean(net, self.resamples, self.confidence, self.seed)
+        roi_boot = bootstrap_ratio(net, wager, self.resamples, self.confidence, self.seed)
+        win_boot = bootstrap_mean(win, self.resamples, self.confidence, self.seed)
+        win_low, win_high = wilson_interval(win.sum(), len(win), self.confidence)
+        
+        data = [
+            ['EV per Hand', f"{net.mean():.3f}",
+             self._format_interval(mean_interval(net, self.confidence), digits=3),
+             self._format_interval(ev_boot, digits=3)],
+            ['ROI', f"{roi_boot['estimate'] * 100:.2f}%" if roi_boot else 'n/a',
+             self._format_interval(ratio_interval(net, wager, self.confidence), scale=100),
+             self._format_interval(roi_boot, scale=100)],
+            ['Win Rate', f"{win.mean() * 100:.2f}%",
+             f"{win_low * 100:.2f} .. {win_high * 100:.2f}",
+             self._format_interval(win_boot, scale=100)]
+        ]
+        print(tabulate(data, headers=['Metric', 'Estimate', 'Analytic CI', 'Bootstrap CI'], tablefmt='grid'))
+        
+        # Per-upcard win rates, all upcards resampled in one call
+        trials = np.array([np.count_nonzero(hands['upcard'] == rank) for rank in UPCARD_RANKS])
+        wins = np.array([np.count_nonzero(win & (hands['upcard'] == rank)) for rank in UPCARD_RANKS])
+        rates, boot_lows, boot_highs = bootstrap_proportions(wins, trials, self.resamples, self.confidence, self.seed)
+        wilson_lows, wilson_highs = wilson_interval(wins, trials, self.confidence)
+        
+        data = []
+        for i, rank in enumerate(UPCARD_RANKS):
+            if trials[i] > 0:
+                data.append([
+                    upcard_label(rank), trials[i], f"{rates[i] * 100:.1f}%",
+                    f"{wilson_lows[i] * 100:.1f} .. {wilson_highs[i] * 100:.1f}",
+                    f"{boot_lows[i] * 100:.1f} .. {boot_highs[i] * 100:.1f}"
+                ])
+        
+        if data:
+            print("\nWin Rate by Dealer Upcard:")
+            print(tabulate(data, headers=['Upcard', 'Hands', 'Win Rate', 'Wilson CI', 'Bootstrap CI'], tablefmt='grid'))
+    
     def _print_outcome_breakdown(self, cursor):
         """Print detailed outcome breakdown"""
         print("\n### OUTCOME BREAKDOWN ###")
@@ -100,53 +272,69 @@ class BlackjackAnalyzer:
             print("\nBy Player Hand Value:")
             print(tabulate(data, headers=['Value', 'Hands', 'Wins', 'Win Rate'], tablefmt='grid'))
     
+    def _dealer_pattern_rows(self, cursor):
+        """
+        (upcard, final_value, busted, count) rows from the dealer_patterns counters
+        
+        Databases that have not been opened by the current Database class yet
+        still carry the old, empty table; their counts are aggregated from hands.
+        """
+        columns = [row[1] for row in cursor.execute('PRAGMA table_info(dealer_patterns)')]
+        if 'formkey' in columns:
+            cursor.execute('''
+                SELECT upcard, final_value, busted, SUM(count)
+                FROM dealer_patterns
+                GROUP BY upcard, final_value
+            ''')
+        else:
+            cursor.execute('''
+                SELECT CASE WHEN SUBSTR(dealer_cards, 3, 1) IN ('K', 'Q', 'J') THEN 'X'
+                            ELSE SUBSTR(dealer_cards, 3, 1) END as upcard,
+                       dealer_value,
+                       dealer_value < 0 OR dealer_value > 21,
+                       COUNT(*)
+                FROM hands
+                WHERE status IN ('WON', 'LOST', 'PUSHED', 'BLACKJACK')
+                  AND dealer_value != 0
+                GROUP BY 1, 2
+            ''')
+        return cursor.fetchall()
+    
     def _print_dealer_patterns(self, cursor):
         """Print dealer pattern analysis"""
         print("\n### DEALER PATTERNS ###")
         
-        # Dealer bust rates by upcard
-        cursor.execute('''
-            SELECT 
-                SUBSTR(dealer_cards, 3, 2) as upcard,
-                COUNT(*) as hands,
-                SUM(CASE WHEN dealer_value < 0 OR dealer_value > 21 THEN 1 ELSE 0 END) as busts
-            FROM hands
-            WHERE status IN ('WON', 'LOST', 'PUSHED', 'BLACKJACK')
-                  AND dealer_cards != '["?"]'
-            GROUP BY upcard
-            ORDER BY upcard
-        ''')
+        # Per upcard: hands, busts, and count-weighted sum of standing totals
+        totals = {}
+        for upcard, final_value, busted, count in self._dealer_pattern_rows(cursor):
+            if upcard not in UPCARD_RANKS:
+                continue
+            hands, busts, standing, standing_sum = totals.get(upcard, (0, 0, 0, 0))
+            if busted:
+                busts += count
+            else:
+                standing += count
+                standing_sum += final_value * count
+            totals[upcard] = (hands + count, busts, standing, standing_sum)
         
+        # Dealer bust rates by upcard
         data = []
-        for row in cursor.fetchall():
-            upcard, hands, busts = row
-            if upcard and hands > 0:
-                bust_rate = (busts / hands * 100)
-                data.append([upcard.strip('"], '), hands, busts, f"{bust_rate:.1f}%"])
+        for upcard in UPCARD_RANKS:
+            if upcard in totals:
+                hands, busts, _, _ = totals[upcard]
+                data.append([upcard_label(upcard), hands, busts, f"{busts / hands * 100:.1f}%"])
         
         if data:
             print("\nDealer Bust Rates by Upcard:")
             print(tabulate(data, headers=['Upcard', 'Hands', 'Busts', 'Bust Rate'], tablefmt='grid'))
         
         # Expected vs actual dealer values
-        cursor.execute('''
-            SELECT 
-                SUBSTR(dealer_cards, 3, 2) as upcard,
-                AVG(CASE WHEN dealer_value > 0 AND dealer_value <= 21 THEN dealer_value ELSE 0 END) as avg_value,
-                COUNT(*) as hands
-            FROM hands
-            WHERE status IN ('WON', 'LOST', 'PUSHED', 'BLACKJACK')
-                  AND dealer_value > 0 AND dealer_value <= 21
-            GROUP BY upcard
-            HAVING hands > 10
-            ORDER BY upcard
-        ''')
-        
         data = []
-        for row in cursor.fetchall():
-            upcard, avg_value, hands = row
-            if upcard:
-                data.append([upcard.strip('"], '), f"{avg_value:.1f}", hands])
+        for upcard in UPCARD_RANKS:
+            if upcard in totals:
+                _, _, standing, standing_sum = totals[upcard]
+                if standing > 10:
+                    data.append([upcard_label(upcard), f"{standing_sum / standing:.1f}", standing])
         
         if data:
             print("\nAverage Dealer Final Value by Upcard:")
@@ -238,11 +426,54 @@ class BlackjackAnalyzer:
             print("\nRecent Session Results:")
             print(tabulate(data, headers=['Date', 'Hands', 'Win Rate', 'Wagered', 'Net'], tablefmt='grid'))
     
+    def analyze_situations(self, **filters):
+        """
+        Print outcome summaries for indexed situations (filters as for database.situation_outcomes)
+        
+        Returns:
+            The summaries, or None when the database has no situation index yet
+        """
+        conn = connect_readonly(self.db_path)
+        cursor = conn.cursor()
+        
+        try:
+            indexed = cursor.execute(
+                "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = 'situations'"
+            ).fetchone()[0]
+            if not indexed:
+                print("No situation index in this database yet; run with --rebuild-situations")
+                return None
+            
+            start = time.perf_counter()
+            results = situation_outcomes(cursor, **filters)
+            elapsed = time.perf_counter() - start
+        finally:
+            conn.close()
+        
+        described = ', '.join(f"{key}={value}" for key, value in filters.items() if value is not None)
+        print("\n### SITUATIONS ###")
+        print(f"\n{len(results)} situation(s) matching {described or 'anything'} in {elapsed * 1000:.1f} ms")
+        
+        data = []
+        for row in sorted(results, key=lambda row: (row['hand_class'], row['total'], UPCARD_RANKS.index(row['upcard']), row['action'])):
+            win_low, win_high = wilson_interval(row['wins'], row['resolved'], self.confidence) if row['resolved'] else (0, 0)
+            data.append([
+                row['hand_class'], row['total'], upcard_label(row['upcard']), row['action'],
+                row['decisions'], row['resolved'], f"{row['win_rate']:.1f}%",
+                f"{win_low * 100:.1f} .. {win_high * 100:.1f}" if row['resolved'] else 'n/a',
+                row['net'], f"{row['ev']:.3f}" if row['ev'] is not None else 'n/a'
+            ])
+        
+        if data:
+            print(tabulate(data, headers=['Class', 'Total', 'Upcard', 'Action', 'Decisions', 'Resolved',
+                                          'Win Rate', 'Wilson CI', 'Net', 'EV'], tablefmt='grid'))
+        return results
+    
     def export_to_csv(self, output_file='blackjack_analysis.csv'):
         """Export raw data to CSV for further analysis"""
         import csv
         
-        conn = sqlite3.connect(self.db_path)
+        conn = connect_readonly(self.db_path)
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -267,24 +498,65 @@ def main():
     parser = argparse.ArgumentParser(description='Analyze blackjack game data')
     parser.add_argument('--db', default='database/blackjack_data.db', help='Database file path')
     parser.add_argument('--export', action='store_true', help='Export data to CSV')
+    parser.add_argument('--resamples', type=int, default=2000, help='Bootstrap resamples for confidence intervals')
+    parser.add_argument('--confidence', type=float, default=0.95, help='Confidence level for intervals')
+    parser.add_argument('--seed', type=int, default=None, help='Random seed for reproducible bootstrap intervals')
+    parser.add_argument('--archive', default=None, help='Columnar archive directory to include in the analysis')
+    parser.add_argument('--snapshot', action='store_true', help='Analyze a private backup copy instead of the live database')
+    parser.add_argument('--enable-incremental-vacuum', action='store_true',
+                        help='Convert the database to auto_vacuum=INCREMENTAL with a one-time VACUUM and exit '
+                             '(stop the server first)')
+    
+    situations = parser.add_argument_group('situation index',
+                                           'e.g. --situations --hand-class hard --total 12 --upcard 3 --action stay')
+    situations.add_argument('--situations', action='store_true', help='Summarize outcomes by situation instead of the full report')
+    situations.add_argument('--hand-class', choices=HAND_CLASSES, default=None, help='Player hand class')
+    situations.add_argument('--total', type=int, default=None, help='Player total when the decision was made')
+    situations.add_argument('--upcard', default=None, help='Dealer upcard rank (2-9, 10/J/Q/K/X, A)')
+    situations.add_argument('--action', default=None, help='Action taken (hit, stay, double, split, ...)')
+    situations.add_argument('--formkey', default=None, help='Only decisions from this formkey')
+    situations.add_argument('--since', default=None, help='Only decisions stored at or after this ISO date/time')
+    situations.add_argument('--until', default=None, help='Only decisions stored before this ISO date/time')
+    situations.add_argument('--rebuild-situations', action='store_true',
+                            help='Rebuild the situation index from stored hands and actions first')
     
     args = parser.parse_args()
     
-    analyzer = BlackjackAnalyzer(args.db)
-    analyzer.analyze()
+    upcard = None
+    if args.upcard is not None:
+        upcard = parse_upcard(args.upcard)
+        if upcard is None:
+            parser.error(f"argument --upcard: unknown upcard {args.upcard!r} (expected 2-9, 10/J/Q/K/X or A)")
+    
+    if args.enable_incremental_vacuum:
+        converted = enable_incremental_vacuum(args.db)
+        print(f"{args.db} {'converted to' if converted else 'already uses'} auto_vacuum=INCREMENTAL")
+        return
+    
+    if args.rebuild_situations:
+        Database(args.db).rebuild_situation_index()
+    
+    db_path = args.db
+    if args.snapshot:
+        fd, db_path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        backup_snapshot(args.db, db_path)
     
-    if args.export:
-        analyzer.export_to_csv()
+    try:
+        analyzer = BlackjackAnalyzer(db_path, args.resamples, args.confidence, args.seed, args.archive)
+        if args.situations:
+            analyzer.analyze_situations(
+                hand_class=args.hand_class, total=args.total, upcard=upcard, action=args.action,
+                formkey=args.formkey, since=args.since, until=args.until
+            )
+        else:
+            analyzer.analyze()
+        
+        if args.export:
+            analyzer.export_to_csv()
+    finally:
+        if args.snapshot:
+            os.remove(db_path)
 
 if __name__ == '__main__':
-    # Install tabulate if not present
-    try:
-        import tabulate
-    except ImportError:
-        print("Installing required package: tabulate")
-        import subprocess
-        import sys
-        subprocess.check_call([sys.executable, "-m", "pip", "install", "tabulate"])
-        import tabulate
-    
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+Columnar cold-storage archive for finished hands
+Old hands are moved out of SQLite into append-only fixed-width column files
+that analytics can scan through mmap
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+from datetime import datetime, timedelta
+import logging
+
+import numpy as np
+
+from database import bump_stats_version
+
+logger = logging.getLogger(__name__)
+
+FINISHED_STATUSES = ('WON', 'LOST', 'PUSHED', 'BLACKJACK')
+
+# Cards per hand kept in the archive; longer hands are truncated
+MAX_CARDS = 8
+
+# Card byte: rank index (1-13) in the low nibble, suit index in the high nibble, 0 = no card
+CARD_RANKS = 'A23456789XJQK'
+CARD_SUITS = 'SHDC'
+UNKNOWN_CARD = 0xFF
+
+# Column name -> (dtype, per-row shape). Every column is one file of fixed-width records.
+COLUMNS = {
+    'id': ('<i8', ()),
+    'timestamp': ('<f8', ()),
+    'formkey': ('<u4', ()),
+    'status': ('u1', ()),
+    'wager': ('<i8', ()),
+    'payout': ('<i8', ()),
+    'coins_before': ('<i8', ()),
+    'player_value': ('<i2', ()),
+    'dealer_value': ('<i2', ()),
+    'player_split_value': ('<i2', ()),
+    'flags': ('u1', ()),
+    'player_cards': ('u1', (MAX_CARDS,)),
+    'dealer_cards': ('u1', (MAX_CARDS,)),
+    'player_split_cards': ('u1', (MAX_CARDS,)),
+}
+
+# Bits of the flags column
+FLAG_SPLIT = 1
+FLAG_DOUBLED = 2
+FLAG_INSURANCE = 4
+
+def encode_card(card_str):
+    """Pack a card string ('KD', 'XH', '?') into one byte"""
+    if not card_str or card_str == '?':
+        return UNKNOWN_CARD
+    rank = CARD_RANKS.find(card_str[0]) + 1
+    suit = CARD_SUITS.find(card_str[1]) + 1 if len(card_str) > 1 else 0
+    return rank | (suit << 4) if rank > 0 else UNKNOWN_CARD
+
+def decode_card(code):
+    """Unpack a card byte back into its string form ('' for no card)"""
+    if code == 0:
+        return ''
+    if code == UNKNOWN_CARD:
+        return '?'
+    suit = code >> 4
+    return CARD_RANKS[(code & 0x0F) - 1] + (CARD_SUITS[suit - 1] if suit else '')
+
+def _parse_timestamp(timestamp):
+    """ISO timestamp to epoch seconds (0 if unparseable)"""
+    try:
+        return datetime.fromisoformat(timestamp).timestamp()
+    except (TypeError, ValueError):
+        return 0.0
+
+class HandArchive:
+    def __init__(self, archive_dir='database/archive'):
+        self.archive_dir = archive_dir
+    
+    def _column_path(self, name):
+        return os.path.join(self.archive_dir, f'{name}.bin')
+    
+    def _formkeys_path(self):
+        return os.path.join(self.archive_dir, 'formkeys.json')
+    
+    def _row_size(self, name):
+        dtype, shape = COLUMNS[name]
+        return np.dtype(dtype).itemsize * int(np.prod(shape, dtype=np.int64))
+    
+    def __len__(self):
+        """Number of complete rows (a torn append leaves columns of unequal length)"""
+        counts = []
+        for name in COLUMNS:
+            path = self._column_path(name)
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            counts.append(size // self._row_size(name))
+        return min(counts)
+    
+    def formkeys(self):
+        """List of formkeys, indexed by the formkey column"""
+        try:
+            with open(self._formkeys_path()) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return []
+    
+    def column(self, name):
+        """Memory-map one column as a read-only NumPy array"""
+        dtype, shape = COLUMNS[name]
+        rows = len(self)
+        if rows == 0:
+            return np.empty((0,) + shape, dtype=dtype)
+        return np.memmap(self._column_path(name), dtype=dtype, mode='r', shape=(rows,) + shape)
+    
+    def statuses(self):
+        """Status strings for every archived hand"""
+        return np.array(FINISHED_STATUSES)[self.column('status')]
+    
+    def upcards(self):
+        """Dealer upcard rank characters, face cards folded into 'X'"""
+        ranks = self.column('dealer_cards')[:, 0] & 0x0F
+        lookup = np.array([''] + ['X' if rank in 'XJQK' else rank for rank in CARD_RANKS] + [''] * 2, dtype='U1')
+        return lookup[ranks]
+    
+    def _repair(self):
+        """Truncate every column to the last complete row after an interrupted append"""
+        rows = len(self)
+        for name in COLUMNS:
+            path = self._column_path(name)
+            if os.path.exists(path) and os.path.getsize(path) != rows * self._row_size(name):
+                with open(path, 'r+b') as f:
+                    f.truncate(rows * self._row_size(name))
+    
+    def append(self, rows):
+        """
+        Append hands to the archive
+        
+        Args:
+            rows: Tuples of (id, timestamp, formkey, status, wager_amount, payout,
+                  coins_before, player_value, dealer_value, player_split_value,
+                  has_split, doubled_down, bought_insurance, player_cards,
+                  dealer_cards, player_split_cards) as stored in the hands table
+        """
+        if not rows:
+            return
+        os.makedirs(self.archive_dir, exist_ok=True)
+        self._repair()
+        
+        formkeys = self.formkeys()
+        formkey_index = {formkey: i for i, formkey in enumerate(formkeys)}
+        for row in rows:
+            if row[2] not in formkey_index:
+                formkey_index[row[2]] = len(formkeys)
+                formkeys.append(row[2])
+        tmp_path = self._formkeys_path() + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(formkeys, f)
+        os.replace(tmp_path, self._formkeys_path())
+        
+        n = len(rows)
+        columns = {name: np.zeros((n,) + shape, dtype=dtype) for name, (dtype, shape) in COLUMNS.items()}
+        for i, row in enumerate(rows):
+            (hand_id, timestamp, formkey, status, wager, payout, coins_before,
+             player_value, dealer_value, player_split_value,
+             has_split, doubled_down, bought_insurance,
+             player_cards, dealer_cards, player_split_cards) = row
+            columns['id'][i] = hand_id
+            columns['timestamp'][i] = _parse_timestamp(timestamp)
+            columns['formkey'][i] = formkey_index[formkey]
+            columns['status'][i] = FINISHED_STATUSES.index(status)
+            columns['wager'][i] = wager or 0
+            columns['payout'][i] = payout or 0
+            columns['coins_before'][i] = coins_before or 0
+            columns['player_value'][i] = player_value or 0
+            columns['dealer_value'][i] = dealer_value or 0
+            columns['player_split_value'][i] = player_split_value or 0
+            columns['flags'][i] = ((FLAG_SPLIT if has_split else 0) |
+                                   (FLAG_DOUBLED if doubled_down else 0) |
+                                   (FLAG_INSURANCE if bought_insurance else 0))
+            for name, cards in (('player_cards', player_cards), ('dealer_cards', dealer_cards),
+                                ('player_split_cards', player_split_cards)):
+                for j, card in enumerate(json.loads(cards or '[]')[:MAX_CARDS]):
+                    columns[name][i, j] = encode_card(card)
+        
+        for name, values in columns.items():
+            with open(self._column_path(name), 'ab') as f:
+                f.write(values.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+    
+    def compact(self, db_path, days, batch_size=50000):
+        """
+        Move finished hands older than `days` from SQLite into the archive
+        
+        Rows are appended and synced before they are deleted, and hands already in
+        the archive (same id, timestamp and formkey) are skipped, so an
+        interrupted run can simply be repeated. Several databases or shards may
+        share one archive directory.
+        
+        Moved hands leave the hands table, so the server's /stats only covers
+        hands still in SQLite afterwards; analyze_data.py --archive reports both.
+        Older in-progress rows that a later row of the same formkey supersedes
+        (the per-decision snapshots /game_state stores) are deleted with their
+        actions; they hold nothing the finished hand does not.
+        
+        Returns:
+            Number of hands moved
+        """
+        cutoff = (datetime.now() - timedelta(days=days)).isoformat()
+        archived_ids = np.asarray(self.column('id'))
+        max_archived_id = int(archived_ids.max()) if len(archived_ids) else 0
+        
+        conn = sqlite3.connect(db_path)
+        cursor = conn.cursor()
+        moved = 0
+        
+        try:
+            # Newest row per formkey, read before any deletes; older rows of the formkey are superseded
+            latest = dict(cursor.execute('SELECT formkey, MAX(id) FROM hands GROUP BY formkey').fetchall())
+            
+            last_id = 0
+            while True:
+                cursor.execute('''
+                    SELECT id, timestamp, formkey, status, wager_amount, payout, coins_before,
+                           player_value, dealer_value, player_split_value,
+                           has_split, doubled_down, bought_insurance,
+                           player_cards, dealer_cards, player_split_cards
+                    FROM hands
+                    WHERE status IN ('WON', 'LOST', 'PUSHED', 'BLACKJACK')
+                      AND timestamp < ?
+                      AND id > ?
+                    ORDER BY id
+                    LIMIT ?
+                ''', (cutoff, last_id, batch_size))
+                batch = cursor.fetchall()
+                if not batch:
+                    break
+                last_id = batch[-1][0]
+                
+                duplicate = self._archived(batch, archived_ids, max_archived_id)
+                self.append([row for row, dup in zip(batch, duplicate) if not dup])
+                
+                # Every row of the batch is now either appended or already archived
+                self._delete_hands(cursor, [row[0] for row in batch])
+                # /stats is computed from the hands table; its cache and ETags must not outlive these rows
+                bump_stats_version(cursor, [row[2] for row in batch])
+                conn.commit()
+                moved += int((~duplicate).sum())
+            
+            pruned = self._prune_snapshots(conn, cutoff, latest, batch_size)
+            logger.info("Archived %s hands older than %s days, removed %s superseded in-progress rows",
+                        moved, days, pruned)
+            return moved
+        
+        except Exception as e:
+            logger.error("Error compacting hands: %s", e)
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+    
+    def _archived(self, batch, archived_ids, max_archived_id):
+        """
+        Mask of batch rows that an earlier run already archived
+        
+        Ids repeat across shards and across databases that were recreated, so
+        an archived row only counts as the same hand when its timestamp and
+        formkey match too.
+        """
+        # Only ids at or below the archive's high-water mark can be duplicates
+        ids = np.array([row[0] for row in batch], dtype=np.int64)
+        duplicate = np.zeros(len(batch), dtype=bool)
+        maybe = ids <= max_archived_id
+        if not maybe.any():
+            return duplicate
+        
+        matches = np.flatnonzero(np.isin(archived_ids, ids[maybe]))
+        if len(matches) == 0:
+            return duplicate
+        formkeys = self.formkeys()
+        timestamps = self.column('timestamp')[matches]
+        formkey_indexes = self.column('formkey')[matches]
+        archived = {
+            (int(hand_id), float(timestamp), formkeys[formkey_index])
+            for hand_id, timestamp, formkey_index in zip(archived_ids[matches], timestamps, formkey_indexes)
+        }
+        for i in np.flatnonzero(maybe):
+            duplicate[i] = (batch[i][0], _parse_timestamp(batch[i][1]), batch[i][2]) in archived
+        return duplicate
+    
+    def _delete_hands(self, cursor, hand_ids):
+        """Delete hands and their actions (actions.hand_id is not indexed, so one pass per batch)"""
+        cursor.execute('DELETE FROM actions WHERE hand_id IN (SELECT value FROM json_each(?))', (json.dumps(hand_ids),))
+        cursor.executemany('DELETE FROM hands WHERE id = ?', [(hand_id,) for hand_id in hand_ids])
+    
+    def _prune_snapshots(self, conn, cutoff, latest, batch_size):
+        """Delete in-progress rows older than cutoff that are not their formkey's newest row"""
+        cursor = conn.cursor()
+        pruned = 0
+        last_id = 0
+        while True:
+            cursor.execute('''
+                SELECT id, formkey FROM hands
+                WHERE COALESCE(status, '') NOT IN ('WON', 'LOST', 'PUSHED', 'BLACKJACK')
+                  AND timestamp < ?
+                  AND id > ?
+                ORDER BY id
+                LIMIT ?
+            ''', (cutoff, last_id, batch_size))
+            batch = cursor.fetchall()
+            if not batch:
+                return pruned
+            last_id = batch[-1][0]
+            
+            stale = [hand_id for hand_id, formkey in batch if hand_id < latest.get(formkey, 0)]
+            self._delete_hands(cursor, stale)
+            conn.commit()
+            pruned += len(stale)
+
+def main():
+    parser = argparse.ArgumentParser(description='Move old finished hands into the columnar archive')
+    parser.add_argument('--db', default='database/blackjack_data.db', help='Database file path')
+    parser.add_argument('--archive', default='database/archive', help='Archive directory')
+    parser.add_argument('--days', type=int, default=30, help='Archive finished hands older than this many days')
+    
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    moved = HandArchive(args.archive).compact(args.db, args.days)
+    print(f"Moved {moved} hands into {args.archive}")
+
+if __name__ == '__main__':
+    main()
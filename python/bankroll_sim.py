@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Bankroll and risk-of-ruin simulator
+Simulates many bankroll paths at once as (paths x hands) NumPy matrices, drawing
+per-hand outcomes from recorded hands or from a strategy simulation
+"""
+
+import argparse
+import os
+import sqlite3
+
+import numpy as np
+from tabulate import tabulate
+
+from archive import HandArchive
+from confidence import wilson_interval
+from database import connect_readonly
+
+FINISHED_STATUSES = ('WON', 'LOST', 'PUSHED', 'BLACKJACK')
+
+# Largest number of (path, hand) cells simulated at once
+MAX_PATH_CELLS = 1 << 22
+
+def load_outcomes(db_path, archive_dir=None, formkey=None):
+    """
+    Load the recorded per-hand outcome distribution in one pass over hands
+    
+    Returns:
+        Dict with 'multiples' (net result / wager per finished hand), 'wager'
+        (wagers of those hands) and 'coins' (latest recorded coins_before, or None)
+    """
+    conn = connect_readonly(db_path)
+    try:
+        query = f'''
+            SELECT wager_amount, payout, status, coins_before
+            FROM hands
+            WHERE status IN ({', '.join('?' * len(FINISHED_STATUSES))}) AND wager_amount > 0
+        '''
+        params = list(FINISHED_STATUSES)
+        if formkey:
+            query += ' AND formkey = ?'
+            params.append(formkey)
+        query += ' ORDER BY id'
+        rows = conn.execute(query, params).fetchall()
+    finally:
+        conn.close()
+    
+    wagers, payouts, statuses, coins = zip(*rows) if rows else ((), (), (), ())
+    wager = np.array(wagers, dtype=np.int64)
+    payout = np.fromiter((p or 0 for p in payouts), dtype=np.int64, count=len(rows))
+    status = np.array(statuses, dtype='U9')
+    coins_before = np.fromiter((c or 0 for c in coins), dtype=np.int64, count=len(rows))
+    
+    archive = HandArchive(archive_dir) if archive_dir else None
+    if archive is not None and len(archive) > 0:
+        archived_wager = archive.column('wager')
+        keep = archived_wager > 0
+        if formkey:
+            known = archive.formkeys()
+            keep &= archive.column('formkey') == (known.index(formkey) if formkey in known else -1)
+        # Archived hands are older than everything still in SQLite
+        wager = np.concatenate((archived_wager[keep], wager))
+        payout = np.concatenate((archive.column('payout')[keep], payout))
+        status = np.concatenate((archive.statuses()[keep], status))
+        coins_before = np.concatenate((archive.column('coins_before')[keep], coins_before))
+    
+    win = (status == 'WON') | (status == 'BLACKJACK')
+    net = np.where(win, payout - wager, np.where(status == 'LOST', -wager, 0))
+    recorded_coins = coins_before[coins_before > 0]
+    
+    return {
+        'multiples': net / np.maximum(wager, 1),
+        'wager': wager,
+        'coins': int(recorded_coins[-1]) if len(recorded_coins) else None
+    }
+
+def simulated_outcomes(strategy_name, hands=200000, decks=0, seed=None):
+    """Per-hand outcome multiples from the common-random-numbers simulator (see strategy_compare)"""
+    from strategy_compare import _init_worker, simulate_batch
+    
+    _init_worker([strategy_name])
+    return simulate_batch(seed if seed is not None else 0, 0, hands, decks)[0]
+
+class BankrollSimulator:
+    def __init__(self, multiples, bankroll, wager, target=None, hands=5000, paths=10000, seed=None):
+        """
+        Args:
+            multiples: Per-hand net results in units of the wager, resampled with replacement
+            bankroll: Starting bankroll
+            wager: Flat bet per hand; a path is ruined once it cannot cover the next bet
+            target: Bankroll that ends a path successfully (None = play the full horizon)
+            hands: Horizon in hands
+            paths: Number of simulated paths
+        """
+        # The empirical distribution has few distinct values, so sample from (value, probability)
+        values, counts = np.unique(np.asarray(multiples, dtype=np.float64), return_counts=True)
+        if len(values) == 0:
+            raise ValueError("No outcomes to resample")
+        self.increments = values * wager
+        self.probabilities = counts / counts.sum()
+        self.bankroll = bankroll
+        self.wager = wager
+        self.target = target
+        self.hands = hands
+        self.paths = paths
+        self.rng = np.random.default_rng(seed)
+    
+    def _simulate_chunk(self, paths):
+        """Simulate a block of paths; returns per-path summary arrays"""
+        increments = self.rng.choice(self.increments, size=(paths, self.hands), p=self.probabilities)
+        balance = self.bankroll + np.cumsum(increments, axis=1)
+        
+        # First hand after which the path is absorbed (ruin or target); hands if never
+        ruined = balance < self.wager
+        ruin_at = np.where(ruined.any(axis=1), ruined.argmax(axis=1), self.hands)
+        if self.target is not None:
+            reached = balance >= self.target
+            target_at = np.where(reached.any(axis=1), reached.argmax(axis=1), self.hands)
+        else:
+            target_at = np.full(paths, self.hands)
+        stop_at = np.minimum(ruin_at, target_at)
+        
+        # Freeze every path at its stopping point before measuring drawdowns and final bankrolls
+        rows = np.arange(paths)
+        stopped = np.arange(self.hands) > stop_at[:, None]
+        final = balance[rows, np.minimum(stop_at, self.hands - 1)]
+        balance = np.where(stopped, final[:, None], balance)
+        peaks = np.maximum(np.maximum.accumulate(balance, axis=1), self.bankroll)
+        max_drawdown = (peaks - balance).max(axis=1)
+        
+        return {
+            'ruined': ruin_at < target_at,
+            'reached': target_at < ruin_at,
+            'hands_to_target': np.where(target_at < ruin_at, target_at + 1, -1),
+            'hands_to_ruin': np.where(ruin_at < target_at, ruin_at + 1, -1),
+            'max_drawdown': max_drawdown,
+            'final': final
+        }
+    
+    def run(self):
+        """
+        Simulate every path in memory-bounded chunks
+        
+        Returns:
+            Dict of per-path arrays: ruined, reached, hands_to_target, hands_to_ruin,
+            max_drawdown and final bankroll
+        """
+        chunk = max(1, MAX_PATH_CELLS // max(self.hands, 1))
+        parts = [self._simulate_chunk(min(chunk, self.paths - start)) for start in range(0, self.paths, chunk)]
+        return {key: np.concatenate([part[key] for part in parts]) for key in parts[0]}
+    
+    def summarize(self, result, confidence=0.95):
+        """Risk of ruin, target probability, time to target and drawdown distribution"""
+        paths = len(result['ruined'])
+        ruined = int(result['ruined'].sum())
+        reached = int(result['reached'].sum())
+        ruin_low, ruin_high = wilson_interval(ruined, paths, confidence)
+        to_target = result['hands_to_target'][result['reached']]
+        to_ruin = result['hands_to_ruin'][result['ruined']]
+        drawdown = result['max_drawdown']
+        final = result['final']
+        
+        return {
+            'paths': paths,
+            'risk_of_ruin': ruined / paths,
+            'risk_of_ruin_low': float(ruin_low),
+            'risk_of_ruin_high': float(ruin_high),
+            'target_probability': reached / paths,
+            'median_hands_to_target': float(np.median(to_target)) if len(to_target) else None,
+            'median_hands_to_ruin': float(np.median(to_ruin)) if len(to_ruin) else None,
+            'expected_max_drawdown': float(drawdown.mean()),
+            'drawdown_percentiles': dict(zip((50, 90, 99), np.percentile(drawdown, [50, 90, 99]).tolist())),
+            'final_percentiles': dict(zip((5, 50, 95), np.percentile(final, [5, 50, 95]).tolist())),
+            'expected_final': float(final.mean())
+        }
+    
+    def print_report(self, summary, source):
+        """Print the simulation summary"""
+        print("\n" + "="*60)
+        print(" BANKROLL SIMULATION")
+        print("="*60)
+        mean = float(np.dot(self.increments, self.probabilities))
+        print(f"\nOutcomes: {source}  (EV per hand {mean:+.3f}, {len(self.increments)} distinct results)")
+        print(f"Bankroll {self.bankroll}, wager {self.wager}, target {self.target or 'none'}, "
+              f"{self.hands} hands x {summary['paths']} paths")
+        
+        def hands_text(value):
+            return f"{value:.0f}" if value is not None else 'n/a'
+        
+        data = [
+            ['Risk of Ruin', f"{summary['risk_of_ruin'] * 100:.2f}% "
+                             f"({summary['risk_of_ruin_low'] * 100:.2f}% .. {summary['risk_of_ruin_high'] * 100:.2f}%)"],
+            ['Median Hands to Ruin', hands_text(summary['median_hands_to_ruin'])],
+            ['Reached Target', f"{summary['target_probability'] * 100:.2f}%" if self.target else 'n/a'],
+            ['Median Hands to Target', hands_text(summary['median_hands_to_target'])],
+            ['Expected Max Drawdown', f"{summary['expected_max_drawdown']:.1f}"],
+            ['Max Drawdown p50 / p90 / p99', ' / '.join(f"{v:.0f}" for v in summary['drawdown_percentiles'].values())],
+            ['Expected Final Bankroll', f"{summary['expected_final']:.1f}"],
+            ['Final Bankroll p5 / p50 / p95', ' / '.join(f"{v:.0f}" for v in summary['final_percentiles'].values())]
+        ]
+        print(tabulate(data, headers=['Metric', 'Value'], tablefmt='grid'))
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulate bankroll paths and risk of ruin')
+    parser.add_argument('--db', default='database/blackjack_data.db', help='Database file path')
+    parser.add_argument('--archive', default=None, help='Columnar archive directory to include')
+    parser.add_argument('--formkey', default=None, help='Only use hands from this formkey')
+    parser.add_argument('--source', choices=['data', 'simulation'], default='data',
+                        help='data: resample recorded outcomes; simulation: outcomes from strategy_compare')
+    parser.add_argument('--strategy', default='basic_strategy', help='Strategy for --source simulation')
+    parser.add_argument('--sim-hands', type=int, default=200000, help='Simulated hands for --source simulation')
+    parser.add_argument('--decks', type=int, default=0, help='Decks per shoe for --source simulation (0 = infinite)')
+    parser.add_argument('--bankroll', type=int, default=None, help='Starting bankroll (default: latest coins_before)')
+    parser.add_argument('--wager', type=int, default=None, help='Flat wager (default: median recorded wager)')
+    parser.add_argument('--target', type=int, default=None, help='Stop a path once the bankroll reaches this')
+    parser.add_argument('--hands', type=int, default=5000, help='Hands per path')
+    parser.add_argument('--paths', type=int, default=10000, help='Number of simulated paths')
+    parser.add_argument('--confidence', type=float, default=0.95, help='Confidence level for the risk of ruin')
+    parser.add_argument('--seed', type=int, default=None, help='Random seed')
+    
+    args = parser.parse_args()
+    
+    # Recorded hands supply the outcomes for --source data and the default wager and bankroll
+    recorded = {'multiples': np.empty(0), 'wager': np.empty(0, dtype=np.int64), 'coins': None}
+    if args.source == 'data' or args.wager is None or args.bankroll is None:
+        if not os.path.exists(args.db):
+            parser.error(f"database {args.db} not found (with --source simulation, pass --wager and --bankroll)")
+        try:
+            recorded = load_outcomes(args.db, args.archive, args.formkey)
+        except sqlite3.Error as e:
+            parser.error(f"cannot read hands from {args.db}: {e}")
+    
+    if args.source == 'simulation':
+        multiples = simulated_outcomes(args.strategy, args.sim_hands, args.decks, args.seed)
+        source = f"simulated {args.strategy} ({len(multiples)} hands)"
+    else:
+        multiples = recorded['multiples']
+        source = f"recorded hands ({len(multiples)})"
+        if len(multiples) == 0:
+            print("No finished hands with a wager found")
+            return
+    
+    wager = args.wager or (int(np.median(recorded['wager'])) if len(recorded['wager']) else 1)
+    bankroll = args.bankroll or recorded['coins'] or wager * 100
+    
+    simulator = BankrollSimulator(multiples, bankroll, wager, args.target, args.hands, args.paths, args.seed)
+    simulator.print_report(simulator.summarize(simulator.run(), args.confidence), source)
+
+if __name__ == '__main__':
+    main()
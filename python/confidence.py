@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Confidence intervals for blackjack results
+Vectorized bootstrap and analytic intervals over per-hand NumPy arrays
+"""
+
+from statistics import NormalDist
+
+import numpy as np
+
+# Largest number of resampled values materialized at once by the index bootstrap
+MAX_RESAMPLE_CELLS = 1 << 22
+
+# Above this many distinct outcomes, fall back from multinomial counts to index resampling
+MAX_MULTINOMIAL_OUTCOMES = 4096
+
+def z_score(confidence):
+    """Two-sided standard normal critical value for a confidence level"""
+    return NormalDist().inv_cdf(0.5 + confidence / 2)
+
+def _percentile_interval(samples, confidence):
+    """Percentile interval along the last axis of a bootstrap sample array (NaN where every sample is)"""
+    alpha = (1 - confidence) / 2
+    samples = np.asarray(samples)
+    low = np.full(samples.shape[:-1], np.nan)
+    high = np.full(samples.shape[:-1], np.nan)
+    # Groups without trials resample to all-NaN rows; nanquantile would warn on each
+    filled = ~np.isnan(samples).all(axis=-1)
+    if filled.any():
+        low[filled], high[filled] = np.nanquantile(samples[filled], [alpha, 1 - alpha], axis=-1)
+    return low, high
+
+def _bootstrap_sums(numerator, denominator, resamples, rng):
+    """
+    Bootstrap the sums of two paired per-hand arrays
+    
+    Hand outcomes take few distinct (net, wager) values, so resampling n hands
+    is equivalent to drawing multinomial counts over the distinct pairs. That
+    costs O(resamples * outcomes) regardless of n. When outcomes are too varied
+    the hands are resampled by index in bounded chunks instead.
+    
+    Returns:
+        Tuple of (numerator_sums, denominator_sums), each of length resamples
+    """
+    n = len(numerator)
+    
+    # Distinct (numerator, denominator) pairs via integer codes; much faster than unique(axis=0)
+    numerator_values, numerator_codes = np.unique(numerator, return_inverse=True)
+    denominator_values, denominator_codes = np.unique(denominator, return_inverse=True)
+    pair_codes, counts = np.unique(numerator_codes * len(denominator_values) + denominator_codes, return_counts=True)
+    
+    if len(pair_codes) <= MAX_MULTINOMIAL_OUTCOMES:
+        pair_numerators = numerator_values[pair_codes // len(denominator_values)]
+        pair_denominators = denominator_values[pair_codes % len(denominator_values)]
+        weights = rng.multinomial(n, counts / n, size=resamples)
+        return weights @ pair_numerators, weights @ pair_denominators
+    
+    numerator_sums = np.empty(resamples)
+    denominator_sums = np.empty(resamples)
+    chunk = max(1, MAX_RESAMPLE_CELLS // n)
+    for start in range(0, resamples, chunk):
+        stop = min(start + chunk, resamples)
+        indexes = rng.integers(0, n, size=(stop - start, n))
+        numerator_sums[start:stop] = numerator[indexes].sum(axis=1)
+        denominator_sums[start:stop] = denominator[indexes].sum(axis=1)
+    return numerator_sums, denominator_sums
+
+def bootstrap_ratio(numerator, denominator, resamples=2000, confidence=0.95, seed=None):
+    """
+    Percentile bootstrap interval for sum(numerator) / sum(denominator)
+    
+    Args:
+        numerator: Per-hand values summed on top (e.g. net result)
+        denominator: Per-hand values summed below (e.g. wager, or ones for a mean)
+        resamples: Number of bootstrap resamples
+        confidence: Two-sided confidence level
+        seed: Optional seed for reproducible intervals
+    
+    Returns:
+        Dict with estimate, low and high, or None if there is no data
+    """
+    numerator = np.asarray(numerator, dtype=np.float64)
+    denominator = np.asarray(denominator, dtype=np.float64)
+    if len(numerator) == 0 or denominator.sum() == 0:
+        return None
+    
+    rng = np.random.default_rng(seed)
+    numerator_sums, denominator_sums = _bootstrap_sums(numerator, denominator, resamples, rng)
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        estimates = np.where(denominator_sums != 0, numerator_sums / denominator_sums, np.nan)
+    low, high = _percentile_interval(estimates, confidence)
+    
+    return {
+        'estimate': float(numerator.sum() / denominator.sum()),
+        'low': float(low),
+        'high': float(high)
+    }
+
+def bootstrap_mean(values, resamples=2000, confidence=0.95, seed=None):
+    """Percentile bootstrap interval for the mean of per-hand values"""
+    values = np.asarray(values, dtype=np.float64)
+    return bootstrap_ratio(values, np.ones_like(values), resamples, confidence, seed)
+
+def bootstrap_proportions(successes, trials, resamples=2000, confidence=0.95, seed=None):
+    """
+    Percentile bootstrap intervals for several proportions at once
+    
+    Resampling the hands of one group is a binomial draw, so every group is
+    resampled in a single (groups x resamples) call.
+    
+    Returns:
+        Tuple of (estimates, lows, highs) arrays, NaN where trials is zero
+    """
+    successes = np.asarray(successes, dtype=np.int64)
+    trials = np.asarray(trials, dtype=np.int64)
+    rng = np.random.default_rng(seed)
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        estimates = np.where(trials > 0, successes / trials, np.nan)
+        probabilities = np.nan_to_num(estimates)
+        draws = rng.binomial(trials[:, None], probabilities[:, None], size=(len(trials), resamples))
+        samples = np.where(trials[:, None] > 0, draws / trials[:, None], np.nan)
+    
+    lows, highs = _percentile_interval(samples, confidence)
+    return estimates, lows, highs
+
+def mean_interval(values, confidence=0.95):
+    """Normal-approximation interval for the mean of per-hand values"""
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    if n < 2:
+        return None
+    
+    mean = values.mean()
+    half_width = z_score(confidence) * values.std(ddof=1) / np.sqrt(n)
+    return {'estimate': float(mean), 'low': float(mean - half_width), 'high': float(mean + half_width)}
+
+def ratio_interval(numerator, denominator, confidence=0.95):
+    """Delta-method interval for sum(numerator) / sum(denominator)"""
+    numerator = np.asarray(numerator, dtype=np.float64)
+    denominator = np.asarray(denominator, dtype=np.float64)
+    n = len(numerator)
+    if n < 2 or denominator.sum() == 0:
+        return None
+    
+    ratio = numerator.sum() / denominator.sum()
+    residuals = numerator - ratio * denominator
+    standard_error = residuals.std(ddof=1) / (np.sqrt(n) * abs(denominator.mean()))
+    half_width = z_score(confidence) * standard_error
+    return {'estimate': float(ratio), 'low': float(ratio - half_width), 'high': float(ratio + half_width)}
+
+def wilson_interval(successes, trials, confidence=0.95):
+    """
+    Wilson score intervals for one or more proportions
+    
+    Returns:
+        Tuple of (lows, highs) arrays, NaN where trials is zero
+    """
+    successes = np.asarray(successes, dtype=np.float64)
+    trials = np.asarray(trials, dtype=np.float64)
+    z = z_score(confidence)
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        p = successes / trials
+        denominator = 1 + z ** 2 / trials
+        center = (p + z ** 2 / (2 * trials)) / denominator
+        half_width = z * np.sqrt(p * (1 - p) / trials + z ** 2 / (4 * trials ** 2)) / denominator
+    
+    return center - half_width, center + half_width
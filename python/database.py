@@ -5,21 +5,323 @@ Database module for storing and analyzing blackjack game data
 
 import sqlite3
 import json
+import os
+import threading
+import time
 from datetime import datetime
+from urllib.request import pathname2url
 import logging
 
 logger = logging.getLogger(__name__)
 
+def connect_readonly(db_path):
+    """
+    Open a read-only connection for analytics and statistics
+    
+    With the database in WAL mode a reader works from a snapshot taken when
+    its transaction starts, so long reports never block store_hand or
+    update_hand_outcome writes.
+    """
+    uri = f"file:{pathname2url(os.path.abspath(db_path))}?mode=ro"
+    conn = sqlite3.connect(uri, uri=True)
+    conn.execute('PRAGMA query_only = 1')
+    return conn
+
+def backup_snapshot(db_path, snapshot_path):
+    """
+    Copy the database to snapshot_path with SQLite's online backup API
+    
+    The copy runs inside one read transaction, which in WAL mode does not
+    hold up writers, and gives reports a private file to work against.
+    """
+    source = connect_readonly(db_path)
+    dest = sqlite3.connect(snapshot_path)
+    try:
+        source.backup(dest)
+    finally:
+        dest.close()
+        source.close()
+
+# Raw counters behind a statistics dict; everything else is derived from them
+STATISTICS_COUNTERS = (
+    'total_hands', 'wins', 'losses', 'pushes', 'blackjacks', 'busts',
+    'total_wagered', 'total_won', 'total_lost'
+)
+
+def summarize_statistics(total_hands, wins, losses, pushes, blackjacks, busts,
+                         total_wagered, total_won, total_lost):
+    """Build the statistics dict (counts, rates, net profit and ROI) from raw counters"""
+    win_rate = (wins / total_hands * 100) if total_hands > 0 else 0
+    loss_rate = (losses / total_hands * 100) if total_hands > 0 else 0
+    push_rate = (pushes / total_hands * 100) if total_hands > 0 else 0
+    blackjack_rate = (blackjacks / total_hands * 100) if total_hands > 0 else 0
+    bust_rate = (busts / total_hands * 100) if total_hands > 0 else 0
+    
+    net_profit = total_won - total_lost
+    roi = (net_profit / total_wagered * 100) if total_wagered > 0 else 0
+    
+    return {
+        'total_hands': total_hands,
+        'wins': wins,
+        'losses': losses,
+        'pushes': pushes,
+        'blackjacks': blackjacks,
+        'busts': busts,
+        'win_rate': round(win_rate, 2),
+        'loss_rate': round(loss_rate, 2),
+        'push_rate': round(push_rate, 2),
+        'blackjack_rate': round(blackjack_rate, 2),
+        'bust_rate': round(bust_rate, 2),
+        'total_wagered': total_wagered,
+        'total_won': total_won,
+        'total_lost': total_lost,
+        'net_profit': net_profit,
+        'roi': round(roi, 2)
+    }
+
+def merge_statistics(stats_list):
+    """Combine statistics computed on separate databases (e.g. shards) into one"""
+    totals = {counter: sum(stats.get(counter, 0) for stats in stats_list) for counter in STATISTICS_COUNTERS}
+    return summarize_statistics(**totals)
+
+def bump_stats_version(cursor, formkeys):
+    """
+    Invalidate cached statistics (and /stats ETags) for formkeys and for the overall totals
+    
+    Call it in the transaction that changes the hands the statistics are computed from.
+    """
+    # New rows start from the clock so a recreated database never reuses old versions
+    initial = int(time.time() * 1000)
+    cursor.executemany('''
+        INSERT INTO stats_versions (formkey, version) VALUES (?, ?)
+        ON CONFLICT(formkey) DO UPDATE SET version = version + 1
+    ''', [(formkey, initial) for formkey in sorted(set(filter(None, formkeys)) | {'*'})])
+
+def upcard_rank(card_str):
+    """Rank character of a dealer upcard with face cards folded into 'X' (None if unknown)"""
+    if not card_str or card_str[0] not in 'A23456789XJQK':
+        return None
+    return 'X' if card_str[0] in 'JQK' else card_str[0]
+
+def enable_incremental_vacuum(db_path):
+    """
+    Convert a database to auto_vacuum=INCREMENTAL with a one-time VACUUM
+    
+    The VACUUM rewrites the whole file and needs it to itself, so run this
+    while the server is stopped.
+    
+    Returns:
+        True if the database was converted, False if it already was
+    """
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        if conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2:
+            return False
+        started = time.perf_counter()
+        conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        conn.execute('VACUUM')
+        logger.info("Converted %s to auto_vacuum=INCREMENTAL in %.1f s", db_path, time.perf_counter() - started)
+        return True
+    finally:
+        conn.close()
+
+FINISHED_STATUSES = ('WON', 'LOST', 'PUSHED', 'BLACKJACK')
+
+# Stored in PRAGMA user_version once the schema is set up; bump it whenever _create_schema changes
+# (4: existing databases are checked for auto_vacuum=INCREMENTAL)
+SCHEMA_VERSION = 4
+
+# Situation index hand classes: a two-card pair, a hand with an ace counted as 11, anything else
+HAND_CLASSES = ('pair', 'soft', 'hard')
+
+def classify_hand(cards):
+    """
+    (hand class, total) of a player hand for the situation index
+    
+    Hidden or unknown cards are ignored. Returns (None, 0) for an empty hand.
+    """
+    values = []
+    for card in cards:
+        rank = card[0] if card else '?'
+        if rank == 'A':
+            values.append(11)
+        elif rank in 'XKQJ':
+            values.append(10)
+        elif rank in '23456789':
+            values.append(int(rank))
+    if not values:
+        return None, 0
+    
+    total = sum(values)
+    aces = values.count(11)
+    while total > 21 and aces > 0:
+        total -= 10
+        aces -= 1
+    
+    if len(values) == 2 and values[0] == values[1]:
+        return 'pair', total
+    return ('soft' if aces > 0 else 'hard'), total
+
+def hand_net(status, wager, payout):
+    """Net result of a finished hand in coins (wins report the total payout, stake included)"""
+    if status in ('WON', 'BLACKJACK'):
+        return (payout or 0) - (wager or 0)
+    if status == 'LOST':
+        return -(wager or 0)
+    return 0
+
+def _hand_id_at(cursor, timestamp):
+    """
+    Smallest hand id stored at or after timestamp
+    
+    Hand ids grow with time, so a binary search over primary key lookups
+    finds the boundary without scanning or indexing timestamps.
+    """
+    low, high = 1, (cursor.execute('SELECT MAX(id) FROM hands').fetchone()[0] or 0) + 1
+    while low < high:
+        middle = (low + high) // 2
+        row = cursor.execute('SELECT id, timestamp FROM hands WHERE id >= ? ORDER BY id LIMIT 1', (middle,)).fetchone()
+        if row is None or row[1] >= timestamp:
+            high = middle
+        else:
+            low = row[0] + 1
+    return low
+
+def situation_outcomes(cursor, hand_class=None, total=None, upcard=None, action=None,
+                       formkey=None, since=None, until=None):
+    """
+    Outcome summary of every indexed situation matching the filters
+    
+    Reads only the situation index: each matching situation's posting list is
+    a range scan over (situation_id, hand_id), so the cost grows with the
+    number of matching decisions, not with the number of stored hands.
+    Decisions of archived hands still count unless a date filter excludes them.
+    
+    Args:
+        cursor: Cursor on the database (a read-only connection is enough)
+        hand_class, total, upcard, action: Situation filters (None matches any)
+        formkey: Only decisions of this formkey
+        since, until: ISO timestamps (or dates) bounding when the decision was stored
+    
+    Returns:
+        List of dicts, one per situation with at least one matching decision
+    """
+    conditions, params = [], []
+    for column, value in (('hand_class', hand_class), ('total', total), ('upcard', upcard), ('action', action)):
+        if value is not None:
+            conditions.append(f"{column} = ?")
+            params.append(value)
+    cursor.execute(f'''
+        SELECT id, hand_class, total, upcard, action FROM situations
+        {'WHERE ' + ' AND '.join(conditions) if conditions else ''}
+        ORDER BY hand_class, total, upcard, action
+    ''', params)
+    situations = cursor.fetchall()
+    
+    low = _hand_id_at(cursor, since) if since else 0
+    high = _hand_id_at(cursor, until) if until else None
+    
+    query = '''
+        SELECT d.status, COUNT(*), SUM(d.net)
+        FROM situation_postings p
+        JOIN decision_outcomes d ON d.hand_id = p.hand_id
+        WHERE p.situation_id = ? AND p.hand_id >= ?
+    '''
+    if high is not None:
+        query += ' AND p.hand_id < ?'
+    if formkey:
+        query += ' AND d.formkey = ?'
+    query += ' GROUP BY d.status'
+    
+    results = []
+    for situation_id, situation_class, situation_total, situation_upcard, situation_action in situations:
+        params = [situation_id, low] + ([high] if high is not None else []) + ([formkey] if formkey else [])
+        counts = {status: (count, net or 0) for status, count, net in cursor.execute(query, params)}
+        decisions = sum(count for count, _ in counts.values())
+        if not decisions:
+            continue
+        
+        resolved = sum(count for status, (count, _) in counts.items() if status in FINISHED_STATUSES)
+        net = sum(net for _, net in counts.values())
+        wins = counts.get('WON', (0, 0))[0] + counts.get('BLACKJACK', (0, 0))[0]
+        results.append({
+            'hand_class': situation_class,
+            'total': situation_total,
+            'upcard': situation_upcard,
+            'action': situation_action,
+            'decisions': decisions,
+            'resolved': resolved,
+            'wins': wins,
+            'losses': counts.get('LOST', (0, 0))[0],
+            'pushes': counts.get('PUSHED', (0, 0))[0],
+            'net': net,
+            'ev': (net / resolved) if resolved else None,
+            'win_rate': round(wins / resolved * 100, 2) if resolved else 0
+        })
+    return results
+
 class Database:
     def __init__(self, db_path='database/blackjack_data.db'):
         self.db_path = db_path
+        # formkey (or '*') -> (stats version, statistics dict)
+        self._stats_cache = {}
+        self._stats_lock = threading.Lock()
+        # (hand_class, total, upcard, action) -> situations.id, for rows seen committed
+        self._situation_ids = {}
         self.init_database()
     
     def init_database(self):
-        """Initialize database tables"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        """
+        Create or migrate the schema
+        
+        A database already at SCHEMA_VERSION costs a single PRAGMA read, so
+        opening a shard at startup or in a new worker does no DDL.
+        """
+        conn = sqlite3.connect(self.db_path, isolation_level=None)
         
+        try:
+            if conn.execute('PRAGMA user_version').fetchone()[0] >= SCHEMA_VERSION:
+                return
+            
+            # Freed pages are returned through PRAGMA incremental_vacuum (see server/maintenance.py)
+            self._enable_incremental_vacuum(conn)
+            
+            # WAL lets read-only analytics connections run alongside the writer
+            conn.execute('PRAGMA journal_mode=WAL')
+            
+            # Processes opening the same file at once queue here; later ones find the schema current
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                if conn.execute('PRAGMA user_version').fetchone()[0] < SCHEMA_VERSION:
+                    self._create_schema(conn.cursor())
+                    conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        finally:
+            conn.close()
+        logger.info("Database initialized")
+    
+    def _enable_incremental_vacuum(self, conn):
+        """
+        Ask for auto_vacuum=INCREMENTAL
+        
+        The pragma only takes effect on a database without tables. One that
+        already has them needs a full VACUUM, which is left to an offline
+        enable_incremental_vacuum() run so that opening a shard never blocks
+        requests behind rebuilding the file.
+        """
+        if conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2:
+            return
+        conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        if conn.execute('SELECT 1 FROM sqlite_master LIMIT 1').fetchone():
+            logger.warning("%s is not in auto_vacuum=INCREMENTAL mode, so freed pages are not returned; "
+                           "convert it with analyze_data.py --db %s --enable-incremental-vacuum "
+                           "while the server is stopped", self.db_path, self.db_path)
+    
+    def _create_schema(self, cursor):
+        """Create missing tables and migrate older layouts (runs once per SCHEMA_VERSION)"""
         # Hands table
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS hands (
@@ -48,7 +350,7 @@ class Database:
             )
         ''')
         
-        # Actions table
+        # Actions table; state is the decided state when the hand row does not keep it (NULL otherwise)
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS actions (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -57,9 +359,12 @@ class Database:
                 player_value INTEGER,
                 dealer_value INTEGER,
                 timestamp TEXT,
+                state TEXT,
                 FOREIGN KEY (hand_id) REFERENCES hands (id)
             )
         ''')
+        if 'state' not in [row[1] for row in cursor.execute('PRAGMA table_info(actions)')]:
+            cursor.execute('ALTER TABLE actions ADD COLUMN state TEXT')
         
         # Statistics table for quick lookups
         cursor.execute('''
@@ -78,20 +383,213 @@ class Database:
             )
         ''')
         
-        # Dealer patterns table
+        # Dealer patterns: one counter per (formkey, upcard, final value), so the table stays small
+        columns = [row[1] for row in cursor.execute('PRAGMA table_info(dealer_patterns)')]
+        migrate = bool(columns) and 'formkey' not in columns
+        if migrate:
+            # The old layout had no unique key, so its upsert always failed and the table is empty
+            cursor.execute('DROP TABLE dealer_patterns')
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS dealer_patterns (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                upcard TEXT,
-                final_value INTEGER,
-                busted BOOLEAN,
-                count INTEGER DEFAULT 1
+                formkey TEXT NOT NULL DEFAULT 'default',
+                upcard TEXT NOT NULL,
+                final_value INTEGER NOT NULL,
+                busted BOOLEAN NOT NULL,
+                count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (formkey, upcard, final_value)
             )
         ''')
+        if migrate:
+            self._backfill_dealer_patterns(cursor)
         
-        conn.commit()
-        conn.close()
-        logger.info("Database initialized")
+        # Statistics versions, bumped whenever a hand outcome is committed
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS stats_versions (
+                formkey TEXT PRIMARY KEY,
+                version INTEGER NOT NULL
+            )
+        ''')
+        
+        # Situation index: a dictionary of (hand class, total, upcard, action), a sorted
+        # hand id list per situation, and the outcome each decision led to
+        backfill = cursor.execute(
+            "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = 'situations'"
+        ).fetchone()[0] == 0
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS situations (
+                id INTEGER PRIMARY KEY,
+                hand_class TEXT NOT NULL,
+                total INTEGER NOT NULL,
+                upcard TEXT NOT NULL,
+                action TEXT NOT NULL,
+                UNIQUE (hand_class, total, upcard, action)
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS situation_postings (
+                situation_id INTEGER NOT NULL,
+                hand_id INTEGER NOT NULL,
+                PRIMARY KEY (situation_id, hand_id)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS decision_outcomes (
+                hand_id INTEGER PRIMARY KEY,
+                formkey TEXT NOT NULL,
+                outcome_id INTEGER,
+                status TEXT,
+                net INTEGER
+            )
+        ''')
+        # Covers only decisions still waiting for their hand to finish, so it stays tiny
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_decision_outcomes_pending
+            ON decision_outcomes (formkey) WHERE outcome_id IS NULL
+        ''')
+        if backfill:
+            self._rebuild_situation_index(cursor)
+        
+        # /game_delta hand state per formkey, shared by every worker process serving this shard
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS delta_sessions (
+                formkey TEXT PRIMARY KEY,
+                version INTEGER NOT NULL,
+                seq INTEGER NOT NULL,
+                hand_id INTEGER,
+                strategy TEXT NOT NULL,
+                state TEXT NOT NULL,
+                gambler TEXT NOT NULL,
+                last_response TEXT,
+                updated TEXT
+            )
+        ''')
+    
+    def _backfill_dealer_patterns(self, cursor):
+        """Rebuild the dealer pattern counters from the finished hands already stored"""
+        cursor.execute('''
+            INSERT INTO dealer_patterns (formkey, upcard, final_value, busted, count)
+            SELECT COALESCE(formkey, 'default'),
+                   CASE WHEN SUBSTR(dealer_cards, 3, 1) IN ('K', 'Q', 'J') THEN 'X'
+                        ELSE SUBSTR(dealer_cards, 3, 1) END as upcard,
+                   dealer_value,
+                   dealer_value < 0 OR dealer_value > 21,
+                   COUNT(*)
+            FROM hands
+            WHERE status IN ('WON', 'LOST', 'PUSHED', 'BLACKJACK')
+              AND dealer_value != 0
+              AND SUBSTR(dealer_cards, 3, 1) IN ('A', '2', '3', '4', '5', '6', '7', '8', '9', 'X', 'K', 'Q', 'J')
+            GROUP BY 1, 2, 3
+        ''')
+        logger.info("Rebuilt %s dealer_patterns counters from stored hands", cursor.rowcount)
+    
+    def _rebuild_situation_index(self, cursor):
+        """
+        Rebuild the situation postings and decision outcomes from actions and hands
+        
+        /game_state stores one row per decided state, so its cards are the
+        decision's cards, and actions stored with their own state use that.
+        Other decisions on finished rows (the /game_delta protocol rewrites one
+        row per hand, and older rows kept no per-action state) see the final
+        cards; each takes the shortest remaining prefix that reaches its
+        recorded player value.
+        Each decision is credited with the next finished hand of the same
+        formkey, as at write time.
+        """
+        cursor.execute('DELETE FROM situation_postings')
+        cursor.execute('DELETE FROM decision_outcomes')
+        rows = cursor.execute(f'''
+            SELECT h.id, COALESCE(h.formkey, 'default'), h.status, h.wager_amount, h.payout,
+                   h.player_cards, h.player_split_cards, h.dealer_cards, a.action, a.player_value, a.state
+            FROM hands h
+            LEFT JOIN actions a ON a.hand_id = h.id
+            WHERE a.id IS NOT NULL OR h.status IN ({', '.join('?' * len(FINISHED_STATUSES))})
+            ORDER BY h.id, a.id
+        ''', FINISHED_STATUSES).fetchall()
+        
+        postings, outcomes, pending, positions = set(), {}, {}, {}
+        for index, row in enumerate(rows):
+            (hand_id, formkey, status, wager, payout, player_cards, split_cards, dealer_cards,
+             action, value, decided) = row
+            if action is not None:
+                side = 'split' if action.endswith('_split') else 'player'
+                cards = json.loads((split_cards if side == 'split' else player_cards) or '[]')
+                upcard = upcard_rank((json.loads(dealer_cards or '[]') or [None])[0])
+                if decided is not None:
+                    # JSON null: an action whose decided state the client did not report
+                    decided = json.loads(decided) or {}
+                    cards = decided.get('player_split' if side == 'split' else 'player') or []
+                    upcard = upcard_rank((decided.get('dealer') or [None])[0])
+                elif status in FINISHED_STATUSES and action == 'split':
+                    # The pair was split into the first card of each hand
+                    cards = (json.loads(player_cards or '[]')[:1] + json.loads(split_cards or '[]')[:1]) or cards
+                elif status in FINISHED_STATUSES:
+                    # Later decisions of a hand were made on longer prefixes; a hit adds at least one card
+                    start = positions.get((hand_id, side), 2)
+                    length = next((n for n in range(start, len(cards) + 1) if classify_hand(cards[:n])[1] == value),
+                                  len(cards))
+                    positions[(hand_id, side)] = length + 1 if action.startswith('hit') else length
+                    cards = cards[:length]
+                hand_class, total = classify_hand(cards)
+                if hand_class is not None and upcard is not None:
+                    postings.add((self._situation_id(cursor, (hand_class, total, upcard, action)), hand_id))
+                    if hand_id not in outcomes:
+                        outcomes[hand_id] = [formkey, None, None, None]
+                        pending.setdefault(formkey, []).append(hand_id)
+            
+            last_row_of_hand = index + 1 == len(rows) or rows[index + 1][0] != hand_id
+            if last_row_of_hand and status in FINISHED_STATUSES:
+                net = hand_net(status, wager, payout)
+                for decision_id in pending.pop(formkey, []):
+                    outcomes[decision_id][1:] = [hand_id, status, net]
+        
+        cursor.executemany('INSERT INTO situation_postings (situation_id, hand_id) VALUES (?, ?)', sorted(postings))
+        cursor.executemany(
+            'INSERT INTO decision_outcomes (hand_id, formkey, outcome_id, status, net) VALUES (?, ?, ?, ?, ?)',
+            [(hand_id, *outcome) for hand_id, outcome in outcomes.items()]
+        )
+        logger.info("Indexed %s decisions from stored actions", len(postings))
+    
+    def rebuild_situation_index(self):
+        """Rebuild the situation index from stored hands and actions in one transaction"""
+        conn = sqlite3.connect(self.db_path)
+        
+        try:
+            self._rebuild_situation_index(conn.cursor())
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+    
+    def _situation_id(self, cursor, key):
+        """Id of a (hand_class, total, upcard, action) situation, added to the dictionary if new"""
+        situation_id = self._situation_ids.get(key)
+        if situation_id is not None:
+            return situation_id
+        
+        query = 'SELECT id FROM situations WHERE hand_class = ? AND total = ? AND upcard = ? AND action = ?'
+        row = cursor.execute(query, key).fetchone()
+        if row is not None:
+            self._situation_ids[key] = row[0]
+            return row[0]
+        # Not cached yet: if this transaction rolls back, the id could be reused for another situation
+        cursor.execute('INSERT OR IGNORE INTO situations (hand_class, total, upcard, action) VALUES (?, ?, ?, ?)', key)
+        return cursor.execute(query, key).fetchone()[0]
+    
+    def _post_situation(self, cursor, hand_id, action, state, formkey):
+        """Add a decision to its situation's posting list and queue it for its hand's outcome"""
+        cards = state.get('player_split' if action.endswith('_split') else 'player') or []
+        upcard = upcard_rank((state.get('dealer') or [None])[0])
+        hand_class, total = classify_hand(cards)
+        if hand_class is None or upcard is None:
+            return
+        
+        situation_id = self._situation_id(cursor, (hand_class, total, upcard, action))
+        cursor.execute('INSERT OR IGNORE INTO situation_postings (situation_id, hand_id) VALUES (?, ?)',
+                       (situation_id, hand_id))
+        cursor.execute('INSERT OR IGNORE INTO decision_outcomes (hand_id, formkey) VALUES (?, ?)',
+                       (hand_id, formkey))
     
     def store_hand(self, state, gambler, timestamp, formkey='default'):
         """Store a hand in the database"""
@@ -139,31 +637,190 @@ class Database:
             return hand_id
         
         except Exception as e:
-            logger.error(f"Error storing hand: {e}")
+            logger.error("Error storing hand: %s", e, extra={'formkey': formkey})
             conn.rollback()
             return None
         finally:
             conn.close()
     
-    def store_action(self, hand_id, action, player_value, dealer_value):
-        """Store an action taken during a hand"""
+    def store_action(self, hand_id, action, player_value, dealer_value, state=None, formkey='default',
+                     keep_state=False):
+        """
+        Store an action taken during a hand
+        
+        With the decided state the action is also added to the situation
+        index, in the same transaction. keep_state also saves the state on the
+        action row, for hand rows that are later overwritten with a newer
+        state (the /game_delta protocol keeps one row per hand).
+        """
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
         try:
             cursor.execute('''
-                INSERT INTO actions (hand_id, action, player_value, dealer_value, timestamp)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (hand_id, action, player_value, dealer_value, datetime.now().isoformat()))
+                INSERT INTO actions (hand_id, action, player_value, dealer_value, timestamp, state)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (hand_id, action, player_value, dealer_value, datetime.now().isoformat(),
+                  json.dumps(state) if keep_state and state is not None else None))
+            
+            if state is not None and hand_id is not None:
+                self._post_situation(cursor, hand_id, action, state, formkey)
             
             conn.commit()
         except Exception as e:
-            logger.error(f"Error storing action: {e}")
+            logger.error("Error storing action: %s", e)
             conn.rollback()
         finally:
             conn.close()
     
-    def update_hand_outcome(self, hand_id, state):
+    def store_actions(self, hand_id, actions, formkey='default'):
+        """
+        Store several actions of a hand in one transaction
+        
+        Args:
+            actions: (action, player_value, dealer_value, state) tuples, where
+                state is the state the action was decided on (None if unknown).
+                It is kept on the action row, since the hand row holds another
+                state, and indexes the action like store_action does.
+        """
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        try:
+            timestamp = datetime.now().isoformat()
+            for action, player_value, dealer_value, state in actions:
+                # An unknown state is stored as JSON null, which replay and the situation index skip
+                cursor.execute('''
+                    INSERT INTO actions (hand_id, action, player_value, dealer_value, timestamp, state)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', (hand_id, action, player_value, dealer_value, timestamp, json.dumps(state)))
+                if state is not None and hand_id is not None:
+                    self._post_situation(cursor, hand_id, action, state, formkey)
+            
+            conn.commit()
+        except Exception as e:
+            logger.error("Error storing actions: %s", e)
+            conn.rollback()
+        finally:
+            conn.close()
+    
+    def update_hand_state(self, hand_id, state):
+        """Overwrite a stored hand with its latest state (used when a hand row outlives many requests)"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        try:
+            wager = state.get('wager', {})
+            
+            cursor.execute('''
+                UPDATE hands
+                SET wager_amount = ?, wager_currency = ?,
+                    player_cards = ?, dealer_cards = ?, player_value = ?, dealer_value = ?,
+                    player_split_cards = ?, player_split_value = ?,
+                    has_split = ?, doubled_down = ?, bought_insurance = ?,
+                    status = ?, status_split = ?, payout = ?,
+                    raw_state = ?
+                WHERE id = ?
+            ''', (
+                wager.get('amount', 0),
+                wager.get('currency', 'coins'),
+                json.dumps(state.get('player', [])),
+                json.dumps(state.get('dealer', [])),
+                state.get('player_value', 0),
+                state.get('dealer_value', 0),
+                json.dumps(state.get('player_split', [])),
+                state.get('player_split_value', 0),
+                state.get('has_player_split', False),
+                state.get('player_doubled_down', False),
+                state.get('player_bought_insurance', False),
+                state.get('status', ''),
+                state.get('status_split', ''),
+                state.get('payout', 0),
+                json.dumps(state),
+                hand_id
+            ))
+            
+            conn.commit()
+        except Exception as e:
+            logger.error("Error updating hand state: %s", e)
+            conn.rollback()
+        finally:
+            conn.close()
+    
+    def load_delta_session(self, formkey):
+        """
+        Stored /game_delta session of a formkey
+        
+        Returns:
+            Dict with 'version', 'seq', 'hand_id', 'strategy', 'state', 'gambler'
+            and 'last_response', or None if the formkey has no session
+        """
+        conn = sqlite3.connect(self.db_path)
+        
+        try:
+            row = conn.execute('''
+                SELECT version, seq, hand_id, strategy, state, gambler, last_response
+                FROM delta_sessions WHERE formkey = ?
+            ''', (formkey,)).fetchone()
+        finally:
+            conn.close()
+        
+        if row is None:
+            return None
+        version, seq, hand_id, strategy, state, gambler, last_response = row
+        return {
+            'version': version,
+            'seq': seq,
+            'hand_id': hand_id,
+            'strategy': strategy,
+            'state': json.loads(state),
+            'gambler': json.loads(gambler),
+            'last_response': json.loads(last_response) if last_response else None
+        }
+    
+    def save_delta_session(self, formkey, session, version):
+        """
+        Store a /game_delta session unless another process changed it since `version`
+        
+        Args:
+            session: Dict with the fields load_delta_session returns (its 'version' is ignored)
+            version: Version the session was loaded at (0 for a session never stored)
+        
+        Returns:
+            True if stored (the stored version is then version + 1), False on a conflicting write
+        """
+        conn = sqlite3.connect(self.db_path)
+        
+        try:
+            cursor = conn.execute('''
+                INSERT INTO delta_sessions (formkey, version, seq, hand_id, strategy, state, gambler, last_response, updated)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(formkey) DO UPDATE SET
+                    version = excluded.version, seq = excluded.seq, hand_id = excluded.hand_id,
+                    strategy = excluded.strategy, state = excluded.state, gambler = excluded.gambler,
+                    last_response = excluded.last_response, updated = excluded.updated
+                WHERE delta_sessions.version = ?
+            ''', (
+                formkey,
+                version + 1,
+                session['seq'],
+                session['hand_id'],
+                session['strategy'],
+                json.dumps(session['state']),
+                json.dumps(session['gambler']),
+                json.dumps(session['last_response']) if session['last_response'] is not None else None,
+                datetime.now().isoformat(),
+                version
+            ))
+            conn.commit()
+            return cursor.rowcount == 1
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+    
+    def update_hand_outcome(self, hand_id, state, formkey='default'):
         """Update hand with final outcome"""
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
@@ -187,27 +844,66 @@ class Database:
             ))
             
             # Update dealer patterns
-            if state.get('dealer_value') and len(state.get('dealer', [])) > 0:
-                upcard = state.get('dealer', [])[0]
+            upcard = upcard_rank((state.get('dealer') or [None])[0])
+            if state.get('dealer_value') and upcard:
                 dealer_value = state.get('dealer_value', 0)
                 busted = dealer_value < 0 or dealer_value > 21
                 
                 cursor.execute('''
-                    INSERT INTO dealer_patterns (upcard, final_value, busted, count)
-                    VALUES (?, ?, ?, 1)
-                    ON CONFLICT DO UPDATE SET count = count + 1
-                ''')
+                    INSERT INTO dealer_patterns (formkey, upcard, final_value, busted, count)
+                    VALUES (?, ?, ?, ?, 1)
+                    ON CONFLICT (formkey, upcard, final_value) DO UPDATE SET count = count + 1
+                ''', (formkey, upcard, dealer_value, busted))
+            
+            # Credit the formkey's decisions that were waiting for a finished hand
+            status = state.get('status')
+            if status in FINISHED_STATUSES:
+                net = hand_net(status, (state.get('wager') or {}).get('amount', 0), state.get('payout', 0))
+                cursor.execute('''
+                    UPDATE decision_outcomes SET outcome_id = ?, status = ?, net = ?
+                    WHERE formkey = ? AND outcome_id IS NULL
+                ''', (hand_id, status, net, formkey))
             
             # Update daily statistics
             self._update_statistics(cursor, state)
             
+            self._bump_stats_version(cursor, formkey)
+            
             conn.commit()
         except Exception as e:
-            logger.error(f"Error updating hand outcome: {e}")
+            logger.error("Error updating hand outcome: %s", e, extra={'formkey': formkey})
             conn.rollback()
+            # The finished hand row is already stored, so cached statistics are stale regardless
+            try:
+                self._bump_stats_version(cursor, formkey)
+                conn.commit()
+            except sqlite3.Error as e:
+                logger.error("Error invalidating statistics: %s", e)
+        finally:
+            conn.close()
+    
+    def _bump_stats_version(self, cursor, formkey):
+        """Invalidate cached statistics for a formkey and for the overall totals"""
+        bump_stats_version(cursor, [formkey])
+    
+    def get_statistics_version(self, formkey=None):
+        """Current statistics version for a formkey (or all formkeys), 0 if never updated"""
+        conn = connect_readonly(self.db_path)
+        
+        try:
+            row = conn.execute('SELECT version FROM stats_versions WHERE formkey = ?',
+                               (formkey or '*',)).fetchone()
+            return row[0] if row else 0
+        except Exception as e:
+            logger.error("Error getting statistics version: %s", e)
+            return 0
         finally:
             conn.close()
     
+    def get_statistics_etag(self, formkey=None):
+        """Entity tag for the statistics of a formkey (or all formkeys)"""
+        return f"stats-{self.get_statistics_version(formkey)}"
+    
     def _update_statistics(self, cursor, state):
         """Update statistics table"""
         today = datetime.now().strftime('%Y-%m-%d')
@@ -276,8 +972,29 @@ class Database:
             ''', (wager, today))
     
     def get_statistics(self, formkey=None):
-        """Get current statistics, optionally filtered by formkey"""
-        conn = sqlite3.connect(self.db_path)
+        """
+        Get current statistics, optionally filtered by formkey
+        
+        Results are cached per formkey and only recomputed after
+        update_hand_outcome commits a result that affects them.
+        """
+        key = formkey or '*'
+        version = self.get_statistics_version(formkey)
+        
+        with self._stats_lock:
+            cached = self._stats_cache.get(key)
+        if cached and cached[0] == version:
+            return dict(cached[1])
+        
+        stats = self._compute_statistics(formkey)
+        if stats:
+            with self._stats_lock:
+                self._stats_cache[key] = (version, stats)
+        return dict(stats)
+    
+    def _compute_statistics(self, formkey=None):
+        """Compute statistics from the hands table"""
+        conn = connect_readonly(self.db_path)
         cursor = conn.cursor()
         
         try:
@@ -329,33 +1046,10 @@ class Database:
                 total_won = result[7] or 0
                 total_lost = result[8] or 0
                 
-                win_rate = (wins / total_hands * 100) if total_hands > 0 else 0
-                loss_rate = (losses / total_hands * 100) if total_hands > 0 else 0
-                push_rate = (pushes / total_hands * 100) if total_hands > 0 else 0
-                blackjack_rate = (blackjacks / total_hands * 100) if total_hands > 0 else 0
-                bust_rate = (busts / total_hands * 100) if total_hands > 0 else 0
-                
-                net_profit = total_won - total_lost
-                roi = (net_profit / total_wagered * 100) if total_wagered > 0 else 0
-                
-                return {
-                    'total_hands': total_hands,
-                    'wins': wins,
-                    'losses': losses,
-                    'pushes': pushes,
-                    'blackjacks': blackjacks,
-                    'busts': busts,
-                    'win_rate': round(win_rate, 2),
-                    'loss_rate': round(loss_rate, 2),
-                    'push_rate': round(push_rate, 2),
-                    'blackjack_rate': round(blackjack_rate, 2),
-                    'bust_rate': round(bust_rate, 2),
-                    'total_wagered': total_wagered,
-                    'total_won': total_won,
-                    'total_lost': total_lost,
-                    'net_profit': net_profit,
-                    'roi': round(roi, 2)
-                }
+                return summarize_statistics(
+                    total_hands, wins, losses, pushes, blackjacks, busts,
+                    total_wagered, total_won, total_lost
+                )
             else:
                 return {
                     'total_hands': 0,
@@ -377,39 +1071,63 @@ class Database:
                 }
         
         except Exception as e:
-            logger.error(f"Error getting statistics: {e}")
+            logger.error("Error getting statistics: %s", e)
             return {}
         finally:
             conn.close()
     
-    def get_dealer_patterns(self):
-        """Get dealer patterns analysis"""
-        conn = sqlite3.connect(self.db_path)
+    def get_dealer_patterns(self, formkey=None):
+        """
+        Dealer bust rate and final-value distribution per upcard
+        
+        Reads the dealer_patterns counters, so the cost depends on the number
+        of distinct (upcard, final value) pairs rather than on the number of hands.
+        """
+        conn = connect_readonly(self.db_path)
         cursor = conn.cursor()
         
         try:
-            cursor.execute('''
-                SELECT upcard, 
-                       SUM(CASE WHEN busted = 1 THEN count ELSE 0 END) as bust_count,
-                       SUM(count) as total_count
-                FROM dealer_patterns
-                GROUP BY upcard
-            ''')
+            if formkey:
+                cursor.execute('''
+                    SELECT upcard, final_value, busted, count
+                    FROM dealer_patterns
+                    WHERE formkey = ?
+                ''', (formkey,))
+            else:
+                cursor.execute('''
+                    SELECT upcard, final_value, busted, SUM(count)
+                    FROM dealer_patterns
+                    GROUP BY upcard, final_value
+                ''')
             
             patterns = {}
-            for row in cursor.fetchall():
-                upcard, bust_count, total_count = row
-                bust_rate = (bust_count / total_count * 100) if total_count > 0 else 0
-                patterns[upcard] = {
-                    'total': total_count,
-                    'busts': bust_count,
-                    'bust_rate': round(bust_rate, 2)
-                }
+            for upcard, final_value, busted, count in cursor.fetchall():
+                pattern = patterns.setdefault(upcard, {'total': 0, 'busts': 0, 'final_values': {}})
+                pattern['total'] += count
+                if busted:
+                    pattern['busts'] += count
+                pattern['final_values'][final_value] = count
+            
+            for pattern in patterns.values():
+                bust_rate = (pattern['busts'] / pattern['total'] * 100) if pattern['total'] > 0 else 0
+                pattern['bust_rate'] = round(bust_rate, 2)
             
             return patterns
         
         except Exception as e:
-            logger.error(f"Error getting dealer patterns: {e}")
+            logger.error("Error getting dealer patterns: %s", e)
             return {}
         finally:
-            conn.close()
\ No newline at end of file
+            conn.close()
+    
+    def get_situation_outcomes(self, **filters):
+        """Outcome summaries from the situation index (filters as for situation_outcomes)"""
+        conn = connect_readonly(self.db_path)
+        
+        try:
+            return situation_outcomes(conn.cursor(), **filters)
+        except Exception as e:
+            logger.error("Error querying situations: %s", e)
+            return []
+        finally:
+            conn.close()
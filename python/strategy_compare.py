@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+Strategy A/B comparison with common random numbers
+Plays several strategies on identical pre-dealt hands and reports paired EV
+differences against a baseline, stopping as soon as every comparison is significant
+"""
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from tabulate import tabulate
+
+from confidence import mean_interval
+from strategy_replay import load_strategy, hand_value
+
+# Card strings handed to strategies; index i is the card of value i + 1 (aces low)
+RANK_CARDS = ['A', '2', '3', '4', '5', '6', '7', '8', '9', 'X']
+
+# Per hand: two player cards, upcard and hole card, then separate player and dealer draw streams
+INITIAL_CARDS = 4
+PLAYER_DRAWS = 12
+DEALER_DRAWS = 10
+STREAM_CARDS = INITIAL_CARDS + PLAYER_DRAWS + DEALER_DRAWS
+
+# Worker-local state, set by _init_worker
+_strategies = None
+_decision_caches = None
+
+def deal_streams(rng, hands, decks=0):
+    """
+    Pre-deal the cards for a batch of hands
+    
+    Args:
+        rng: NumPy Generator
+        hands: Number of hands
+        decks: Decks per shoe (0 = infinite deck); each hand is dealt from a freshly shuffled shoe
+    
+    Returns:
+        (hands, STREAM_CARDS) array of indexes into RANK_CARDS
+    """
+    if decks <= 0:
+        # Ten-value cards are four of the thirteen ranks
+        weights = np.array([1] * 9 + [4], dtype=np.float64) / 13
+        return rng.choice(len(RANK_CARDS), size=(hands, STREAM_CARDS), p=weights).astype(np.int8)
+    
+    shoe = np.repeat(np.minimum(np.arange(13), 9), 4 * decks).astype(np.int8)
+    # argsort of uniform keys is a per-row shuffle; only the first STREAM_CARDS are kept
+    order = np.argsort(rng.random((hands, len(shoe))), axis=1)[:, :STREAM_CARDS]
+    return shoe[order]
+
+def _decide(strategy, cache, cards, dealer_value, available_actions, is_split):
+    """Strategy decision with the same per-situation memo as the conformance replay"""
+    total = hand_value(cards)
+    key = (total, dealer_value, tuple(available_actions), is_split, tuple(sorted(cards)))
+    action = cache.get(key)
+    if action is None:
+        action = strategy.get_action(total, dealer_value, available_actions, is_split=is_split, cards=cards)
+        cache[key] = action
+    return action
+
+def play_hand(strategy, cache, stream):
+    """
+    Play one pre-dealt hand and settle it
+    
+    Dealer peeks for blackjack, stands on all 17s, blackjack pays 3:2, one
+    split is allowed (split hand played first, no double after split).
+    Player and dealer draw from separate parts of the stream, so a different
+    player decision never changes the dealer's cards.
+    
+    Returns:
+        Net result in units of the initial wager
+    """
+    cards = [RANK_CARDS[index] for index in stream]
+    player = cards[0:2]
+    dealer = cards[2:4]
+    player_draws = iter(cards[INITIAL_CARDS:INITIAL_CARDS + PLAYER_DRAWS])
+    dealer_draws = iter(cards[INITIAL_CARDS + PLAYER_DRAWS:])
+    dealer_value = 11 if dealer[0] == 'A' else (10 if dealer[0] == 'X' else int(dealer[0]))
+    
+    player_natural = hand_value(player) == 21
+    if hand_value(dealer) == 21:
+        return 0.0 if player_natural else -1.0
+    if player_natural:
+        return 1.5
+    
+    # Each hand is [cards, stake]
+    main = [player, 1.0]
+    
+    def play(hand, is_split, actions):
+        while hand_value(hand[0]) < 21:
+            action = _decide(strategy, cache, hand[0], dealer_value, actions, is_split)
+            if action in ('hit', 'hit_split'):
+                hand[0].append(next(player_draws, 'X'))
+            elif action == 'double' and 'DOUBLE_DOWN' in actions:
+                hand[0].append(next(player_draws, 'X'))
+                hand[1] = 2.0
+                return
+            else:
+                return
+            actions = ['HIT_SPLIT', 'STAY_SPLIT'] if is_split else ['HIT', 'STAY']
+    
+    actions = ['HIT', 'STAY', 'DOUBLE_DOWN']
+    if player[0] == player[1]:
+        actions.append('SPLIT')
+    action = _decide(strategy, cache, player, dealer_value, actions, False)
+    
+    if action == 'split' and 'SPLIT' in actions:
+        split = [[player[1], next(player_draws, 'X')], 1.0]
+        main = [[player[0], next(player_draws, 'X')], 1.0]
+        play(split, True, ['HIT_SPLIT', 'STAY_SPLIT'])
+        play(main, False, ['HIT', 'STAY'])
+        hands = [split, main]
+    else:
+        if action in ('hit', 'hit_split'):
+            main[0] = player + [next(player_draws, 'X')]
+            play(main, False, ['HIT', 'STAY'])
+        elif action == 'double':
+            main = [player + [next(player_draws, 'X')], 2.0]
+        hands = [main]
+    
+    # Dealer only draws if some player hand is still live
+    if any(hand_value(hand) <= 21 for hand, _ in hands):
+        while hand_value(dealer) < 17:
+            dealer.append(next(dealer_draws, 'X'))
+    dealer_total = hand_value(dealer)
+    
+    net = 0.0
+    for hand, stake in hands:
+        total = hand_value(hand)
+        if total > 21:
+            net -= stake
+        elif dealer_total > 21 or total > dealer_total:
+            net += stake
+        elif total < dealer_total:
+            net -= stake
+    return net
+
+def _init_worker(strategy_names):
+    """Load every strategy once per worker process"""
+    global _strategies, _decision_caches
+    _strategies = [load_strategy(name) for name in strategy_names]
+    _decision_caches = [{} for _ in strategy_names]
+
+def simulate_batch(seed, batch, hands, decks):
+    """
+    Play one batch of identical hands through every strategy
+    
+    The batch's cards depend only on (seed, batch), so results are
+    reproducible and independent of how batches are spread over workers.
+    
+    Returns:
+        (strategies, hands) float64 array of net results
+    """
+    streams = deal_streams(np.random.default_rng([seed, batch]), hands, decks)
+    results = np.empty((len(_strategies), hands), dtype=np.float64)
+    for row, (strategy, cache) in enumerate(zip(_strategies, _decision_caches)):
+        results[row] = [play_hand(strategy, cache, stream) for stream in streams]
+    return results
+
+class StrategyComparison:
+    def __init__(self, strategy_names, max_hands=1000000, batch_size=20000, alpha=0.05,
+                 decks=0, seed=None, workers=1):
+        if len(strategy_names) < 2:
+            raise ValueError("Need a baseline and at least one challenger")
+        # Results are keyed by name, so a repeated strategy would overwrite its own row
+        if len(set(strategy_names)) != len(strategy_names):
+            raise ValueError("Each strategy can only be compared once")
+        self.strategy_names = list(strategy_names)
+        self.max_hands = max_hands
+        self.batch_size = batch_size
+        self.alpha = alpha
+        self.decks = decks
+        self.seed = seed if seed is not None else int(np.random.SeedSequence().entropy % (1 << 32))
+        self.workers = workers
+    
+    @property
+    def looks(self):
+        """Number of interim analyses (one after every batch)"""
+        return max(1, -(-self.max_hands // self.batch_size))
+    
+    @property
+    def look_confidence(self):
+        """
+        Confidence level of each interval
+        
+        Bonferroni over every challenger and every interim look keeps the
+        overall chance of a false verdict at or below alpha despite peeking.
+        """
+        comparisons = len(self.strategy_names) - 1
+        return 1 - self.alpha / (comparisons * self.looks)
+    
+    def _batches(self):
+        """Yield per-batch result arrays in order"""
+        sizes = [min(self.batch_size, self.max_hands - start) for start in range(0, self.max_hands, self.batch_size)]
+        if self.workers <= 1:
+            _init_worker(self.strategy_names)
+            for batch, size in enumerate(sizes):
+                yield simulate_batch(self.seed, batch, size, self.decks)
+            return
+        
+        with ProcessPoolExecutor(self.workers, initializer=_init_worker,
+                                 initargs=(self.strategy_names,)) as executor:
+            futures = [executor.submit(simulate_batch, self.seed, batch, size, self.decks)
+                       for batch, size in enumerate(sizes)]
+            try:
+                for future in futures:
+                    yield future.result()
+            finally:
+                for future in futures:
+                    future.cancel()
+    
+    def summarize(self, results, confidence):
+        """
+        Per-strategy EV and paired differences against the baseline
+        
+        Returns:
+            Dict with 'hands', 'ev' (per strategy) and 'comparisons' (per challenger,
+            with interval, verdict and the variance reduction from pairing)
+        """
+        baseline = results[0]
+        summary = {'hands': results.shape[1], 'ev': {}, 'comparisons': {}}
+        for name, values in zip(self.strategy_names, results):
+            summary['ev'][name] = mean_interval(values, confidence)
+        
+        for name, values in zip(self.strategy_names[1:], results[1:]):
+            differences = values - baseline
+            interval = mean_interval(differences, confidence)
+            if interval is None:
+                continue
+            if interval['low'] > 0:
+                verdict = 'better'
+            elif interval['high'] < 0:
+                verdict = 'worse'
+            else:
+                verdict = 'undecided'
+            
+            # Independent runs would need this many times the hands for the same precision
+            paired_variance = differences.var(ddof=1)
+            independent_variance = values.var(ddof=1) + baseline.var(ddof=1)
+            interval['verdict'] = verdict
+            interval['identical'] = float(np.mean(differences == 0))
+            interval['variance_reduction'] = (independent_variance / paired_variance
+                                              if paired_variance > 0 else float('inf'))
+            summary['comparisons'][name] = interval
+        return summary
+    
+    def run(self, progress=None):
+        """
+        Simulate batch by batch until every challenger has a verdict or max_hands is reached
+        
+        Args:
+            progress: Optional callable receiving the summary after every batch
+        
+        Returns:
+            Final summary dict (see summarize) with 'stopped_early' set
+        """
+        confidence = self.look_confidence
+        collected = []
+        summary = None
+        for results in self._batches():
+            collected.append(results)
+            summary = self.summarize(np.concatenate(collected, axis=1), confidence)
+            if progress is not None:
+                progress(summary)
+            comparisons = summary['comparisons'].values()
+            if len(comparisons) == len(self.strategy_names) - 1 and all(c['verdict'] != 'undecided' for c in comparisons):
+                break
+        
+        summary['stopped_early'] = summary['hands'] < self.max_hands
+        return summary
+    
+    def print_report(self, summary):
+        """Print per-strategy EV and the paired comparison table"""
+        confidence = self.look_confidence
+        print("\n" + "="*60)
+        print(" STRATEGY COMPARISON (common random numbers)")
+        print("="*60)
+        print(f"\nHands per strategy: {summary['hands']:,}"
+              f"{' (stopped early)' if summary['stopped_early'] else ''}")
+        print(f"Seed: {self.seed}  Decks: {self.decks or 'infinite'}  "
+              f"Per-look confidence: {confidence:.6f} (overall alpha {self.alpha})")
+        
+        data = []
+        for name, interval in summary['ev'].items():
+            if interval is not None:
+                data.append([name, f"{interval['estimate'] * 100:+.3f}%",
+                             f"[{interval['low'] * 100:+.3f}%, {interval['high'] * 100:+.3f}%]"])
+        print("\nEV per Initial Wager:")
+        print(tabulate(data, headers=['Strategy', 'EV', 'Interval'], tablefmt='grid'))
+        
+        data = []
+        for name, comparison in summary['comparisons'].items():
+            data.append([
+                f"{name} - {self.strategy_names[0]}",
+                f"{comparison['estimate'] * 100:+.3f}%",
+                f"[{comparison['low'] * 100:+.3f}%, {comparison['high'] * 100:+.3f}%]",
+                f"{comparison['identical'] * 100:.1f}%",
+                f"{comparison['variance_reduction']:.1f}x",
+                comparison['verdict']
+            ])
+        print("\nPaired Differences:")
+        print(tabulate(data, headers=['Comparison', 'EV Diff', 'Interval', 'Identical Hands',
+                                      'Variance Reduction', 'Verdict'], tablefmt='grid'))
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare strategies on identical simulated hands')
+    parser.add_argument('strategies', nargs='+', help='Strategy module names; the first is the baseline')
+    parser.add_argument('--max-hands', type=int, default=1000000, help='Hands per strategy before giving up')
+    parser.add_argument('--batch-size', type=int, default=20000, help='Hands between interim looks')
+    parser.add_argument('--alpha', type=float, default=0.05, help='Overall false-verdict rate')
+    parser.add_argument('--decks', type=int, default=0, help='Decks per shoe (0 = infinite deck)')
+    parser.add_argument('--seed', type=int, default=None, help='Seed for reproducible card streams')
+    parser.add_argument('--workers', type=int, default=1, help='Worker processes')
+    
+    args = parser.parse_args()
+    if len(set(args.strategies)) != len(args.strategies):
+        parser.error("each strategy can only be named once")
+    
+    comparison = StrategyComparison(args.strategies, args.max_hands, args.batch_size, args.alpha,
+                                    args.decks, args.seed, args.workers)
+    
+    def progress(summary):
+        verdicts = ', '.join(f"{name}: {c['estimate'] * 100:+.3f}% ({c['verdict']})"
+                             for name, c in summary['comparisons'].items())
+        print(f"  {summary['hands']:,} hands - {verdicts}")
+    
+    comparison.print_report(comparison.run(progress))
+
+if __name__ == '__main__':
+    main()
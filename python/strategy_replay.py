@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Strategy conformance replay
+Re-runs every recorded decision through a strategy and reports where the
+stored actions disagree with what the strategy recommends today
+"""
+
+import argparse
+import importlib
+import json
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+
+from tabulate import tabulate
+
+from database import connect_readonly
+
+FINISHED_STATUSES = ('WON', 'LOST', 'PUSHED', 'BLACKJACK')
+
+# Recorded actions that make the same move as the strategy's plain names
+ACTION_ALIASES = {'hit_split': 'hit', 'stay_split': 'stay'}
+
+# Worker-local state, set by _init_worker
+_strategy = None
+_decision_cache = {}
+
+def load_strategy(strategy_name):
+    """Load a strategy module the same way the server does"""
+    module = importlib.import_module(f'strategies.{strategy_name}')
+    return getattr(module, 'Strategy')()
+
+def card_value(card_str):
+    """Value of a card string ('KD', 'XH', 'AS'), aces counted as 11"""
+    if not card_str or card_str == '?':
+        return 0
+    rank = card_str[0]
+    if rank == 'A':
+        return 11
+    elif rank in ['K', 'Q', 'J', 'X']:
+        return 10
+    return int(rank)
+
+def hand_value(cards):
+    """Best blackjack total for a list of card strings (mirrors the server)"""
+    values = [card_value(card) for card in cards or [] if card != '?']
+    total = sum(values)
+    aces = values.count(11)
+    while total > 21 and aces > 0:
+        total -= 10
+        aces -= 1
+    return total
+
+def _init_worker(strategy_name):
+    """Load the strategy once per worker process"""
+    global _strategy, _decision_cache
+    _strategy = load_strategy(strategy_name)
+    _decision_cache = {}
+
+def recommend(state):
+    """
+    Recompute the decision the server would make for a stored PLAYING state
+    
+    Returns:
+        Tuple of (player_total, dealer_upcard_value, recommended_action)
+    """
+    available_actions = state.get('actions', [])
+    dealer_upcard = (state.get('dealer') or [None])[0]
+    dealer_value = card_value(dealer_upcard)
+    
+    is_split = bool(state.get('has_player_split')) and (
+        'HIT_SPLIT' in available_actions or 'STAY_SPLIT' in available_actions
+    )
+    cards = state.get('player_split', []) if is_split else state.get('player', [])
+    total = hand_value(cards)
+    
+    # Strategies only look at card values, so identical situations share one lookup
+    values = tuple(sorted(card_value(card) for card in cards))
+    key = (total, dealer_value, tuple(sorted(available_actions)), is_split, values)
+    action = _decision_cache.get(key)
+    if action is None:
+        action = _strategy.get_action(total, dealer_value, available_actions, is_split=is_split, cards=cards)
+        _decision_cache[key] = action
+    
+    return total, dealer_value, action
+
+def replay_batch(rows):
+    """Recommend actions for a batch of streamed rows (None for outcome rows)"""
+    results = []
+    for row in rows:
+        raw_state = row[5]
+        if raw_state is None:
+            results.append(None)
+            continue
+        try:
+            state = json.loads(raw_state)
+            # JSON null: a locally taken action whose decided state is unknown
+            results.append(recommend(state) if state else None)
+        except (ValueError, TypeError, AttributeError):
+            results.append(None)
+    return results
+
+class ConformanceReplay:
+    def __init__(self, db_path='database/blackjack_data.db', strategy_name='basic_strategy',
+                 workers=1, batch_size=5000):
+        self.db_path = db_path
+        self.strategy_name = strategy_name
+        self.workers = workers
+        self.batch_size = batch_size
+    
+    def _stream_batches(self, cursor):
+        """
+        Stream hands joined with their actions in id order
+        
+        Each action is replayed on the state it was decided on: the action's
+        own state where one was stored (hand rows the /game_delta protocol
+        overwrites, actions taken from a speculative map), else its hand's row.
+        """
+        cursor.execute('''
+            SELECT h.id, h.formkey, h.status, h.wager_amount, h.payout,
+                   CASE WHEN a.action IS NOT NULL THEN COALESCE(a.state, h.raw_state) END as raw_state,
+                   a.action
+            FROM hands h
+            LEFT JOIN actions a ON a.hand_id = h.id
+            WHERE a.action IS NOT NULL
+               OR h.status IN ('WON', 'LOST', 'PUSHED', 'BLACKJACK')
+            ORDER BY h.id
+        ''')
+        while True:
+            rows = cursor.fetchmany(self.batch_size)
+            if not rows:
+                break
+            yield rows
+    
+    def _replayed_batches(self, cursor):
+        """Yield (rows, recommendations) in order, fanning batches out to workers"""
+        if self.workers <= 1:
+            _init_worker(self.strategy_name)
+            for rows in self._stream_batches(cursor):
+                yield rows, replay_batch(rows)
+            return
+        
+        with ProcessPoolExecutor(self.workers, initializer=_init_worker,
+                                 initargs=(self.strategy_name,)) as executor:
+            in_flight = deque()
+            for rows in self._stream_batches(cursor):
+                in_flight.append((rows, executor.submit(replay_batch, rows)))
+                # Bound memory: never hold more than a couple of batches per worker
+                if len(in_flight) >= self.workers * 2:
+                    rows, future = in_flight.popleft()
+                    yield rows, future.result()
+            while in_flight:
+                rows, future = in_flight.popleft()
+                yield rows, future.result()
+    
+    def run(self):
+        """
+        Replay all recorded decisions
+        
+        Each decision is credited with the net result of the next finished hand
+        stored for the same formkey, since the server stores one row per state.
+        
+        Returns:
+            Dict keyed by (player_total, dealer_upcard) with decision, mismatch
+            and net-result totals, plus a 'mismatch_pairs' counter
+        """
+        conn = connect_readonly(self.db_path)
+        cursor = conn.cursor()
+        
+        cells = defaultdict(lambda: {
+            'decisions': 0, 'mismatches': 0,
+            'conform_hands': 0, 'conform_net': 0,
+            'mismatch_hands': 0, 'mismatch_net': 0,
+            'mismatch_pairs': defaultdict(int)
+        })
+        pending = defaultdict(list)
+        
+        try:
+            for rows, recommendations in self._replayed_batches(cursor):
+                for row, recommendation in zip(rows, recommendations):
+                    hand_id, formkey, status, wager, payout, raw_state, recorded = row
+                    
+                    if recommendation is not None:
+                        total, upcard, recommended = recommendation
+                        mismatch = ACTION_ALIASES.get(recorded, recorded) != ACTION_ALIASES.get(recommended, recommended)
+                        cell = cells[(total, upcard)]
+                        cell['decisions'] += 1
+                        if mismatch:
+                            cell['mismatches'] += 1
+                            cell['mismatch_pairs'][(recorded, recommended)] += 1
+                        pending[formkey].append((cell, mismatch))
+                    
+                    if status in FINISHED_STATUSES and pending[formkey]:
+                        wager = wager or 0
+                        if status in ('WON', 'BLACKJACK'):
+                            net = (payout or 0) - wager
+                        elif status == 'LOST':
+                            net = -wager
+                        else:
+                            net = 0
+                        for cell, mismatch in pending.pop(formkey):
+                            prefix = 'mismatch' if mismatch else 'conform'
+                            cell[f'{prefix}_hands'] += 1
+                            cell[f'{prefix}_net'] += net
+        finally:
+            conn.close()
+        
+        return dict(cells)
+    
+    @staticmethod
+    def ev_impact(cell):
+        """
+        Estimated total cost of the mismatches in one cell
+        
+        Mismatches times the difference between the average net result of
+        mismatched and conforming decisions. None if either side is empty.
+        """
+        if not cell['mismatch_hands'] or not cell['conform_hands']:
+            return None
+        mismatch_ev = cell['mismatch_net'] / cell['mismatch_hands']
+        conform_ev = cell['conform_net'] / cell['conform_hands']
+        return cell['mismatches'] * (mismatch_ev - conform_ev)
+    
+    def print_report(self, cells):
+        """Print mismatch counts and EV impact by (total, upcard)"""
+        decisions = sum(cell['decisions'] for cell in cells.values())
+        mismatches = sum(cell['mismatches'] for cell in cells.values())
+        
+        print("\n" + "="*60)
+        print(f" STRATEGY CONFORMANCE: {self.strategy_name}")
+        print("="*60)
+        rate = (mismatches / decisions * 100) if decisions > 0 else 0
+        print(f"\nDecisions replayed: {decisions}")
+        print(f"Mismatches: {mismatches} ({rate:.2f}%)")
+        
+        data = []
+        for (total, upcard), cell in cells.items():
+            if not cell['mismatches']:
+                continue
+            impact = self.ev_impact(cell)
+            top_pair = max(cell['mismatch_pairs'].items(), key=lambda item: item[1])[0]
+            data.append([
+                total, upcard, cell['decisions'], cell['mismatches'],
+                f"{cell['mismatches'] / cell['decisions'] * 100:.1f}%",
+                f"{top_pair[0]} -> {top_pair[1]}",
+                f"{impact:.1f}" if impact is not None else 'n/a'
+            ])
+        
+        if data:
+            data.sort(key=lambda row: -row[3])
+            print("\nMismatches by Situation:")
+            print(tabulate(data, headers=['Total', 'Upcard', 'Decisions', 'Mismatches', 'Rate',
+                                          'Recorded -> Strategy', 'EV Impact'], tablefmt='grid'))
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay recorded decisions through a strategy')
+    parser.add_argument('--db', default='database/blackjack_data.db', help='Database file path')
+    parser.add_argument('--strategy', default='basic_strategy', help='Strategy module name')
+    parser.add_argument('--workers', type=int, default=1, help='Worker processes for large histories')
+    parser.add_argument('--batch-size', type=int, default=5000, help='Rows per batch')
+    
+    args = parser.parse_args()
+    
+    replay = ConformanceReplay(args.db, args.strategy, args.workers, args.batch_size)
+    replay.print_report(replay.run())
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Traffic capture for /game_state
+Appends request payloads to rotating NDJSON files through a buffered background writer
+"""
+
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+class CaptureWriter:
+    """
+    Non-blocking capture of request payloads
+    
+    Request threads only enqueue; serialization and file I/O happen on one
+    background thread. If the queue fills up records are dropped and counted
+    rather than slowing down the request.
+    """
+    
+    def __init__(self, directory, max_bytes=64 * 1024 * 1024, queue_size=10000, flush_interval=1.0):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.captured = 0
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._file = None
+        self._file_bytes = 0
+        self._sequence = 0
+        os.makedirs(directory, exist_ok=True)
+        self._start()
+        # Forked server workers need their own writer thread and files
+        os.register_at_fork(after_in_child=self._after_fork)
+    
+    def _start(self):
+        self._thread = threading.Thread(target=self._run, name='capture-writer', daemon=True)
+        self._thread.start()
+    
+    def _after_fork(self):
+        self._queue = queue.Queue(maxsize=self._queue.maxsize)
+        self._file = None
+        self._file_bytes = 0
+        self._sequence = 0
+        self._start()
+    
+    def capture(self, payload):
+        """Queue one payload with a monotonic timestamp"""
+        try:
+            self._queue.put_nowait((time.monotonic(), payload))
+        except queue.Full:
+            self.dropped += 1
+    
+    def close(self):
+        """Flush everything queued so far and stop the writer"""
+        self._queue.put(None)
+        self._thread.join(timeout=10)
+    
+    def _open_next(self):
+        """Start a new capture file"""
+        if self._file is not None:
+            self._file.close()
+        self._sequence += 1
+        name = f"capture-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{self._sequence:04d}.ndjson"
+        self._file = open(os.path.join(self.directory, name), 'a', buffering=1024 * 1024)
+        self._file_bytes = 0
+        logger.info("Capturing traffic to %s", name)
+    
+    def _run(self):
+        last_flush = time.monotonic()
+        while True:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                item = False
+            
+            if item:
+                monotonic, payload = item
+                try:
+                    line = json.dumps({'t': monotonic, 'payload': payload}, separators=(',', ':')) + '\n'
+                except (TypeError, ValueError) as e:
+                    logger.error("Error serializing captured payload: %s", e)
+                    continue
+                if self._file is None or self._file_bytes >= self.max_bytes:
+                    self._open_next()
+                self._file.write(line)
+                self._file_bytes += len(line)
+                self.captured += 1
+            
+            now = time.monotonic()
+            if self._file is not None and (item is None or now - last_flush >= self.flush_interval):
+                self._file.flush()
+                last_flush = now
+            
+            if item is None:
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+                return
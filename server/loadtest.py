@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+"""
+Load generator for the decision server
+Simulates concurrent bot sessions posting realistic hands to /game_state and /stats
+"""
+
+import argparse
+import http.client
+import json
+import random
+import ssl
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from urllib.parse import urlparse
+
+CARD_RANKS = 'A23456789XJQK'
+CARD_SUITS = 'SHDC'
+
+def card_value(card_str):
+    """Card value with aces as 11"""
+    rank = card_str[0]
+    if rank == 'A':
+        return 11
+    elif rank in ['K', 'Q', 'J', 'X']:
+        return 10
+    return int(rank)
+
+def hand_value(cards):
+    """Best blackjack total for a list of card strings"""
+    total = sum(card_value(card) for card in cards)
+    aces = sum(1 for card in cards if card[0] == 'A')
+    while total > 21 and aces > 0:
+        total -= 10
+        aces -= 1
+    return total
+
+def state_delta(previous, current):
+    """Split the changes between two states into /game_delta 'append' and 'set' parts"""
+    append, changed = {}, {}
+    for field, value in current.items():
+        old = previous.get(field)
+        if value == old:
+            continue
+        if (field in ('player', 'dealer', 'player_split', 'actions') and isinstance(old, list)
+                and len(value) > len(old) and value[:len(old)] == old):
+            append[field] = value[len(old):]
+        else:
+            changed[field] = value
+    return append, changed
+
+def speculative_rank(card_str):
+    """Key of a card in a speculative next-card map (ten-value cards are 'X')"""
+    return 'X' if card_str[0] in 'XJQK' else card_str[0]
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(q * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+class Session(threading.Thread):
+    """One simulated bot: its own formkey, connection and shoe"""
+    
+    def __init__(self, index, args, results, stop_event):
+        super().__init__(daemon=True)
+        self.formkey = f'load-{index}'
+        self.args = args
+        self.results = results
+        self.stop_event = stop_event
+        self.rng = random.Random(args.seed * 1000 + index if args.seed is not None else None)
+        self.url = urlparse(args.url)
+        self.conn = None
+        self.stats_etag = None
+        self.hands = 0
+        
+        # Delta protocol: last state the server acknowledged and its sequence number
+        self.seq = 0
+        self.server_state = None
+        
+        # Speculation: next-card map from the last response, and actions taken from it not yet reported
+        self.plan = None
+        self.local_actions = []
+        
+        # Open loop: each session sends at its share of the total rate
+        self.interval = args.sessions / args.rate if args.mode == 'open' else 0.0
+        self.next_send = None
+    
+    def _connect(self):
+        if self.url.scheme == 'https':
+            context = ssl.create_default_context()
+            if self.args.insecure:
+                context.check_hostname = False
+                context.verify_mode = ssl.CERT_NONE
+            return http.client.HTTPSConnection(self.url.hostname, self.url.port or 443, context=context, timeout=30)
+        return http.client.HTTPConnection(self.url.hostname, self.url.port or 80, timeout=30)
+    
+    def _request(self, method, path, body=None, headers=None):
+        """
+        Send one request and record its latency
+        
+        In open-loop mode latency is measured from the scheduled send time, so a
+        slow server is charged for the queueing it causes (no coordinated omission).
+        """
+        if self.interval:
+            if self.next_send is None:
+                self.next_send = time.perf_counter()
+            delay = self.next_send - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            start = self.next_send
+            self.next_send += self.interval
+        else:
+            start = time.perf_counter()
+        
+        headers = dict(headers or {})
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode()
+            headers['Content-Type'] = 'application/json'
+        
+        endpoint = path.split('?')[0]
+        try:
+            if self.conn is None:
+                self.conn = self._connect()
+            self.conn.request(method, path, payload, headers)
+            response = self.conn.getresponse()
+            data = response.read()
+            latency = time.perf_counter() - start
+            ok = response.status < 400
+            self.results.record(endpoint, latency, ok)
+            if response.status == 304 or not data:
+                return response, None
+            return response, json.loads(data)
+        except (OSError, http.client.HTTPException, ValueError):
+            self.results.record(endpoint, time.perf_counter() - start, False)
+            if self.conn is not None:
+                self.conn.close()
+            self.conn = None
+            return None, None
+    
+    def _draw(self):
+        return self.rng.choice(CARD_RANKS) + self.rng.choice(CARD_SUITS)
+    
+    def _post_state(self, state):
+        extra = {}
+        if self.args.speculate:
+            extra['speculate'] = self.args.speculate
+        if self.local_actions:
+            extra['local_actions'] = self.local_actions
+        
+        if self.args.protocol == 'delta':
+            response, data = self._post_delta(state, extra)
+        else:
+            body = {
+                'state': state,
+                'gambler': {'coins': 10000, 'marseybux': 0},
+                'timestamp': datetime.now().isoformat(),
+                'strategy': self.args.strategy,
+                'formkey': self.formkey
+            }
+            body.update(extra)
+            response, data = self._request('POST', '/game_state', body)
+        
+        if response is not None and response.status == 200:
+            self.local_actions = []
+        self.plan = (data or {}).get('next')
+        return (data or {}).get('action', 'none')
+    
+    def _post_delta(self, state, extra):
+        """Send only what changed since the last acknowledged state, resyncing on 409"""
+        self.seq += 1
+        if self.server_state is None:
+            body = {'full_state': state, 'gambler': {'coins': 10000, 'marseybux': 0}}
+        else:
+            append, changed = state_delta(self.server_state, state)
+            body = {'append': append, 'set': changed}
+        body.update(extra, seq=self.seq, formkey=self.formkey, strategy=self.args.strategy)
+        
+        response, data = self._request('POST', '/game_delta', body)
+        if response is not None and response.status == 409:
+            self.seq += 1
+            body = dict(extra, seq=self.seq, formkey=self.formkey, strategy=self.args.strategy,
+                        full_state=state, gambler={'coins': 10000, 'marseybux': 0})
+            response, data = self._request('POST', '/game_delta', body)
+        
+        if response is None or response.status != 200:
+            self.server_state = None
+            return response, None
+        # A finished hand clears the server-held state; the next hand is sent in full
+        self.server_state = None if state.get('status') != 'PLAYING' else json.loads(json.dumps(state))
+        return response, data
+    
+    def _play_hand(self):
+        """Play one hand against the server, following its recommendations"""
+        wager = self.args.wager
+        player = [self._draw(), self._draw()]
+        dealer = [self._draw(), self._draw()]
+        split = []
+        doubled = False
+        
+        state = {
+            'player': player, 'dealer': [dealer[0], '?'], 'player_split': split,
+            'has_player_split': False, 'player_doubled_down': False, 'player_bought_insurance': False,
+            'wager': {'amount': wager, 'currency': 'coins'}, 'status': 'PLAYING', 'payout': 0
+        }
+        
+        def playing(actions):
+            state['actions'] = actions
+            state['player_value'] = hand_value(player)
+            state['player_split_value'] = hand_value(split) if split else 0
+            return self._post_state(state)
+        
+        if hand_value(player) != 21:
+            first = True
+            on_split = False
+            plan = None
+            while not self.stop_event.is_set():
+                if on_split:
+                    actions = ['HIT_SPLIT', 'STAY_SPLIT']
+                else:
+                    actions = ['HIT', 'STAY']
+                    if first:
+                        actions.append('DOUBLE_DOWN')
+                        if card_value(player[0]) == card_value(player[1]) and not split:
+                            actions.append('SPLIT')
+                
+                # Follow the speculative map for the card just drawn instead of asking again
+                hand = split if on_split else player
+                entry = plan.get(speculative_rank(hand[-1])) if plan else None
+                if entry is not None:
+                    action = entry['action']
+                    plan = entry.get('next')
+                    self.local_actions.append({'action': action, 'player_value': hand_value(hand),
+                                               'dealer_value': card_value(dealer[0]), 'cards': list(hand)})
+                else:
+                    action = playing(actions)
+                    plan = self.plan
+                first = False
+                if action not in ('hit', 'hit_split'):
+                    plan = None
+                
+                if action == 'split' and 'SPLIT' in actions:
+                    split.append(player.pop())
+                    player.append(self._draw())
+                    split.append(self._draw())
+                    state['has_player_split'] = True
+                    on_split = True
+                elif action in ('hit', 'hit_split'):
+                    hand = split if on_split else player
+                    hand.append(self._draw())
+                    if hand_value(hand) > 21:
+                        plan = None
+                        if not on_split:
+                            break
+                        on_split = False
+                elif action == 'double':
+                    player.append(self._draw())
+                    doubled = True
+                    state['player_doubled_down'] = True
+                    break
+                elif action == 'stay_split':
+                    on_split = False
+                else:
+                    break
+        
+        # Dealer plays out, then the hand settles
+        while hand_value(dealer) < 17:
+            dealer.append(self._draw())
+        stake = wager * (2 if doubled else 1)
+        player_total = hand_value(player)
+        dealer_total = hand_value(dealer)
+        
+        if player_total == 21 and len(player) == 2 and not split:
+            status, payout = 'BLACKJACK', int(stake * 2.5)
+        elif player_total > 21:
+            status, payout = 'LOST', 0
+        elif dealer_total > 21 or player_total > dealer_total:
+            status, payout = 'WON', stake * 2
+        elif player_total == dealer_total:
+            status, payout = 'PUSHED', stake
+        else:
+            status, payout = 'LOST', 0
+        
+        state.update({
+            'dealer': dealer, 'dealer_value': dealer_total, 'player_value': player_total,
+            'status': status, 'payout': payout, 'actions': ['DEAL']
+        })
+        if split:
+            state['status_split'] = 'WON' if hand_value(split) <= 21 and (dealer_total > 21 or hand_value(split) > dealer_total) else 'LOST'
+        self._post_state(state)
+    
+    def _poll_stats(self):
+        headers = {'If-None-Match': self.stats_etag} if self.stats_etag else {}
+        response, _ = self._request('GET', f'/stats?formkey={self.formkey}', headers=headers)
+        if response is not None and response.getheader('ETag'):
+            self.stats_etag = response.getheader('ETag')
+    
+    def run(self):
+        while not self.stop_event.is_set():
+            self._play_hand()
+            self.hands += 1
+            if self.args.stats_every and self.hands % self.args.stats_every == 0:
+                self._poll_stats()
+            if self.args.think_time and self.args.mode == 'closed':
+                time.sleep(self.args.think_time)
+        if self.conn is not None:
+            self.conn.close()
+
+class Results:
+    """Thread-safe collection of per-endpoint latencies and errors"""
+    
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self._lock = threading.Lock()
+    
+    def record(self, endpoint, latency, ok):
+        with self._lock:
+            self.latencies[endpoint].append(latency)
+            if not ok:
+                self.errors[endpoint] += 1
+    
+    def report(self, elapsed):
+        """Print throughput, latency percentiles and error rates"""
+        rows = []
+        all_latencies = []
+        total_errors = 0
+        for endpoint, latencies in sorted(self.latencies.items()):
+            all_latencies.extend(latencies)
+            total_errors += self.errors[endpoint]
+            rows.append((endpoint, latencies, self.errors[endpoint]))
+        rows.append(('ALL', all_latencies, total_errors))
+        
+        print(f"\n{'Endpoint':<14}{'Requests':>10}{'Req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'p999 ms':>10}{'Errors':>10}")
+        for endpoint, latencies, errors in rows:
+            ordered = sorted(latencies)
+            count = len(ordered)
+            error_rate = (errors / count * 100) if count else 0
+            print(f"{endpoint:<14}{count:>10}{count / elapsed:>10.1f}"
+                  f"{percentile(ordered, 0.5) * 1000:>10.2f}{percentile(ordered, 0.99) * 1000:>10.2f}"
+                  f"{percentile(ordered, 0.999) * 1000:>10.2f}{error_rate:>9.2f}%")
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the blackjack decision server')
+    parser.add_argument('--url', default='http://127.0.0.1:8080', help='Server base URL')
+    parser.add_argument('--sessions', type=int, default=8, help='Concurrent bot sessions (one formkey each)')
+    parser.add_argument('--mode', choices=['closed', 'open'], default='closed',
+                        help='closed: send after each response; open: send at a fixed rate')
+    parser.add_argument('--rate', type=float, default=100.0, help='Total requests per second in open-loop mode')
+    parser.add_argument('--duration', type=float, default=30.0, help='Test duration in seconds')
+    parser.add_argument('--think-time', type=float, default=0.0, help='Pause between hands in closed-loop mode')
+    parser.add_argument('--stats-every', type=int, default=10, help='Poll /stats every N hands per session (0 disables)')
+    parser.add_argument('--strategy', default='basic_strategy', help='Strategy name sent with each state')
+    parser.add_argument('--protocol', choices=['state', 'delta'], default='state',
+                        help='state: full /game_state posts; delta: /game_delta with server-held state')
+    parser.add_argument('--speculate', type=int, default=0,
+                        help='Request next-card maps this many hits deep and act on them locally (0 disables)')
+    parser.add_argument('--wager', type=int, default=5, help='Wager per hand')
+    parser.add_argument('--seed', type=int, default=None, help='Seed for reproducible card sequences')
+    parser.add_argument('--insecure', action='store_true', help='Skip certificate verification for HTTPS')
+    
+    args = parser.parse_args()
+    
+    results = Results()
+    stop_event = threading.Event()
+    sessions = [Session(i, args, results, stop_event) for i in range(args.sessions)]
+    
+    print(f"Running {args.sessions} {args.mode}-loop sessions against {args.url} for {args.duration:g}s")
+    start = time.perf_counter()
+    for session in sessions:
+        session.start()
+    time.sleep(args.duration)
+    stop_event.set()
+    for session in sessions:
+        session.join(timeout=30)
+    elapsed = time.perf_counter() - start
+    
+    hands = sum(session.hands for session in sessions)
+    decisions = sum(len(latencies) for endpoint, latencies in results.latencies.items() if endpoint != '/stats')
+    print(f"Played {hands} hands in {elapsed:.1f}s ({decisions / max(hands, 1):.2f} decision requests per hand)")
+    results.report(elapsed)
+
+if __name__ == '__main__':
+    main()
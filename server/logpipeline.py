@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Logging pipeline for the decision server
+Queue-based asynchronous handler, JSON output and per-formkey rate limiting
+"""
+
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+# LogRecord attributes that are not user-supplied extra fields
+RESERVED_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'suppressed'}
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that leaves formatting to the listener thread
+    
+    The stock handler renders the message on the calling thread before
+    enqueueing; this one enqueues a shallow copy of the record with its
+    arguments intact, so the request thread only pays for a queue put.
+    Records are dropped and counted instead of blocking when the queue is full.
+    """
+    
+    def __init__(self, queue):
+        super().__init__(queue)
+        self.dropped = 0
+    
+    def prepare(self, record):
+        return copy.copy(record)
+    
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, including formkey and any other extra fields"""
+    
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        for key, value in vars(record).items():
+            if key not in RESERVED_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        if getattr(record, 'suppressed', 0):
+            entry['suppressed'] = record.suppressed
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class FormkeyRateLimiter(logging.Filter):
+    """
+    Token bucket per (formkey, message template) for records below WARNING
+    
+    A busy session cannot flood the log with the same line, while quiet
+    sessions and warnings or errors always get through. The number of
+    records dropped since the last one that passed is attached as
+    'suppressed'.
+    """
+    
+    def __init__(self, rate, burst=None):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self._buckets = {}
+        self._lock = threading.Lock()
+    
+    def filter(self, record):
+        formkey = getattr(record, 'formkey', None)
+        if self.rate <= 0 or formkey is None or record.levelno >= logging.WARNING:
+            return True
+        
+        key = (formkey, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            tokens, last, suppressed = self._buckets.get(key, (self.burst, now, 0))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            if tokens < 1:
+                self._buckets[key] = (tokens, now, suppressed + 1)
+                return False
+            self._buckets[key] = (tokens - 1, now, 0)
+        
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+def configure_logging(mode='sync', fmt='text', rate=0.0, level=logging.INFO, queue_size=10000):
+    """
+    Set up root logging for the server
+    
+    Args:
+        mode: 'sync' writes from the calling thread; 'async' hands records to a background listener
+        fmt: 'text' for the classic format or 'json' for one object per line
+        rate: Records per second allowed per formkey and message (0 disables rate limiting)
+        level: Root logger level
+        queue_size: Records buffered in async mode before new ones are dropped
+    
+    Returns:
+        The QueueListener in async mode, otherwise None
+    """
+    output = logging.StreamHandler()
+    output.setFormatter(JsonFormatter() if fmt == 'json' else logging.Formatter(TEXT_FORMAT))
+    
+    root = logging.getLogger()
+    root.setLevel(level)
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    
+    if mode != 'async':
+        if rate > 0:
+            output.addFilter(FormkeyRateLimiter(rate))
+        root.addHandler(output)
+        return None
+    
+    handler = LazyQueueHandler(queue.Queue(maxsize=queue_size))
+    # Rate limiting runs before the put, so suppressed records never reach the queue
+    if rate > 0:
+        handler.addFilter(FormkeyRateLimiter(rate))
+    root.addHandler(handler)
+    
+    def start_listener():
+        listener = logging.handlers.QueueListener(handler.queue, output, respect_handler_level=True)
+        listener.start()
+        return listener
+    
+    listeners = [start_listener()]
+    # Stop whichever listener belongs to this process at exit
+    atexit.register(lambda: listeners[-1].stop())
+    
+    def restart_in_child():
+        # The listener thread does not survive fork; give each worker its own
+        # queue and a fresh listener rather than reviving the inherited one
+        handler.queue = queue.Queue(maxsize=queue_size)
+        listeners[-1] = start_listener()
+    
+    os.register_at_fork(after_in_child=restart_in_child)
+    return listeners[0]
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Background database maintenance
+Thins old raw_state JSON, returns free pages with incremental vacuum and refreshes
+planner statistics, in short slices while the server is idle
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+# raw_state keys kept when a hand is thinned: enough for strategy replay and outcome analysis
+THIN_KEYS = (
+    'player', 'dealer', 'player_split', 'has_player_split', 'actions',
+    'status', 'status_split', 'wager', 'payout'
+)
+
+class MaintenanceScheduler:
+    """
+    Idle-time maintenance for every shard of a ShardRouter
+    
+    Activity is detected with PRAGMA data_version on the scheduler's own
+    connection, which changes whenever any other connection or process
+    commits, so one scheduler works for a single process and for forked
+    workers alike. Work runs in small transactions under a short busy
+    timeout; if the server becomes busy the current slice stops and the
+    writer never waits on maintenance for more than one small batch.
+    """
+    
+    def __init__(self, databases, raw_state_days=0, interval=60.0, idle_seconds=30.0,
+                 slice_seconds=0.05, batch_size=200, vacuum_pages=256, analyze_interval=6 * 3600):
+        self.databases = databases
+        self.raw_state_days = raw_state_days
+        self.interval = interval
+        self.idle_seconds = idle_seconds
+        self.slice_seconds = slice_seconds
+        self.batch_size = batch_size
+        self.vacuum_pages = vacuum_pages
+        self.analyze_interval = analyze_interval
+        self.totals = {'thinned': 0, 'vacuumed_pages': 0, 'analyzed': 0, 'skipped_busy': 0}
+        self._shards = {}
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='db-maintenance', daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+    
+    def status(self):
+        return dict(self.totals, shards=len(self._shards), raw_state_days=self.raw_state_days)
+    
+    def _shard(self, db_path):
+        """Per-shard connection and progress, opened on first use in the scheduler thread"""
+        shard = self._shards.get(db_path)
+        if shard is None:
+            # A short busy timeout: maintenance gives way instead of queueing behind requests
+            conn = sqlite3.connect(db_path, timeout=0.05, isolation_level=None)
+            shard = {
+                'conn': conn,
+                'db_path': db_path,
+                'data_version': None,
+                'changed_at': time.monotonic(),
+                'thin_after_id': 0,
+                'analyzed_at': 0.0
+            }
+            self._shards[db_path] = shard
+        return shard
+    
+    def _is_idle(self, shard):
+        """True once no other connection has committed for idle_seconds"""
+        version = shard['conn'].execute('PRAGMA data_version').fetchone()[0]
+        now = time.monotonic()
+        if version != shard['data_version']:
+            shard['data_version'] = version
+            shard['changed_at'] = now
+        return now - shard['changed_at'] >= self.idle_seconds
+    
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            for database in self.databases.all():
+                try:
+                    shard = self._shard(database.db_path)
+                    if self._is_idle(shard):
+                        self.run_slice(shard)
+                except sqlite3.Error as e:
+                    logger.warning("Maintenance of %s failed: %s", database.db_path, e)
+    
+    def run_slice(self, shard):
+        """One time-boxed round of maintenance on one shard"""
+        deadline = time.monotonic() + self.slice_seconds
+        before = dict(self.totals)
+        try:
+            if self.raw_state_days > 0:
+                self._thin_raw_state(shard, deadline)
+            if time.monotonic() < deadline:
+                self._incremental_vacuum(shard, deadline)
+            if time.monotonic() < deadline and time.time() - shard['analyzed_at'] >= self.analyze_interval:
+                self._analyze(shard)
+        except sqlite3.OperationalError as e:
+            if 'locked' not in str(e) and 'busy' not in str(e):
+                raise
+            # A request holds the write lock; try again on the next idle round
+            self.totals['skipped_busy'] += 1
+        
+        done = {key: self.totals[key] - before[key] for key in self.totals if self.totals[key] != before[key]}
+        if done:
+            logger.info("Maintenance: %s", done)
+    
+    def _still_idle(self, shard, deadline):
+        return time.monotonic() < deadline and self._is_idle(shard)
+    
+    def _thin_raw_state(self, shard, deadline):
+        """Reduce raw_state of hands older than raw_state_days to THIN_KEYS, batch by batch"""
+        conn = shard['conn']
+        cutoff = (datetime.now() - timedelta(days=self.raw_state_days)).isoformat()
+        
+        while self._still_idle(shard, deadline):
+            # Walk the primary key so each batch is a bounded range scan; ids grow with time
+            rows = conn.execute('''
+                SELECT id, timestamp, raw_state FROM hands
+                WHERE id > ?
+                ORDER BY id
+                LIMIT ?
+            ''', (shard['thin_after_id'], self.batch_size)).fetchall()
+            
+            old = [row for row in rows if row[1] < cutoff]
+            if not old:
+                return
+            
+            updates = []
+            for hand_id, _, raw_state in old:
+                if raw_state is None:
+                    continue
+                try:
+                    state = json.loads(raw_state)
+                except ValueError:
+                    continue
+                if not isinstance(state, dict) or state.get('_thin'):
+                    continue
+                thin = {key: state[key] for key in THIN_KEYS if key in state}
+                thin['_thin'] = True
+                updates.append((json.dumps(thin), hand_id))
+            
+            if updates:
+                conn.execute('BEGIN IMMEDIATE')
+                try:
+                    conn.executemany('UPDATE hands SET raw_state = ? WHERE id = ?', updates)
+                    conn.execute('COMMIT')
+                except sqlite3.Error:
+                    conn.execute('ROLLBACK')
+                    raise
+            shard['thin_after_id'] = old[-1][0]
+            self.totals['thinned'] += len(updates)
+            if len(old) < len(rows):
+                # Reached hands newer than the cutoff
+                return
+    
+    def _incremental_vacuum(self, shard, deadline):
+        """Return free pages to the filesystem, a few at a time (auto_vacuum=INCREMENTAL databases only)"""
+        conn = shard['conn']
+        if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+            if not shard.get('vacuum_warned'):
+                logger.warning("%s is not in auto_vacuum=INCREMENTAL mode, so freed pages are not returned; "
+                               "convert it with analyze_data.py --db %s --enable-incremental-vacuum "
+                               "while the server is stopped", shard['db_path'], shard['db_path'])
+                shard['vacuum_warned'] = True
+            return
+        while self._still_idle(shard, deadline):
+            free = conn.execute('PRAGMA freelist_count').fetchone()[0]
+            if not free:
+                return
+            # Each step of the pragma frees one page; executescript runs it to completion
+            conn.executescript(f'PRAGMA incremental_vacuum({min(free, self.vacuum_pages)});')
+            remaining = conn.execute('PRAGMA freelist_count').fetchone()[0]
+            self.totals['vacuumed_pages'] += free - remaining
+            if remaining >= free:
+                return
+    
+    def _analyze(self, shard):
+        """Refresh planner statistics with a bounded sample, then let SQLite optimize"""
+        conn = shard['conn']
+        conn.execute('PRAGMA analysis_limit = 400')
+        conn.execute('ANALYZE')
+        conn.execute('PRAGMA optimize')
+        shard['analyzed_at'] = time.time()
+        self.totals['analyzed'] += 1
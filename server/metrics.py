@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+In-process request metrics
+Fixed-bucket latency histograms and counters, rendered in Prometheus text format
+"""
+
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+
+# Bucket upper bounds in seconds: quarter-octave steps from 10us to ~10s
+DEFAULT_BOUNDS = tuple(1e-5 * 2 ** (i / 4) for i in range(81))
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+class LatencyHistogram:
+    """
+    Latency histogram with fixed, log-spaced buckets
+    
+    Recording takes no lock to stay at a few hundred nanoseconds per sample.
+    Two threads switching mid-increment can lose a sample, which is an
+    acceptable error for monitoring.
+    """
+    __slots__ = ('bounds', 'counts', 'total')
+    
+    def __init__(self, bounds=DEFAULT_BOUNDS):
+        self.bounds = bounds
+        # Last slot holds samples above the largest bound (+Inf)
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0.0
+    
+    def observe(self, seconds):
+        """Record one sample"""
+        self.counts[bisect_left(self.bounds, seconds)] += 1
+        self.total += seconds
+    
+    def snapshot(self):
+        """Copy of (counts, total)"""
+        return list(self.counts), self.total
+    
+    def quantile(self, q, counts=None):
+        """
+        Estimate a quantile by linear interpolation inside its bucket
+        
+        Returns:
+            Seconds, or None if nothing has been recorded
+        """
+        counts = counts if counts is not None else self.snapshot()[0]
+        observed = sum(counts)
+        if observed == 0:
+            return None
+        
+        rank = q * observed
+        cumulative = 0
+        for index, count in enumerate(counts):
+            if count and cumulative + count >= rank:
+                if index >= len(self.bounds):
+                    return self.bounds[-1]
+                lower = self.bounds[index - 1] if index > 0 else 0.0
+                upper = self.bounds[index]
+                return lower + (upper - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.bounds[-1]
+
+class Metrics:
+    """Registry of per-phase latency histograms and request/action counters"""
+    
+    def __init__(self, prefix='bj'):
+        self.prefix = prefix
+        self.phases = defaultdict(LatencyHistogram)
+        self.endpoints = defaultdict(LatencyHistogram)
+        self.requests = defaultdict(int)
+        self.actions = defaultdict(int)
+        self._lock = threading.Lock()
+    
+    def observe_phase(self, phase, seconds):
+        """Record how long one phase of request handling took"""
+        self.phases[phase].observe(seconds)
+    
+    def observe_request(self, endpoint, status, seconds):
+        """Record a finished request's latency and status"""
+        self.endpoints[endpoint].observe(seconds)
+        with self._lock:
+            self.requests[(endpoint, status)] += 1
+    
+    def count_action(self, action):
+        """Count a recommended action"""
+        with self._lock:
+            self.actions[action] += 1
+    
+    def _render_histograms(self, lines, name, label, histograms, help_text):
+        """Append histogram and quantile lines for a family of histograms"""
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} histogram")
+        quantile_lines = []
+        for key, histogram in sorted(list(histograms.items())):
+            counts, total = histogram.snapshot()
+            cumulative = 0
+            for bound, count in zip(histogram.bounds, counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{label}="{key}",le="{bound:.6g}"}} {cumulative}')
+            cumulative += counts[-1]
+            lines.append(f'{name}_bucket{{{label}="{key}",le="+Inf"}} {cumulative}')
+            lines.append(f'{name}_sum{{{label}="{key}"}} {total:.9f}')
+            lines.append(f'{name}_count{{{label}="{key}"}} {cumulative}')
+            for q in QUANTILES:
+                value = histogram.quantile(q, counts)
+                if value is not None:
+                    quantile_lines.append(f'{name}_quantile{{{label}="{key}",quantile="{q}"}} {value:.9f}')
+        
+        lines.append(f"# HELP {name}_quantile Estimated quantiles of {help_text[0].lower()}{help_text[1:]}")
+        lines.append(f"# TYPE {name}_quantile gauge")
+        lines.extend(quantile_lines)
+    
+    def render(self):
+        """Render every metric in Prometheus text exposition format"""
+        lines = []
+        self._render_histograms(lines, f"{self.prefix}_phase_latency_seconds", 'phase',
+                                self.phases, 'Latency of game state handling phases')
+        self._render_histograms(lines, f"{self.prefix}_request_latency_seconds", 'endpoint',
+                                self.endpoints, 'Latency of HTTP requests')
+        
+        with self._lock:
+            requests = sorted(self.requests.items())
+            actions = sorted(self.actions.items())
+        
+        lines.append(f"# HELP {self.prefix}_requests_total HTTP requests by endpoint and status")
+        lines.append(f"# TYPE {self.prefix}_requests_total counter")
+        for (endpoint, status), count in requests:
+            lines.append(f'{self.prefix}_requests_total{{endpoint="{endpoint}",status="{status}"}} {count}')
+        
+        lines.append(f"# HELP {self.prefix}_actions_total Recommended actions")
+        lines.append(f"# TYPE {self.prefix}_actions_total counter")
+        for action, count in actions:
+            lines.append(f'{self.prefix}_actions_total{{action="{action}"}} {count}')
+        
+        return '\n'.join(lines) + '\n'
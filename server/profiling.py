@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Sampling profiler for live request handlers
+Profiles a configurable fraction of calls with cProfile and merges the results in memory
+"""
+
+import cProfile
+import functools
+import io
+import marshal
+import pstats
+import random
+import threading
+
+# Orderings accepted by dump_text
+SORT_KEYS = frozenset(key.value for key in pstats.SortKey)
+
+class SamplingProfiler:
+    """Admin-toggleable cProfile sampler; a disabled profiler costs one attribute check"""
+    
+    def __init__(self, rate=0.01):
+        self.enabled = False
+        self.rate = rate
+        self.sampled = 0
+        self._stats = None
+        self._lock = threading.Lock()
+        # One profiled call at a time: Python 3.12+ allows a single active profiler per process
+        self._sampling = threading.Lock()
+    
+    def configure(self, enabled=None, rate=None):
+        """Turn sampling on or off and/or change the sampled fraction (0-1)"""
+        if rate is not None:
+            self.rate = min(max(float(rate), 0.0), 1.0)
+        if enabled is not None:
+            self.enabled = bool(enabled)
+    
+    def reset(self):
+        """Drop everything collected so far"""
+        with self._lock:
+            self._stats = None
+            self.sampled = 0
+    
+    def status(self):
+        return {'enabled': self.enabled, 'rate': self.rate, 'sampled': self.sampled}
+    
+    def profile(self, func):
+        """Decorator that profiles a sampled fraction of calls to func"""
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not self.enabled or random.random() >= self.rate:
+                return func(*args, **kwargs)
+            # A sample is already running on another thread; this call goes unprofiled rather than waiting
+            if not self._sampling.acquire(blocking=False):
+                return func(*args, **kwargs)
+            
+            try:
+                profiler = cProfile.Profile()
+                try:
+                    return profiler.runcall(func, *args, **kwargs)
+                finally:
+                    self._merge(profiler)
+            finally:
+                self._sampling.release()
+        return wrapper
+    
+    def _merge(self, profiler):
+        """Fold one profiled call into the aggregate"""
+        profiler.create_stats()
+        with self._lock:
+            if self._stats is None:
+                self._stats = pstats.Stats(profiler)
+            else:
+                self._stats.add(profiler)
+            self.sampled += 1
+    
+    def dump_text(self, sort='cumulative', limit=50):
+        """
+        Merged profile as a pstats text report
+        
+        Raises:
+            ValueError: When sort is not one of SORT_KEYS
+        """
+        if sort not in SORT_KEYS:
+            raise ValueError(f"sort must be one of {', '.join(sorted(SORT_KEYS))}")
+        stream = io.StringIO()
+        with self._lock:
+            if self._stats is None:
+                return 'No samples collected\n'
+            self._stats.stream = stream
+            self._stats.sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
+    
+    def dump_pstats(self):
+        """Merged profile in the binary pstats format (loadable with pstats, snakeviz, gprof2dot)"""
+        with self._lock:
+            stats = self._stats.stats if self._stats is not None else {}
+            return marshal.dumps(stats)
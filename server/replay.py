@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Replay captured /game_state traffic
+Feeds NDJSON captures into a running server or straight into the Flask handler,
+at the original pacing or as fast as possible, and diffs the returned actions
+"""
+
+import argparse
+import glob
+import heapq
+import http.client
+import json
+import os
+import shutil
+import ssl
+import sys
+import tempfile
+import time
+from itertools import zip_longest
+from urllib.parse import urlparse
+
+def read_capture(path):
+    """Yield (monotonic, payload) records from one capture file"""
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A capture cut off mid-write ends with a partial line
+                continue
+            yield record['t'], record['payload']
+
+def read_captures(paths):
+    """Merge capture files (possibly from several processes) in timestamp order"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, 'capture-*.ndjson'))))
+        else:
+            files.append(path)
+    return heapq.merge(*(read_capture(path) for path in files), key=lambda record: record[0])
+
+class HttpTarget:
+    """Post payloads to a running server over one keep-alive connection"""
+    
+    def __init__(self, url, insecure=False):
+        self.url = urlparse(url)
+        self.insecure = insecure
+        self.conn = None
+    
+    def _connect(self):
+        if self.url.scheme == 'https':
+            context = ssl.create_default_context()
+            if self.insecure:
+                context.check_hostname = False
+                context.verify_mode = ssl.CERT_NONE
+            return http.client.HTTPSConnection(self.url.hostname, self.url.port or 443, context=context, timeout=30)
+        return http.client.HTTPConnection(self.url.hostname, self.url.port or 80, timeout=30)
+    
+    def send(self, payload):
+        if self.conn is None:
+            self.conn = self._connect()
+        try:
+            self.conn.request('POST', '/game_state', json.dumps(payload), {'Content-Type': 'application/json'})
+            response = self.conn.getresponse()
+            return response.status, json.loads(response.read() or b'{}')
+        except (OSError, http.client.HTTPException, ValueError):
+            # ValueError: a body that is not JSON (an HTML error page, a proxy error)
+            self.conn.close()
+            self.conn = None
+            raise
+    
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+class HandlerTarget:
+    """
+    Call the Flask handler in-process through the test client (no network, no TLS)
+    
+    Replayed hands are stored like live ones, so by default they go to a
+    scratch database that close() removes; pass db_path to write into a real one.
+    """
+    
+    def __init__(self, db_path=None):
+        self.scratch_dir = None
+        if db_path is None:
+            self.scratch_dir = tempfile.mkdtemp(prefix='bj-replay-')
+            db_path = os.path.join(self.scratch_dir, 'replay.db')
+        self.db_path = db_path
+        
+        # server.py reads its configuration when imported; replayed traffic is not captured again
+        os.environ['BJ_DB_PATH'] = db_path
+        os.environ.pop('BJ_CAPTURE_DIR', None)
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        import server
+        self.client = server.app.test_client()
+    
+    def send(self, payload):
+        response = self.client.post('/game_state', json=payload)
+        return response.status_code, response.get_json() or {}
+    
+    def close(self):
+        if self.scratch_dir is not None:
+            shutil.rmtree(self.scratch_dir, ignore_errors=True)
+            self.scratch_dir = None
+
+def replay(records, target, speed=0.0, output=None):
+    """
+    Send every captured payload to the target
+    
+    Args:
+        records: Iterable of (monotonic, payload)
+        target: HttpTarget or HandlerTarget
+        speed: Pacing multiplier relative to the capture (1.0 = original, 0 = max speed)
+        output: Optional file object receiving one NDJSON result per request
+    
+    Returns:
+        Dict with request count, errors, elapsed seconds and sorted latencies
+    """
+    latencies = []
+    errors = 0
+    first_t = None
+    start = time.perf_counter()
+    
+    for index, (t, payload) in enumerate(records):
+        if speed > 0:
+            if first_t is None:
+                first_t = t
+            delay = start + (t - first_t) / speed - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        
+        sent = time.perf_counter()
+        try:
+            status, body = target.send(payload)
+        except (OSError, http.client.HTTPException, ValueError) as e:
+            status, body = 0, {'error': str(e)}
+        latencies.append(time.perf_counter() - sent)
+        if status != 200:
+            errors += 1
+        
+        if output is not None:
+            output.write(json.dumps({
+                'i': index,
+                'formkey': payload.get('formkey', 'default'),
+                'status': (payload.get('state') or {}).get('status'),
+                'action': body.get('action'),
+                'http_status': status
+            }) + '\n')
+    
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'elapsed': time.perf_counter() - start,
+        'latencies': latencies
+    }
+
+def diff_actions(baseline_path, current_path, show=10):
+    """
+    Compare the actions of two replay outputs request by request
+    
+    Requests only one of the outputs has (a replay of a different or cut-off
+    capture) count as differences too.
+    
+    Returns:
+        Number of requests whose action differs or that are missing from one output
+    """
+    differences = 0
+    only_baseline = only_current = 0
+    with open(baseline_path) as baseline, open(current_path) as current:
+        for base_line, current_line in zip_longest(baseline, current):
+            base = json.loads(base_line) if base_line is not None else None
+            now = json.loads(current_line) if current_line is not None else None
+            if base is not None and now is not None and base['action'] == now['action']:
+                continue
+            
+            differences += 1
+            if base is None:
+                only_current += 1
+            elif now is None:
+                only_baseline += 1
+            if differences <= show:
+                shown = now or base
+                print(f"  #{shown['i']} [{shown['formkey']}] {base['action'] if base else '(missing)'} -> "
+                      f"{now['action'] if now else '(missing)'}")
+    
+    if only_baseline:
+        print(f"  {only_baseline} request(s) missing from {current_path}")
+    if only_current:
+        print(f"  {only_current} extra request(s) in {current_path}")
+    return differences
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay captured /game_state traffic')
+    parser.add_argument('captures', nargs='+', help='Capture files or directories')
+    parser.add_argument('--url', default=None, help='Replay against a running server (default: in-process handler)')
+    parser.add_argument('--db', default=None,
+                        help='Database the in-process handler stores replayed hands in '
+                             '(default: a scratch database, removed afterwards)')
+    parser.add_argument('--speed', type=float, default=0.0,
+                        help='Pacing relative to the capture: 1 = original, 2 = twice as fast, 0 = max speed')
+    parser.add_argument('--output', default=None, help='Write returned actions to this NDJSON file')
+    parser.add_argument('--diff', default=None, help='Previous --output file to compare returned actions against')
+    parser.add_argument('--insecure', action='store_true', help='Skip certificate verification for HTTPS')
+    
+    args = parser.parse_args()
+    
+    if args.url:
+        target = HttpTarget(args.url, args.insecure)
+    else:
+        target = HandlerTarget(args.db)
+        print(f"Replaying in-process against {target.db_path}" + (" (scratch)" if args.db is None else ''))
+    
+    output_path = args.output
+    if args.diff and not output_path:
+        output_path = args.diff + '.new'
+    
+    output = open(output_path, 'w') if output_path else None
+    try:
+        result = replay(read_captures(args.captures), target, args.speed, output)
+    finally:
+        target.close()
+        if output is not None:
+            output.close()
+    
+    latencies = result['latencies']
+    count = result['requests']
+    if count:
+        p50 = latencies[int(count * 0.5)] * 1000
+        p99 = latencies[min(count - 1, int(count * 0.99))] * 1000
+        print(f"Replayed {count} requests in {result['elapsed']:.2f}s "
+              f"({count / result['elapsed']:.1f} req/s, p50 {p50:.2f} ms, p99 {p99:.2f} ms, {result['errors']} errors)")
+    else:
+        print("No captured requests found")
+    
+    if args.diff:
+        differences = diff_actions(args.diff, output_path)
+        print(f"{differences} of {count} actions differ from {args.diff}")
+        sys.exit(1 if differences else 0)
+
+if __name__ == '__main__':
+    main()
@@ -4,10 +4,18 @@ Flask server for Blackjack automation
 Handles game state analysis and strategy decisions
 """
 
-from flask import Flask, request, jsonify
+import time
+
+# Start of the startup budget measured by startup_bench.py and logged by run_server
+STARTED = time.perf_counter()
+
+from flask import Flask, request, jsonify, g
 from flask_cors import CORS
+import atexit
+import hmac
 import json
 import logging
+import threading
 from datetime import datetime
 import importlib
 import os
@@ -20,26 +28,87 @@ load_dotenv()
 # Add current directory to path for imports
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from python.database import Database
+from sharding import ShardRouter, serve_workers
+from metrics import Metrics
+from profiling import SamplingProfiler
+from logpipeline import configure_logging
+from sessions import SessionStore, SequenceMismatch
+from maintenance import MaintenanceScheduler
+
+# Optional persistent /ws channel (pip install flask-sock); without it clients use the HTTP endpoints.
+# BJ_CHANNEL=0 skips the import (flask-sock pulls in a WebSocket stack) when no client uses it
+Sock = None
+if os.getenv('BJ_CHANNEL', '1') != '0':
+    try:
+        from flask_sock import Sock
+    except ImportError:
+        pass
 
 # Initialize Flask app
 app = Flask(__name__)
 CORS(app)
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
+# Configure logging: BJ_LOG_MODE=async moves log I/O off request threads,
+# BJ_LOG_FORMAT=json emits structured lines, BJ_LOG_RATE limits repeats per formkey
+configure_logging(
+    mode=os.getenv('BJ_LOG_MODE', 'sync'),
+    fmt=os.getenv('BJ_LOG_FORMAT', 'text'),
+    rate=float(os.getenv('BJ_LOG_RATE', 0))
 )
 logger = logging.getLogger(__name__)
 
-# Initialize database with environment variable
+# Worker processes serving the port (see run_server); any of them may receive any formkey's request
+WORKERS = int(os.getenv('BJ_WORKERS', 1))
+
+# Initialize database with environment variable; BJ_DB_SHARDS > 1 spreads formkeys over shard files
 db_path = os.getenv('BJ_DB_PATH', 'database/blackjack_data.db')
-db = Database(db_path)
+databases = ShardRouter(db_path, int(os.getenv('BJ_DB_SHARDS', 1)))
+
+# Opt-in traffic capture for replay (see replay.py)
+capture = None
+if os.getenv('BJ_CAPTURE_DIR'):
+    from capture import CaptureWriter
+    capture = CaptureWriter(os.getenv('BJ_CAPTURE_DIR'), int(os.getenv('BJ_CAPTURE_MAX_MB', 64)) * 1024 * 1024)
+    atexit.register(capture.close)
+
+# Idle-time database maintenance, started by run_server; BJ_RAW_STATE_DAYS > 0 thins older raw_state
+maintenance = MaintenanceScheduler(
+    databases,
+    raw_state_days=int(os.getenv('BJ_RAW_STATE_DAYS', 0)),
+    idle_seconds=float(os.getenv('BJ_MAINTENANCE_IDLE', 30))
+)
 
 # Strategy cache
 loaded_strategies = {}
 
+# Strategies loaded (and shard schemas checked) before the first request; /health reports 'ready' once done
+WARM_STRATEGIES = [name for name in os.getenv('BJ_WARM_STRATEGIES', 'basic_strategy').split(',') if name]
+ready = threading.Event()
+
+# Per-formkey hand state for the /game_delta protocol; with several workers it lives in the formkey's shard
+sessions = SessionStore(shared=WORKERS > 1)
+
+# Next-card ranks for speculative decision maps; X stands for any ten-value card
+SPECULATE_RANKS = ('A', '2', '3', '4', '5', '6', '7', '8', '9', 'X')
+MAX_SPECULATE_DEPTH = 3
+
+# Latency histograms and request counters, served at /metrics
+metrics = Metrics()
+
+# Sampling profiler for /game_state, toggled through /admin/profile
+profiler = SamplingProfiler(float(os.getenv('BJ_PROFILE_RATE', 0.01)))
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    start = g.get('request_start')
+    if start is not None:
+        metrics.observe_request(request.endpoint or 'unknown', response.status_code, time.perf_counter() - start)
+    return response
+
 def load_strategy(strategy_name):
     """Dynamically load a strategy module"""
     if strategy_name not in loaded_strategies:
@@ -47,9 +116,9 @@ def load_strategy(strategy_name):
             module = importlib.import_module(f'strategies.{strategy_name}')
             strategy_class = getattr(module, 'Strategy')
             loaded_strategies[strategy_name] = strategy_class()
-            logger.info(f"Loaded strategy: {strategy_name}")
+            logger.info("Loaded strategy: %s", strategy_name)
         except Exception as e:
-            logger.error(f"Failed to load strategy {strategy_name}: {e}")
+            logger.error("Failed to load strategy %s: %s", strategy_name, e)
             # Fall back to basic strategy
             from strategies.basic_strategy import Strategy
             loaded_strategies[strategy_name] = Strategy()
@@ -102,11 +171,251 @@ def calculate_hand_value(cards):
     
     return total
 
-@app.route('/game_state', methods=['POST'])
-def handle_game_state():
-    """Receive game state and return recommended action"""
+def choose_action(strategy, state):
+    """
+    Ask a strategy for an action on a PLAYING state
+    
+    Returns:
+        Tuple of (action, player_value, dealer_value)
+    """
+    # Get available actions
+    available_actions = state.get('actions', [])
+    
+    # Parse cards
+    player_cards = state.get('player', [])
+    dealer_upcard = (state.get('dealer') or [None])[0]
+    
+    # Calculate values
+    player_value = calculate_hand_value(player_cards)
+    dealer_value = parse_card(dealer_upcard)[0] if dealer_upcard else 0
+    
+    # Check for split scenario
+    if state.get('has_player_split'):
+        # Handle split hands
+        if 'HIT_SPLIT' in available_actions or 'STAY_SPLIT' in available_actions:
+            # Playing split hand
+            split_cards = state.get('player_split', [])
+            split_value = calculate_hand_value(split_cards)
+            action = strategy.get_action(
+                split_value, 
+                dealer_value, 
+                available_actions,
+                is_split=True,
+                cards=split_cards
+            )
+        else:
+            # Playing main hand after split
+            action = strategy.get_action(
+                player_value, 
+                dealer_value, 
+                available_actions,
+                is_split=False,
+                cards=player_cards
+            )
+    else:
+        # Normal hand
+        action = strategy.get_action(
+            player_value, 
+            dealer_value, 
+            available_actions,
+            is_split=False,
+            cards=player_cards
+        )
+    
+    return action, player_value, dealer_value
+
+def warm_up(strategy_names=WARM_STRATEGIES):
+    """
+    Open every shard and load and exercise each strategy, then mark the server ready
+    
+    run_server calls this in the background (or before forking workers, so
+    they inherit the loaded strategies) instead of leaving the work to the
+    first request.
+    """
+    start = time.perf_counter()
+    # Opening a shard checks its schema version (and sets it up on first use)
+    databases.all()
+    state = {'player': ['9H', '7C'], 'dealer': ['XS', '?'], 'status': 'PLAYING', 'actions': ['HIT', 'STAY']}
+    for strategy_name in strategy_names:
+        choose_action(load_strategy(strategy_name), state)
+    ready.set()
+    logger.info("Warmed %s shard(s) and %s strateg(ies) in %.1f ms", databases.shards, len(strategy_names),
+                (time.perf_counter() - start) * 1000)
+
+def decide_action(state, strategy_name):
+    """Load the strategy and decide a PLAYING state, recording timings and the action"""
+    # Load strategy
+    start = time.perf_counter()
+    strategy = load_strategy(strategy_name)
+    metrics.observe_phase('strategy_load', time.perf_counter() - start)
+    
+    start = time.perf_counter()
+    action, player_value, dealer_value = choose_action(strategy, state)
+    metrics.observe_phase('decision', time.perf_counter() - start)
+    metrics.count_action(action)
+    return action, player_value, dealer_value
+
+def speculate(strategy, state, action, depth):
+    """
+    Precompute the follow-up to a hit for every possible next card
+    
+    Each rank (A, 2-9, X for any ten-value card) maps to {"action": ...}, or
+    "bust" when the card breaks the hand, so the client can act on the card
+    it draws without another round trip. Follow-up hits nest another map
+    under "next" until depth runs out.
+    
+    Returns:
+        Dict of rank -> entry, or None when action is not a hit
+    """
+    if depth <= 0 or action not in ('hit', 'hit_split'):
+        return None
+    
+    on_split = action == 'hit_split'
+    field = 'player_split' if on_split else 'player'
+    follow_up = ['HIT_SPLIT', 'STAY_SPLIT'] if on_split else ['HIT', 'STAY']
+    
+    result = {}
+    for rank in SPECULATE_RANKS:
+        next_state = dict(state, actions=follow_up)
+        next_state[field] = list(state.get(field) or []) + [rank]
+        if calculate_hand_value(next_state[field]) > 21:
+            result[rank] = {'action': 'bust'}
+            continue
+        
+        next_action = choose_action(strategy, next_state)[0]
+        entry = {'action': next_action}
+        following = speculate(strategy, next_state, next_action, depth - 1)
+        if following is not None:
+            entry['next'] = following
+        result[rank] = entry
+    return result
+
+def parse_speculate(value):
+    """Speculation depth from the request's "speculate" field (true = 1 level)"""
+    if value is True:
+        return 1
+    if isinstance(value, int) and not isinstance(value, bool):
+        return min(max(value, 0), MAX_SPECULATE_DEPTH)
+    return 0
+
+def local_action_states(state, local_actions):
+    """
+    The state each action taken from a speculative map was decided on
+    
+    Those actions follow a hit, so each was decided on a prefix of its hand in
+    the reported state: the "cards" the client sends with the action, or else
+    the shortest prefix past the previous action's that reaches the action's
+    player value. Follow-up actions offered are those speculate() assumes.
+    
+    Returns:
+        One state per action, None where no prefix matches (e.g. the hand was
+        not the one in the reported state)
+    """
+    positions = {}
+    states = []
+    for item in local_actions:
+        on_split = item['action'].endswith('_split')
+        field = 'player_split' if on_split else 'player'
+        cards = item.get('cards')
+        if not isinstance(cards, list):
+            hand = list(state.get(field) or [])
+            # A hit came first, so the hand has at least three cards
+            start = positions.get(field, 3)
+            cards = next((hand[:n] for n in range(start, len(hand) + 1)
+                          if calculate_hand_value(hand[:n]) == item.get('player_value')), None)
+        if cards is None:
+            states.append(None)
+            continue
+        positions[field] = len(cards) + 1 if item['action'] in ('hit', 'hit_split') else len(cards)
+        
+        decided = dict(state, status='PLAYING', payout=0, dealer=(state.get('dealer') or [])[:1] + ['?'],
+                       actions=['HIT_SPLIT', 'STAY_SPLIT'] if on_split else ['HIT', 'STAY'])
+        decided[field] = cards
+        # Totals of the reported state belong to its later cards
+        for key in ('player_value', 'player_split_value', 'dealer_value', 'status_split'):
+            decided.pop(key, None)
+        states.append(decided)
+    return states
+
+def store_local_actions(db, hand_id, local_actions, state, formkey):
+    """
+    Record actions the client took on its own from a speculative map
+    
+    Args:
+        local_actions: List of {"action", "player_value", "dealer_value"} in the
+            order taken, each optionally with the "cards" of the hand it decided
+        state: The state reported with them, which the hand row stores
+    """
+    if not local_actions:
+        return
+    if not isinstance(local_actions, list) or not all(isinstance(item, dict) and item.get('action') for item in local_actions):
+        raise ValueError("'local_actions' must be a list of objects with an 'action'")
+    
+    start = time.perf_counter()
+    decided_states = local_action_states(state, local_actions)
+    db.store_actions(hand_id, [
+        (item['action'], item.get('player_value', 0), item.get('dealer_value', 0), decided)
+        for item, decided in zip(local_actions, decided_states)
+    ], formkey)
+    metrics.observe_phase('store_action', time.perf_counter() - start)
+
+def process_state(db, hand_id, state, strategy_name, formkey, speculate_depth=0, keep_state=False):
+    """
+    Decide and persist one state of a stored hand
+    
+    PLAYING states get a recommendation (stored as an action row); finished
+    states offering DEAL record the hand outcome. keep_state stores the
+    decided state with the action, for hand rows that are rewritten later.
+    
+    Returns:
+        Response dict with the recommended action (or 'none') and, when
+        speculate_depth > 0 and the action is a hit, the next-card map
+    """
+    action = 'none'
+    response = {}
+    
+    if state.get('status') == 'PLAYING':
+        action, player_value, dealer_value = decide_action(state, strategy_name)
+        
+        if speculate_depth:
+            start = time.perf_counter()
+            next_map = speculate(load_strategy(strategy_name), state, action, speculate_depth)
+            metrics.observe_phase('speculate', time.perf_counter() - start)
+            if next_map is not None:
+                response['next'] = next_map
+        
+        # Store the action
+        if action != 'none':
+            start = time.perf_counter()
+            db.store_action(hand_id, action, player_value, dealer_value, state, formkey, keep_state)
+            metrics.observe_phase('store_action', time.perf_counter() - start)
+            logger.info("Recommended action: %s (Player: %s, Dealer: %s)", action, player_value, dealer_value,
+                        extra={'formkey': formkey, 'hand_id': hand_id})
+    
+    elif state.get('actions') and 'DEAL' in state.get('actions', []):
+        # Hand is complete, ready for new deal; the Tampermonkey script handles dealing
+        # Update hand outcome in database
+        start = time.perf_counter()
+        db.update_hand_outcome(hand_id, state, formkey)
+        metrics.observe_phase('update_outcome', time.perf_counter() - start)
+    
+    response['action'] = action
+    return response
+
+def game_state_response(data):
+    """
+    Store one full game state and decide it (shared by /game_state and /ws)
+    
+    Returns:
+        (response dict, HTTP status code)
+    """
     try:
-        data = request.json
+        if not isinstance(data, dict):
+            return {'error': 'expected a JSON object'}, 400
+        
+        if capture is not None:
+            capture.capture(data)
+        
         state = data.get('state', {})
         gambler = data.get('gambler', {})
         timestamp = data.get('timestamp', datetime.now().isoformat())
@@ -114,99 +423,294 @@ def handle_game_state():
         formkey = data.get('formkey', 'default')
         
         # Log the game state
-        logger.info(f"Received game state: {state.get('status')} [formkey: {formkey}]")
+        logger.info("Received game state: %s [formkey: %s]", state.get('status'), formkey, extra={'formkey': formkey})
         
-        # Store in database
+        # Store in the formkey's shard
+        db = databases.for_formkey(formkey)
+        start = time.perf_counter()
         hand_id = db.store_hand(state, gambler, timestamp, formkey)
+        metrics.observe_phase('store_hand', time.perf_counter() - start)
+        
+        store_local_actions(db, hand_id, data.get('local_actions'), state, formkey)
         
         # Determine action if game is in progress
-        action = 'none'
+        response = process_state(db, hand_id, state, strategy_name, formkey, parse_speculate(data.get('speculate')))
+        response['hand_id'] = hand_id
+        return response, 200
+    
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    except Exception as e:
+        logger.error("Error handling game state: %s", e)
+        return {'error': str(e)}, 500
+
+def game_delta_response(data):
+    """
+    Apply one delta to the formkey's server-held hand and decide it (shared by /game_delta and /ws)
+    
+    Returns:
+        (response dict, HTTP status code)
+    """
+    try:
+        if not isinstance(data, dict):
+            return {'error': 'expected a JSON object'}, 400
+        
+        formkey = data.get('formkey', 'default')
+        seq = data.get('seq')
+        if not isinstance(seq, int):
+            return {'error': "'seq' must be an integer"}, 400
+        
+        session = sessions.get(formkey, create=sessions.shared or 'full_state' in data)
+        if session is None:
+            return {'error': 'no session', 'resync': True, 'expected_seq': None}, 409
+        db = databases.for_formkey(formkey)
         
-        if state.get('status') == 'PLAYING':
-            # Load strategy
-            strategy = load_strategy(strategy_name)
+        with session.lock:
+            if sessions.shared:
+                # Another worker may have taken this formkey's last deltas; the shard has the current copy
+                record = db.load_delta_session(formkey)
+                if record is None and 'full_state' not in data:
+                    return {'error': 'no session', 'resync': True, 'expected_seq': None}, 409
+                if record is not None and record['version'] != session.version:
+                    session.restore(record)
+                # Stale until written back, so a request that fails part-way makes the next one reload
+                loaded_version, session.version = session.version or 0, None
             
-            # Get available actions
-            available_actions = state.get('actions', [])
+            if data.get('strategy'):
+                session.strategy = data['strategy']
             
-            # Parse cards
-            player_cards = state.get('player', [])
-            dealer_upcard = state.get('dealer', [None])[0]
+            if 'full_state' in data:
+                session.reset(data['full_state'] or {}, data.get('gambler'), seq)
+            elif seq == session.seq and session.last_response is not None:
+                # Retransmission of the last delta (its response was lost)
+                return session.last_response, 200
+            else:
+                try:
+                    session.apply(seq, data.get('append'), data.get('set'))
+                except SequenceMismatch as e:
+                    logger.info("Delta out of sequence: %s [formkey: %s]", e, formkey, extra={'formkey': formkey})
+                    return {'error': 'sequence mismatch', 'resync': True, 'expected_seq': e.expected}, 409
             
-            # Calculate values
-            player_value = calculate_hand_value(player_cards)
-            dealer_value = parse_card(dealer_upcard)[0] if dealer_upcard else 0
+            state = session.state
             
-            # Check for split scenario
-            if state.get('has_player_split'):
-                # Handle split hands
-                if 'HIT_SPLIT' in available_actions or 'STAY_SPLIT' in available_actions:
-                    # Playing split hand
-                    split_cards = state.get('player_split', [])
-                    split_value = calculate_hand_value(split_cards)
-                    action = strategy.get_action(
-                        split_value, 
-                        dealer_value, 
-                        available_actions,
-                        is_split=True,
-                        cards=split_cards
-                    )
-                else:
-                    # Playing main hand after split
-                    action = strategy.get_action(
-                        player_value, 
-                        dealer_value, 
-                        available_actions,
-                        is_split=False,
-                        cards=player_cards
-                    )
-            else:
-                # Normal hand
-                action = strategy.get_action(
-                    player_value, 
-                    dealer_value, 
-                    available_actions,
-                    is_split=False,
-                    cards=player_cards
-                )
+            if session.hand_id is None:
+                start = time.perf_counter()
+                session.hand_id = db.store_hand(state, session.gambler, datetime.now().isoformat(), formkey)
+                metrics.observe_phase('store_hand', time.perf_counter() - start)
+            hand_id = session.hand_id
             
-            # Store the action
-            if action != 'none':
-                db.store_action(hand_id, action, player_value, dealer_value)
-                logger.info(f"Recommended action: {action} (Player: {player_value}, Dealer: {dealer_value})")
-        
-        elif state.get('actions') and 'DEAL' in state.get('actions', []):
-            # Hand is complete, ready for new deal
-            action = 'none'  # Let the Tampermonkey script handle dealing
+            finished = state.get('status') != 'PLAYING' and 'DEAL' in (state.get('actions') or [])
+            if finished:
+                start = time.perf_counter()
+                db.update_hand_state(hand_id, state)
+                metrics.observe_phase('store_hand', time.perf_counter() - start)
             
-            # Update hand outcome in database
-            db.update_hand_outcome(hand_id, state)
-        
-        return jsonify({
-            'action': action,
-            'hand_id': hand_id
-        })
+            store_local_actions(db, hand_id, data.get('local_actions'), state, formkey)
+            # The hand row is rewritten with the final state, so each decision keeps its own
+            response = process_state(db, hand_id, state, session.strategy, formkey,
+                                     parse_speculate(data.get('speculate')), keep_state=True)
+            
+            if finished:
+                # The next delta (or full_state) starts a new hand row
+                session.hand_id = None
+                session.state = {}
+            
+            response.update(hand_id=hand_id, seq=session.seq)
+            session.last_response = response
+            
+            if sessions.shared:
+                if not db.save_delta_session(formkey, session.record(), loaded_version):
+                    # Another worker stored a delta for this formkey meanwhile; the client resyncs
+                    logger.info("Concurrent delta for formkey %s", formkey, extra={'formkey': formkey})
+                    return {'error': 'concurrent update', 'resync': True, 'expected_seq': None}, 409
+                session.version = loaded_version + 1
+            return response, 200
     
+    except ValueError as e:
+        return {'error': str(e)}, 400
     except Exception as e:
-        logger.error(f"Error handling game state: {e}")
-        return jsonify({'error': str(e)}), 500
+        logger.error("Error handling game delta: %s", e)
+        return {'error': str(e)}, 500
+
+@app.route('/game_state', methods=['POST'])
+@profiler.profile
+def handle_game_state():
+    """
+    Receive game state and return recommended action
+    
+    Optional body fields: "speculate" (true or a depth up to MAX_SPECULATE_DEPTH)
+    adds a "next" map of follow-up actions per next card after a hit, and
+    "local_actions" reports the actions the client took from such a map
+    (see store_local_actions).
+    """
+    start = time.perf_counter()
+    data = request.get_json(silent=True)
+    metrics.observe_phase('parse', time.perf_counter() - start)
+    
+    response, status = game_state_response(data)
+    return jsonify(response), status
+
+@app.route('/game_delta', methods=['POST'])
+@profiler.profile
+def handle_game_delta():
+    """
+    Apply a state delta to the formkey's server-held hand and return the recommended action
+    
+    Body: {"formkey", "seq", "append": {"player": [...], ...}, "set": {"status": ..., "actions": [...]}}
+    with seq one past the last applied delta. A body carrying "full_state" (and
+    optionally "gambler") replaces the held state and restarts the sequence at
+    "seq"; clients send it to start a session and to resync after a 409.
+    The hand row is inserted once when a hand starts and rewritten when it finishes.
+    "speculate" and "local_actions" work as for /game_state.
+    """
+    start = time.perf_counter()
+    data = request.get_json(silent=True)
+    metrics.observe_phase('parse', time.perf_counter() - start)
+    
+    response, status = game_delta_response(data)
+    return jsonify(response), status
+
+# Message types accepted on /ws, each handled exactly like its HTTP endpoint
+CHANNEL_HANDLERS = {'state': game_state_response, 'delta': game_delta_response}
+
+def channel_message(message):
+    """
+    Handle one /ws message
+    
+    Args:
+        message: JSON text {"type": "state"|"delta", "id": ..., ...} where the
+            remaining fields are the /game_state or /game_delta body
+    
+    Returns:
+        Reply JSON text: the endpoint's response plus "code" (the HTTP status it
+        would have returned) and the message's "id"
+    """
+    start = time.perf_counter()
+    try:
+        data = json.loads(message)
+    except (TypeError, ValueError):
+        data = None
+    metrics.observe_phase('parse', time.perf_counter() - start)
+    
+    kind = data.get('type') if isinstance(data, dict) else None
+    handler = CHANNEL_HANDLERS.get(kind)
+    if handler is None:
+        response, status = {'error': "expected a JSON object with 'type' 'state' or 'delta'"}, 400
+    else:
+        response, status = handler(data)
+    
+    # Copy: delta responses are cached on the session for retransmissions
+    reply = dict(response, code=status)
+    if isinstance(data, dict) and 'id' in data:
+        reply['id'] = data['id']
+    metrics.observe_request(f"ws_{kind if handler is not None else 'invalid'}", status, time.perf_counter() - start)
+    return json.dumps(reply)
+
+if Sock is not None:
+    sock = Sock(app)
+    
+    @sock.route('/ws')
+    def game_channel(ws):
+        """
+        Persistent channel: states and deltas stream in, decisions go back on the same connection
+        
+        Replies arrive in message order. Clients without WebSocket support, or
+        servers without flask-sock, use /game_state and /game_delta instead.
+        """
+        # Each message is timed on its own; the connection lifetime is not a request latency
+        g.request_start = None
+        logger.info("Channel opened from %s", request.remote_addr)
+        while True:
+            ws.send(channel_message(ws.receive()))
 
 @app.route('/stats', methods=['GET'])
 def get_stats():
     """Return current statistics"""
     try:
         formkey = request.args.get('formkey', None)
-        stats = db.get_statistics(formkey)
-        return jsonify(stats)
+        
+        # Polling clients revalidate; unchanged statistics cost one version lookup
+        etag = databases.get_statistics_etag(formkey)
+        if request.if_none_match.contains(etag):
+            response = app.response_class(status=304)
+        else:
+            response = jsonify(databases.get_statistics(formkey))
+        
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
     except Exception as e:
-        logger.error(f"Error getting stats: {e}")
+        logger.error("Error getting stats: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
-    logger.info("Health check requested - Client connected successfully")
-    return jsonify({'status': 'healthy', 'timestamp': datetime.now().isoformat(), 'message': 'Flask server is running'})
+    # Probes arrive constantly, so they only show up in debug logs
+    logger.debug("Health check requested - Client connected successfully")
+    return jsonify({
+        'status': 'healthy',
+        'timestamp': datetime.now().isoformat(),
+        'message': 'Flask server is running',
+        'ready': ready.is_set(),
+        'channel': '/ws' if Sock is not None else None
+    })
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Latency histograms, quantiles and counters in Prometheus text format"""
+    return app.response_class(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+def admin_authorized():
+    """
+    Admin endpoints require X-Admin-Token when BJ_ADMIN_TOKEN is set
+    
+    Without a token they only answer requests from this machine: the server
+    listens on every interface and allows cross-origin requests.
+    """
+    token = os.getenv('BJ_ADMIN_TOKEN')
+    if not token:
+        return request.remote_addr in ('127.0.0.1', '::1')
+    return hmac.compare_digest(request.headers.get('X-Admin-Token', ''), token)
+
+@app.route('/admin/profile', methods=['GET', 'POST', 'DELETE'])
+def admin_profile():
+    """
+    Control the /game_state sampling profiler
+    
+    GET returns the merged profile (?format=text|pstats, ?sort=, ?limit=),
+    POST {"enabled": bool, "rate": float} reconfigures it and DELETE clears it.
+    """
+    if not admin_authorized():
+        return jsonify({'error': 'unauthorized'}), 403
+    
+    if WORKERS > 1:
+        # Each worker has its own profiler and a request reaches an arbitrary one
+        return jsonify({'error': 'the profiler runs per process; profile with BJ_WORKERS=1'}), 409
+    
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        try:
+            profiler.configure(data.get('enabled'), data.get('rate'))
+        except (TypeError, ValueError):
+            return jsonify({'error': "'rate' must be a number between 0 and 1"}), 400
+        logger.info("Profiler configured: %s", profiler.status())
+        return jsonify(profiler.status())
+    
+    if request.method == 'DELETE':
+        profiler.reset()
+        return jsonify(profiler.status())
+    
+    if request.args.get('format') == 'pstats':
+        response = app.response_class(profiler.dump_pstats(), mimetype='application/octet-stream')
+        response.headers['Content-Disposition'] = 'attachment; filename=game_state.pstats'
+        return response
+    
+    try:
+        text = profiler.dump_text(request.args.get('sort', 'cumulative'), request.args.get('limit', 50, type=int))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return app.response_class(text, mimetype='text/plain')
 
 def run_server():
     """Run the Flask server with HTTPS"""
@@ -216,20 +720,30 @@ def run_server():
     key_file = os.getenv('SSL_PRIVATE_KEY_PATH', 'certs/key.pem')
     
     if os.path.exists(cert_file) and os.path.exists(key_file):
-        logger.info(f"Running with HTTPS using certificates: {cert_file}, {key_file}")
-        app.run(
-            host='0.0.0.0',
-            port=port,
-            debug=False,
-            ssl_context=(cert_file, key_file)
-        )
+        logger.info("Running with HTTPS using certificates: %s, %s", cert_file, key_file)
+        ssl_context = (cert_file, key_file)
     else:
-        logger.warning(f"No SSL certificates found at {cert_file}, {key_file}. Run generate_cert.sh first.")
-        logger.info(f"Running without HTTPS (HTTP only) on port {port}")
+        logger.warning("No SSL certificates found at %s, %s. Run generate_cert.sh first.", cert_file, key_file)
+        logger.info("Running without HTTPS (HTTP only) on port %s", port)
+        ssl_context = None
+    
+    if os.getenv('BJ_MAINTENANCE', '1') != '0':
+        # Runs in this process only; forked workers share its view of every shard
+        maintenance.start()
+    
+    logger.info("Started in %.1f ms", (time.perf_counter() - STARTED) * 1000)
+    if WORKERS > 1:
+        # Forked workers inherit the loaded strategies and find every shard's schema current
+        warm_up()
+        logger.info("Starting %s workers over %s database shard(s)", WORKERS, databases.shards)
+        serve_workers(app, '0.0.0.0', port, WORKERS, ssl_context)
+    else:
+        threading.Thread(target=warm_up, name='warm-up', daemon=True).start()
         app.run(
             host='0.0.0.0',
             port=port,
-            debug=False
+            debug=False,
+            ssl_context=ssl_context
         )
 
 if __name__ == '__main__':
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Server-held hand state for the /game_delta protocol
+Keeps the current hand of each formkey in memory and applies sequenced deltas to it;
+with several worker processes the formkey's database shard holds the current copy
+"""
+
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+# State fields that grow during a hand; deltas may append to them
+LIST_FIELDS = ('player', 'dealer', 'player_split', 'actions')
+
+class SequenceMismatch(Exception):
+    """Raised when a delta does not follow the last sequence number the server applied"""
+    
+    def __init__(self, expected, received):
+        super().__init__(f"expected seq {expected}, received {received}")
+        self.expected = expected
+        self.received = received
+
+class HandSession:
+    """One formkey's current hand: state, sequence number and stored hand row"""
+    
+    def __init__(self, formkey):
+        self.formkey = formkey
+        self.seq = 0
+        self.state = {}
+        self.gambler = {}
+        self.strategy = 'basic_strategy'
+        self.hand_id = None
+        self.last_response = None
+        # Version of the shard's copy this session matches (shared stores only); None = reload before use
+        self.version = 0
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def record(self):
+        """Fields stored in the shard's delta_sessions table"""
+        return {
+            'seq': self.seq,
+            'hand_id': self.hand_id,
+            'strategy': self.strategy,
+            'state': self.state,
+            'gambler': self.gambler,
+            'last_response': self.last_response
+        }
+    
+    def restore(self, record):
+        """Take over the copy another process stored (see Database.load_delta_session)"""
+        self.seq = record['seq']
+        self.hand_id = record['hand_id']
+        self.strategy = record['strategy']
+        self.state = record['state']
+        self.gambler = record['gambler']
+        self.last_response = record['last_response']
+        self.version = record['version']
+    
+    def reset(self, state, gambler=None, seq=0):
+        """Replace the held state wholesale (hand start or resync)"""
+        self.state = copy.deepcopy(state)
+        if gambler is not None:
+            self.gambler = dict(gambler)
+        self.seq = seq
+        self.last_response = None
+    
+    def apply(self, seq, append=None, set_fields=None):
+        """
+        Apply one delta to the held state
+        
+        Args:
+            seq: Sequence number of this delta; must be exactly one past the last applied
+            append: Dict of list field -> items appended to that list (e.g. {"player": ["7H"]})
+            set_fields: Dict of field -> value replacing that field (e.g. {"status": "WON"})
+        
+        Raises:
+            SequenceMismatch: When a delta was lost or arrived out of order
+            ValueError: When the delta is malformed
+        """
+        if seq != self.seq + 1:
+            raise SequenceMismatch(self.seq + 1, seq)
+        
+        append = append or {}
+        set_fields = set_fields or {}
+        if not isinstance(append, dict) or not isinstance(set_fields, dict):
+            raise ValueError("'append' and 'set' must be objects")
+        for field, items in append.items():
+            if field not in LIST_FIELDS or not isinstance(items, list):
+                raise ValueError(f"cannot append to '{field}'")
+        
+        self.state.update(copy.deepcopy(set_fields))
+        for field, items in append.items():
+            self.state[field] = list(self.state.get(field) or []) + items
+        self.seq = seq
+
+class SessionStore:
+    """
+    Bounded per-process map of formkey -> HandSession, least recently used evicted first
+    
+    A shared store is used when several worker processes serve the port:
+    any of them may receive a formkey's next delta, so the sessions here are
+    only a cache, checked against the formkey's shard before each delta and
+    written back after it (see server.game_delta_response).
+    """
+    
+    def __init__(self, max_sessions=10000, shared=False):
+        self.max_sessions = max_sessions
+        self.shared = shared
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, formkey, create=True):
+        with self._lock:
+            session = self._sessions.get(formkey)
+            if session is not None:
+                self._sessions.move_to_end(formkey)
+            elif create:
+                session = HandSession(formkey)
+                self._sessions[formkey] = session
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+            if session is not None:
+                session.updated = time.monotonic()
+            return session
+    
+    def __len__(self):
+        return len(self._sessions)
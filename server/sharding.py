@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Sharded multi-process deployment
+Routes each formkey to its own SQLite shard file and serves one port from several worker processes
+"""
+
+import logging
+import os
+import signal
+import socket
+import threading
+import zlib
+
+from werkzeug.serving import make_server
+
+from python.database import Database, merge_statistics
+
+logger = logging.getLogger(__name__)
+
+def shard_path(db_path, index, shards):
+    """Database file for one shard ('bj.db' -> 'bj.shard03.db'); one shard keeps db_path"""
+    if shards <= 1:
+        return db_path
+    root, ext = os.path.splitext(db_path)
+    return f"{root}.shard{index:02d}{ext or '.db'}"
+
+class ShardRouter:
+    """
+    Per-process set of shard databases
+    
+    A formkey always hashes to the same shard, so every session writes to
+    one file and sessions on different shards never contend for the same
+    SQLite write lock. Shards are opened lazily in the process that uses them.
+    """
+    
+    def __init__(self, db_path, shards=1):
+        self.db_path = db_path
+        self.shards = max(1, shards)
+        self._databases = [None] * self.shards
+        self._lock = threading.Lock()
+    
+    def shard_index(self, formkey):
+        """Stable shard number for a formkey (crc32, identical in every process)"""
+        if self.shards == 1:
+            return 0
+        return zlib.crc32((formkey or 'default').encode()) % self.shards
+    
+    def _database(self, index):
+        database = self._databases[index]
+        if database is None:
+            with self._lock:
+                database = self._databases[index]
+                if database is None:
+                    database = Database(shard_path(self.db_path, index, self.shards))
+                    self._databases[index] = database
+        return database
+    
+    def for_formkey(self, formkey):
+        """Database holding a formkey's hands"""
+        return self._database(self.shard_index(formkey))
+    
+    def all(self):
+        """Every shard database"""
+        return [self._database(index) for index in range(self.shards)]
+    
+    def get_statistics(self, formkey=None):
+        """Statistics for one formkey, or merged across every shard"""
+        if formkey or self.shards == 1:
+            return self.for_formkey(formkey).get_statistics(formkey)
+        return merge_statistics([database.get_statistics() for database in self.all()])
+    
+    def get_statistics_etag(self, formkey=None):
+        """Entity tag for one formkey, or for the merged statistics"""
+        if formkey or self.shards == 1:
+            return self.for_formkey(formkey).get_statistics_etag(formkey)
+        # Versions only grow, so their sum changes whenever any shard changes
+        return f"stats-{sum(database.get_statistics_version() for database in self.all())}"
+
+def serve_workers(app, host, port, workers, ssl_context=None):
+    """
+    Serve app from several forked worker processes sharing one listening socket
+    
+    The kernel hands each connection to whichever worker accepts it first, so
+    any worker may serve any formkey. State that must follow a formkey from
+    one request to the next therefore lives in the formkey's shard file (hands,
+    statistics versions, /game_delta sessions); what a worker keeps in memory
+    (shard handles, strategy cache, cached statistics) is only a cache.
+    Process-local tools such as the sampling profiler are not available in
+    this mode. Falls back to a single process where fork is unavailable.
+    """
+    if workers <= 1 or not hasattr(os, 'fork'):
+        if workers > 1:
+            logger.warning("fork is not available; running a single worker")
+        make_server(host, port, app, threaded=True, ssl_context=ssl_context).serve_forever()
+        return
+    
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((host, port))
+    listener.listen(128)
+    listener.set_inheritable(True)
+    
+    children = []
+    for worker in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            server = make_server(host, port, app, threaded=True, ssl_context=ssl_context, fd=listener.fileno())
+            logger.info("Worker %s (pid %s) serving on port %s", worker, os.getpid(), port)
+            try:
+                server.serve_forever()
+            finally:
+                os._exit(0)
+        children.append(pid)
+    
+    listener.close()
+    
+    def stop(signum, frame):
+        for child in children:
+            try:
+                os.kill(child, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+    
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for child in children:
+        try:
+            os.waitpid(child, 0)
+        except ChildProcessError:
+            pass
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark for the decision server
+Starts server.py repeatedly and measures time to listen, to the first decision and to warm readiness
+"""
+
+import argparse
+import http.client
+import json
+import os
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+SERVER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'server.py')
+
+# server.py imports python.database, so the repository root goes on the child's path
+REPO_ROOT = os.path.dirname(os.path.dirname(SERVER_PATH))
+
+# A PLAYING state every strategy can decide
+FIRST_STATE = {
+    'player': ['9H', '7C'], 'dealer': ['XS', '?'], 'player_split': [], 'has_player_split': False,
+    'wager': {'amount': 5, 'currency': 'coins'}, 'status': 'PLAYING', 'payout': 0, 'actions': ['HIT', 'STAY']
+}
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def request(port, method, path, body=None, timeout=1.0):
+    """One request on a fresh connection; returns (status, parsed body) or None while the server is not up"""
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+    try:
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        conn.request(method, path, json.dumps(body) if body is not None else None, headers)
+        response = conn.getresponse()
+        return response.status, json.loads(response.read() or b'{}')
+    except (OSError, http.client.HTTPException, ValueError):
+        return None
+    finally:
+        conn.close()
+
+# Lines of server stderr shown when a start produces no decision
+STDERR_TAIL_LINES = 20
+
+def measure_start(db_path, strategy, timeout, poll_interval=0.005):
+    """
+    Start one server process and time its startup
+    
+    Returns:
+        Dict of seconds since spawn: 'listening' (first answered request),
+        'first_decision' (first /game_state with an action) and 'ready'
+        (/health reports warm-up done), or None for steps that did not happen;
+        plus 'stderr', the tail of the server's stderr when no decision came
+    """
+    port = free_port()
+    python_path = os.pathsep.join(filter(None, [REPO_ROOT, os.getenv('PYTHONPATH')]))
+    env = dict(os.environ, PORT=str(port), BJ_DB_PATH=db_path, BJ_WORKERS='1', PYTHONPATH=python_path,
+               SSL_PUBLIC_CERT_PATH='', SSL_PRIVATE_KEY_PATH='')
+    body = {'state': FIRST_STATE, 'gambler': {'coins': 10000}, 'strategy': strategy, 'formkey': 'startup-bench'}
+    
+    # A file rather than a pipe, so a chatty server never blocks on a full pipe while being timed
+    stderr = tempfile.TemporaryFile()
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, SERVER_PATH], env=env,
+                               stdout=subprocess.DEVNULL, stderr=stderr)
+    timings = {'listening': None, 'first_decision': None, 'ready': None, 'stderr': None}
+    try:
+        deadline = start + timeout
+        while time.perf_counter() < deadline and process.poll() is None:
+            if timings['first_decision'] is None:
+                result = request(port, 'POST', '/game_state', body)
+                if result is not None and timings['listening'] is None:
+                    timings['listening'] = time.perf_counter() - start
+                if result is not None and result[0] == 200 and result[1].get('action'):
+                    timings['first_decision'] = time.perf_counter() - start
+            else:
+                result = request(port, 'GET', '/health')
+                if result is not None and result[1].get('ready'):
+                    timings['ready'] = time.perf_counter() - start
+                    break
+            time.sleep(poll_interval)
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        if timings['first_decision'] is None:
+            stderr.seek(0)
+            lines = stderr.read().decode(errors='replace').splitlines()
+            timings['stderr'] = '\n'.join(lines[-STDERR_TAIL_LINES:])
+        stderr.close()
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure decision server startup against a time budget')
+    parser.add_argument('--runs', type=int, default=5, help='Server starts to measure')
+    parser.add_argument('--budget-ms', type=float, default=2000.0,
+                        help='Fail (exit 1) when the median time to first decision exceeds this')
+    parser.add_argument('--db', default=None,
+                        help='Existing database to start against (default: a new one, created by the first run)')
+    parser.add_argument('--strategy', default='basic_strategy', help='Strategy for the first decision')
+    parser.add_argument('--timeout', type=float, default=30.0, help='Give up on a start after this many seconds')
+    
+    args = parser.parse_args()
+    
+    workdir = tempfile.mkdtemp(prefix='bj-startup-')
+    try:
+        db_path = os.path.join(workdir, 'bench.db')
+        if args.db:
+            # Work on a copy so the benchmark's hands never land in the real database
+            source, copy = sqlite3.connect(args.db), sqlite3.connect(db_path)
+            try:
+                source.backup(copy)
+            finally:
+                copy.close()
+                source.close()
+        
+        results = []
+        print(f"{'Run':<6}{'Database':<12}{'Listening ms':>14}{'Decision ms':>14}{'Ready ms':>12}")
+        for run in range(args.runs):
+            existing = os.path.exists(db_path)
+            timings = measure_start(db_path, args.strategy, args.timeout)
+            results.append(timings)
+            
+            def ms(value):
+                return f"{value * 1000:.1f}" if value is not None else 'n/a'
+            print(f"{run + 1:<6}{'existing' if existing else 'new':<12}{ms(timings['listening']):>14}"
+                  f"{ms(timings['first_decision']):>14}{ms(timings['ready']):>12}")
+            if timings['stderr'] is not None:
+                print(f"  server stderr (last {STDERR_TAIL_LINES} lines):")
+                print('\n'.join(f"    {line}" for line in timings['stderr'].splitlines()) or '    (empty)')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    
+    decisions = sorted(timings['first_decision'] for timings in results if timings['first_decision'] is not None)
+    if len(decisions) < len(results):
+        print(f"{len(results) - len(decisions)} start(s) produced no decision within {args.timeout:g}s")
+        sys.exit(1)
+    
+    median = decisions[len(decisions) // 2] * 1000
+    verdict = 'within' if median <= args.budget_ms else 'over'
+    print(f"Median time to first decision {median:.1f} ms ({verdict} the {args.budget_ms:g} ms budget)")
+    sys.exit(0 if median <= args.budget_ms else 1)
+
+if __name__ == '__main__':
+    main()
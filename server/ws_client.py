@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Reference client for the persistent /ws decision channel
+Streams game states or deltas over one WebSocket and falls back to the HTTP endpoints
+"""
+
+import argparse
+import http.client
+import itertools
+import json
+import ssl
+import sys
+import time
+from datetime import datetime
+from urllib.parse import urlparse
+
+# Optional: the WebSocket client from simple-websocket (installed with flask-sock)
+try:
+    import simple_websocket
+except ImportError:
+    simple_websocket = None
+
+# HTTP endpoint equivalent to each /ws message type
+HTTP_PATHS = {'state': '/game_state', 'delta': '/game_delta'}
+
+class DecisionChannel:
+    """
+    One client connection to the decision server
+    
+    With transport 'auto' the client opens /ws and, if the WebSocket cannot be
+    established (no simple-websocket here, or a server without flask-sock),
+    posts to /game_state and /game_delta over a keep-alive connection instead.
+    A channel that drops mid-session falls back to HTTP for the rest of the
+    session; /game_delta keeps working because the hand state is held per
+    formkey on the server, not per connection.
+    """
+    
+    def __init__(self, url, transport='auto', insecure=False, timeout=30):
+        """
+        Args:
+            url: Server base URL (http:// or https://)
+            transport: 'auto', 'ws' (WebSocket only) or 'http' (HTTP only)
+            insecure: Skip certificate verification for HTTPS/WSS
+            timeout: Seconds to wait for each reply
+        """
+        self.url = urlparse(url)
+        self.transport = transport
+        self.insecure = insecure
+        self.timeout = timeout
+        self.ws = None
+        self.conn = None
+        self.ids = itertools.count(1)
+        if transport != 'http':
+            self._open_channel()
+    
+    def _ssl_context(self):
+        context = ssl.create_default_context()
+        if self.insecure:
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+        return context
+    
+    def _open_channel(self):
+        if simple_websocket is None:
+            if self.transport == 'ws':
+                raise RuntimeError("WebSocket transport needs simple-websocket (pip install simple-websocket)")
+            return
+        scheme = 'wss' if self.url.scheme == 'https' else 'ws'
+        port = self.url.port or (443 if scheme == 'wss' else 80)
+        try:
+            self.ws = simple_websocket.Client.connect(
+                f"{scheme}://{self.url.hostname}:{port}/ws",
+                ssl_context=self._ssl_context() if scheme == 'wss' else None
+            )
+        except (OSError, simple_websocket.ConnectionError, simple_websocket.ConnectionClosed):
+            if self.transport == 'ws':
+                raise
+            self.ws = None
+    
+    @property
+    def mode(self):
+        """Transport currently in use: 'ws' or 'http'"""
+        return 'ws' if self.ws is not None else 'http'
+    
+    def send(self, kind, body):
+        """
+        Send one game state ('state') or delta ('delta') and wait for its decision
+        
+        Args:
+            kind: 'state' (a /game_state body) or 'delta' (a /game_delta body)
+            body: Request body as a dict
+        
+        Returns:
+            (status code, response dict)
+        """
+        if self.ws is not None:
+            try:
+                return self._send_ws(kind, body)
+            except (OSError, simple_websocket.ConnectionClosed):
+                if self.transport == 'ws':
+                    raise
+                # The channel dropped; carry on over HTTP
+                self.ws = None
+        return self._send_http(kind, body)
+    
+    def _send_ws(self, kind, body):
+        message_id = next(self.ids)
+        self.ws.send(json.dumps(dict(body, type=kind, id=message_id)))
+        while True:
+            message = self.ws.receive(timeout=self.timeout)
+            if message is None:
+                raise TimeoutError(f"no reply to message {message_id} within {self.timeout}s")
+            reply = json.loads(message)
+            # Replies come back in order; skip any left over from an earlier timed-out message
+            if reply.get('id') == message_id:
+                return reply.pop('code', 200), reply
+    
+    def _send_http(self, kind, body):
+        if self.conn is None:
+            if self.url.scheme == 'https':
+                self.conn = http.client.HTTPSConnection(self.url.hostname, self.url.port or 443,
+                                                        context=self._ssl_context(), timeout=self.timeout)
+            else:
+                self.conn = http.client.HTTPConnection(self.url.hostname, self.url.port or 80, timeout=self.timeout)
+        try:
+            self.conn.request('POST', HTTP_PATHS[kind], json.dumps(body), {'Content-Type': 'application/json'})
+            response = self.conn.getresponse()
+            return response.status, json.loads(response.read() or b'{}')
+        except (OSError, http.client.HTTPException):
+            self.conn.close()
+            self.conn = None
+            raise
+    
+    def close(self):
+        if self.ws is not None:
+            self.ws.close()
+            self.ws = None
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+def sample_states():
+    """A short scripted hand: 9+7 against a dealer 10, one hit to 20, then a win"""
+    state = {
+        'player': ['9H', '7C'], 'dealer': ['XS', '?'], 'player_split': [], 'has_player_split': False,
+        'player_doubled_down': False, 'player_bought_insurance': False,
+        'wager': {'amount': 5, 'currency': 'coins'}, 'status': 'PLAYING', 'payout': 0,
+        'actions': ['HIT', 'STAY', 'DOUBLE_DOWN']
+    }
+    yield dict(state)
+    state.update(player=['9H', '7C', '4D'], actions=['HIT', 'STAY'])
+    yield dict(state)
+    state.update(dealer=['XS', '8C'], status='WON', payout=10, actions=['DEAL'])
+    yield dict(state)
+
+def main():
+    parser = argparse.ArgumentParser(description='Stream game states to the decision server over /ws')
+    parser.add_argument('--url', default='https://localhost:8080', help='Server base URL')
+    parser.add_argument('--transport', choices=['auto', 'ws', 'http'], default='auto',
+                        help='auto: /ws with HTTP fallback; ws or http: force one transport')
+    parser.add_argument('--formkey', default='ws-client', help='Formkey sent with each state')
+    parser.add_argument('--strategy', default='basic_strategy', help='Strategy name sent with each state')
+    parser.add_argument('--hands', type=int, default=1, help='Times to play the sample hand')
+    parser.add_argument('--insecure', action='store_true', help='Skip certificate verification for HTTPS')
+    
+    args = parser.parse_args()
+    
+    try:
+        channel = DecisionChannel(args.url, args.transport, args.insecure)
+    except (RuntimeError, OSError) as e:
+        print(f"Could not open the channel: {e}")
+        sys.exit(1)
+    
+    print(f"Connected to {args.url} over {channel.mode}")
+    latencies = []
+    try:
+        for _ in range(args.hands):
+            for state in sample_states():
+                body = {
+                    'state': state,
+                    'gambler': {'coins': 10000, 'marseybux': 0},
+                    'timestamp': datetime.now().isoformat(),
+                    'strategy': args.strategy,
+                    'formkey': args.formkey
+                }
+                start = time.perf_counter()
+                status, response = channel.send('state', body)
+                latencies.append(time.perf_counter() - start)
+                print(f"[{channel.mode} {status}] {state['status']} {state['player']} -> {response}")
+    finally:
+        channel.close()
+    
+    if latencies:
+        latencies.sort()
+        print(f"{len(latencies)} states, median round trip {latencies[len(latencies) // 2] * 1000:.2f} ms")
+
+if __name__ == '__main__':
+    main()
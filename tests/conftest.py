@@ -0,0 +1,44 @@
+"""
+Shared test setup
+
+Puts python/ and server/ on the import path the way the tools and the server
+run, and serves the strategies in python/bj-strategies as the 'strategies'
+package the server imports them from.
+"""
+
+import os
+import sys
+import types
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'python'), os.path.join(ROOT, 'server')]
+
+if 'strategies' not in sys.modules:
+    strategies = types.ModuleType('strategies')
+    strategies.__path__ = [os.path.join(ROOT, 'python', 'bj-strategies')]
+    sys.modules['strategies'] = strategies
+
+from database import Database
+
+@pytest.fixture
+def db(tmp_path):
+    """A new database with the current schema"""
+    return Database(str(tmp_path / 'test.db'))
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    """
+    The server module with its database and delta sessions moved onto a new shard
+    
+    server.py configures itself when imported, so the first import uses a throwaway database.
+    """
+    monkeypatch.setenv('BJ_DB_PATH', str(tmp_path / 'import.db'))
+    import server
+    from sessions import SessionStore
+    from sharding import ShardRouter
+    
+    monkeypatch.setattr(server, 'databases', ShardRouter(str(tmp_path / 'server.db')))
+    monkeypatch.setattr(server, 'sessions', SessionStore())
+    return server
@@ -0,0 +1,21 @@
+"""Game states for tests, shaped like the ones the userscript posts"""
+
+# Stored hands older than any archive cutoff
+OLD_TIMESTAMP = '2020-01-01T12:00:00'
+
+def playing_state(player, dealer_upcard='XS', actions=('HIT', 'STAY'), **fields):
+    """A PLAYING state as the userscript sends it"""
+    state = {
+        'player': list(player), 'dealer': [dealer_upcard, '?'], 'player_split': [], 'has_player_split': False,
+        'wager': {'amount': 5, 'currency': 'coins'}, 'status': 'PLAYING', 'payout': 0, 'actions': list(actions)
+    }
+    state.update(fields)
+    return state
+
+def finished_state(player, dealer, status, payout=0, dealer_value=17, **fields):
+    """A finished state offering DEAL"""
+    state = playing_state(player, dealer[0], actions=('DEAL',), status=status, payout=payout,
+                          dealer_value=dealer_value)
+    state['dealer'] = list(dealer)
+    state.update(fields)
+    return state
@@ -0,0 +1,38 @@
+import re
+import sys
+
+import pytest
+
+import analyze_data
+from analyze_data import parse_upcard, upcard_label
+from states import OLD_TIMESTAMP, finished_state, playing_state
+
+@pytest.mark.parametrize('text, rank', [
+    ('2', '2'), ('9', '9'), ('10', 'X'), ('x', 'X'), ('K', 'X'), ('q', 'X'), ('a', 'A'),
+    ('1', None), ('11', None), ('2x', None), ('B', None), ('', None)
+])
+def test_parse_upcard(text, rank):
+    assert parse_upcard(text) == rank
+
+def test_ten_value_upcard_label_matches_everywhere():
+    assert upcard_label('X') == '10'
+    assert [upcard_label(rank) for rank in analyze_data.UPCARD_RANKS] == \
+        ['2', '3', '4', '5', '6', '7', '8', '9', '10', 'A']
+
+def test_unknown_upcard_is_a_usage_error(monkeypatch, capsys, tmp_path):
+    monkeypatch.setattr(sys, 'argv', ['analyze_data.py', '--db', str(tmp_path / 'bj.db'),
+                                      '--situations', '--upcard', '11'])
+    with pytest.raises(SystemExit) as raised:
+        analyze_data.main()
+    assert raised.value.code == 2
+    assert 'unknown upcard' in capsys.readouterr().err
+
+def test_dealer_tables_label_tens_as_10(db, capsys):
+    hand_id = db.store_hand(playing_state(['XS', '8H'], 'KS'), {'coins': 100}, OLD_TIMESTAMP)
+    db.update_hand_outcome(hand_id, finished_state(['XS', '8H'], ['KS', 'XH'], 'LOST', dealer_value=20))
+    analyzer = analyze_data.BlackjackAnalyzer(db.db_path, resamples=10, seed=1)
+    analyzer.analyze()
+    out = capsys.readouterr().out
+    bust_table = out[out.index('Dealer Bust Rates'):]
+    assert re.search(r'\|\s+10 \|\s+1 \|', bust_table)
+    assert not re.search(r'\|\s+X\s+\|', out)
@@ -0,0 +1,104 @@
+import sqlite3
+
+from analyze_data import BlackjackAnalyzer
+from archive import HandArchive, decode_card, encode_card
+from database import Database
+from states import OLD_TIMESTAMP, finished_state, playing_state
+
+def store_game_state_hand(db, formkey, timestamp=OLD_TIMESTAMP):
+    """One hand as /game_state stores it: a row per decided state, then the finished row"""
+    first = playing_state(['9H', '5C'])
+    hand_id = db.store_hand(first, {'coins': 100}, timestamp, formkey)
+    db.store_action(hand_id, 'hit', 14, 10, first, formkey)
+    
+    second = playing_state(['9H', '5C', '4D'])
+    hand_id = db.store_hand(second, {'coins': 100}, timestamp, formkey)
+    db.store_action(hand_id, 'stay', 18, 10, second, formkey)
+    
+    final = finished_state(['9H', '5C', '4D'], ['XS', '7C'], 'WON', payout=10, player_value=18)
+    hand_id = db.store_hand(final, {'coins': 100}, timestamp, formkey)
+    db.update_hand_outcome(hand_id, final, formkey)
+    return hand_id
+
+def count(db, table):
+    conn = sqlite3.connect(db.db_path)
+    try:
+        return conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+    finally:
+        conn.close()
+
+def test_cards_round_trip():
+    for card in ('AS', 'XH', 'KD', '2C', '9S', '?'):
+        assert decode_card(encode_card(card)) == card
+    assert decode_card(0) == ''
+
+def test_compact_round_trips_finished_hands(db, tmp_path):
+    hand_id = store_game_state_hand(db, 'alice')
+    archive = HandArchive(str(tmp_path / 'archive'))
+    
+    assert archive.compact(db.db_path, days=30) == 1
+    assert len(archive) == 1
+    assert archive.column('id').tolist() == [hand_id]
+    assert archive.statuses().tolist() == ['WON']
+    assert archive.upcards().tolist() == ['X']
+    assert archive.formkeys() == ['alice']
+    assert archive.column('payout').tolist() == [10]
+    assert [decode_card(code) for code in archive.column('player_cards')[0] if code] == ['9H', '5C', '4D']
+    
+    # Repeating the run archives nothing twice
+    assert archive.compact(db.db_path, days=30) == 0
+    assert len(archive) == 1
+
+def test_compact_removes_superseded_playing_rows(db, tmp_path):
+    store_game_state_hand(db, 'alice')
+    store_game_state_hand(db, 'bob')
+    # bob's next hand stopped mid-way; its newest row stays in case the hand resumes
+    in_progress = db.store_hand(playing_state(['8H', '8C']), {'coins': 100}, OLD_TIMESTAMP, 'bob')
+    recent = db.store_hand(playing_state(['7H', '6C']), {'coins': 100}, '2999-01-01T00:00:00', 'carol')
+    
+    HandArchive(str(tmp_path / 'archive')).compact(db.db_path, days=30)
+    
+    conn = sqlite3.connect(db.db_path)
+    try:
+        remaining = [row[0] for row in conn.execute('SELECT id FROM hands ORDER BY id')]
+    finally:
+        conn.close()
+    assert remaining == [in_progress, recent]
+    assert count(db, 'actions') == 0
+
+def test_compact_invalidates_cached_statistics(db, tmp_path):
+    store_game_state_hand(db, 'alice')
+    assert db.get_statistics('alice')['total_hands'] == 1
+    etag = db.get_statistics_etag()
+    alice_etag = db.get_statistics_etag('alice')
+    
+    HandArchive(str(tmp_path / 'archive')).compact(db.db_path, days=30)
+    
+    assert db.get_statistics_etag() != etag
+    assert db.get_statistics_etag('alice') != alice_etag
+    assert db.get_statistics('alice')['total_hands'] == 0
+
+def test_compact_keeps_hands_whose_ids_collide_with_another_database(tmp_path):
+    # Two shards number their hands independently, so both finished hands get the same id
+    first = Database(str(tmp_path / 'first.db'))
+    second = Database(str(tmp_path / 'second.db'))
+    first_id = store_game_state_hand(first, 'alice')
+    second_id = store_game_state_hand(second, 'bob', timestamp='2020-01-02T12:00:00')
+    assert first_id == second_id
+    archive = HandArchive(str(tmp_path / 'archive'))
+    
+    assert archive.compact(first.db_path, days=30) == 1
+    assert archive.compact(second.db_path, days=30) == 1
+    
+    assert archive.column('id').tolist() == [first_id, second_id]
+    assert sorted(archive.formkeys()) == ['alice', 'bob']
+    assert count(second, 'hands') == 0
+
+def test_overall_stats_include_archived_hands(db, tmp_path, capsys):
+    store_game_state_hand(db, 'alice')
+    store_game_state_hand(db, 'bob', timestamp='2999-01-01T00:00:00')
+    HandArchive(str(tmp_path / 'archive')).compact(db.db_path, days=30)
+    
+    BlackjackAnalyzer(db.db_path, resamples=10, seed=1, archive_dir=str(tmp_path / 'archive')).analyze()
+    
+    assert '| Total Hands   | 2 (1 archived) |' in capsys.readouterr().out
@@ -0,0 +1,68 @@
+import sys
+
+import numpy as np
+import pytest
+
+import bankroll_sim
+from bankroll_sim import BankrollSimulator
+from states import OLD_TIMESTAMP, finished_state
+
+def simulate(multiples, **kwargs):
+    simulator = BankrollSimulator(multiples, **dict({'bankroll': 100, 'wager': 10, 'hands': 50, 'paths': 200,
+                                                     'seed': 1}, **kwargs))
+    result = simulator.run()
+    return result, simulator.summarize(result)
+
+def test_ruin_is_certain_when_every_hand_loses():
+    result, summary = simulate([-1.0])
+    assert summary['risk_of_ruin'] == 1.0
+    # 100 coins cover ten 10-coin bets
+    assert (result['hands_to_ruin'] == 10).all()
+    assert (result['final'] == 0).all()
+    assert summary['expected_max_drawdown'] == 100
+
+def test_ruin_never_happens_when_every_hand_wins():
+    result, summary = simulate([1.0])
+    assert summary['risk_of_ruin'] == 0.0
+    assert summary['median_hands_to_ruin'] is None
+    assert (result['final'] == 100 + 50 * 10).all()
+    assert summary['expected_max_drawdown'] == 0
+
+def test_reached_target_is_absorbing():
+    # Win five hands to reach the target, then lose everything if play went on
+    result, summary = simulate([1.0, -1.0], target=150, hands=5, paths=20000)
+    reached = result['reached']
+    assert summary['target_probability'] == pytest.approx(1 / 32, abs=0.005)
+    assert (result['final'][reached] == 150).all()
+    assert (result['hands_to_target'][reached] == 5).all()
+    
+    result, summary = simulate([1.0], target=150, hands=50)
+    assert summary['target_probability'] == 1.0
+    assert (result['final'] == 150).all()
+    assert (result['hands_to_target'] == 5).all()
+    assert summary['expected_max_drawdown'] == 0
+
+def test_chunked_run_matches_path_count(monkeypatch):
+    monkeypatch.setattr(bankroll_sim, 'MAX_PATH_CELLS', 64)
+    result, summary = simulate([-1.0, 0.0, 1.0], paths=37)
+    assert summary['paths'] == 37
+    assert all(len(values) == 37 for values in result.values())
+
+def test_no_outcomes_is_an_error():
+    with pytest.raises(ValueError):
+        BankrollSimulator(np.empty(0), bankroll=100, wager=10)
+
+def test_missing_database_is_a_usage_error(monkeypatch, capsys, tmp_path):
+    monkeypatch.setattr(sys, 'argv', ['bankroll_sim.py', '--db', str(tmp_path / 'none.db'), '--source', 'simulation'])
+    with pytest.raises(SystemExit) as raised:
+        bankroll_sim.main()
+    assert raised.value.code == 2
+    assert 'not found' in capsys.readouterr().err
+
+def test_data_source_reads_recorded_outcomes(db):
+    for status, payout in (('WON', 10), ('LOST', 0)):
+        db.store_hand(finished_state(['XS', '9H'], ['XC', '8D'], status, payout=payout), {'coins': 100},
+                      OLD_TIMESTAMP)
+    outcomes = bankroll_sim.load_outcomes(db.db_path)
+    assert sorted(outcomes['multiples'].tolist()) == [-1.0, 1.0]
+    assert outcomes['wager'].tolist() == [5, 5]
@@ -0,0 +1,78 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+from states import playing_state
+from ws_client import DecisionChannel
+
+def send(server, message):
+    return json.loads(server.channel_message(json.dumps(message)))
+
+def test_state_message_gets_the_game_state_decision(server):
+    reply = send(server, {'type': 'state', 'id': 7, 'state': playing_state(['9H', '5C']), 'formkey': 'alice'})
+    assert reply['id'] == 7
+    assert reply['code'] == 200
+    assert reply['action'] == 'hit'
+
+def test_delta_messages_follow_the_session(server):
+    reply = send(server, {'type': 'delta', 'id': 'a', 'formkey': 'alice', 'seq': 1,
+                          'full_state': playing_state(['9H', '2C'])})
+    assert (reply['id'], reply['code'], reply['action']) == ('a', 200, 'hit')
+    reply = send(server, {'type': 'delta', 'id': 'b', 'formkey': 'alice', 'seq': 2, 'append': {'player': ['XD']}})
+    assert (reply['id'], reply['code'], reply['action']) == ('b', 200, 'stay')
+    
+    # Out of sequence: the endpoint's status comes back as the code
+    reply = send(server, {'type': 'delta', 'id': 'c', 'formkey': 'alice', 'seq': 5, 'append': {'player': ['2H']}})
+    assert (reply['id'], reply['code']) == ('c', 409)
+
+@pytest.mark.parametrize('message', ['not json', '[1, 2]', json.dumps({'type': 'bogus', 'id': 3})])
+def test_invalid_messages_are_rejected(server, message):
+    reply = json.loads(server.channel_message(message))
+    assert reply['code'] == 400
+    assert 'error' in reply
+
+def test_unknown_type_still_echoes_the_id(server):
+    assert send(server, {'type': 'bogus', 'id': 3})['id'] == 3
+
+class HttpOnlyHandler(BaseHTTPRequestHandler):
+    """A server without /ws: the upgrade gets a 404, /game_state answers"""
+    protocol_version = 'HTTP/1.1'
+    
+    def do_GET(self):
+        self.send_response(404)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+    
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        reply = json.dumps({'action': 'stay', 'path': self.path, 'formkey': body.get('formkey')}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(reply)))
+        self.end_headers()
+        self.wfile.write(reply)
+    
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def http_only_url():
+    httpd = HTTPServer(('127.0.0.1', 0), HttpOnlyHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{httpd.server_port}'
+    httpd.shutdown()
+    httpd.server_close()
+
+def test_auto_transport_falls_back_to_http(http_only_url):
+    channel = DecisionChannel(http_only_url, transport='auto', timeout=5)
+    try:
+        assert channel.mode == 'http'
+        status, reply = channel.send('state', {'state': playing_state(['9H', '5C']), 'formkey': 'alice'})
+        assert status == 200
+        assert reply == {'action': 'stay', 'path': '/game_state', 'formkey': 'alice'}
+        assert channel.send('delta', {'formkey': 'alice', 'seq': 1})[1]['path'] == '/game_delta'
+    finally:
+        channel.close()
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+import confidence
+from confidence import (
+    bootstrap_mean, bootstrap_proportions, bootstrap_ratio,
+    mean_interval, ratio_interval, wilson_interval, z_score
+)
+
+def hand_results(n=2000, seed=7):
+    """Per-hand (net, wager) arrays with the few distinct outcomes real hands have"""
+    rng = np.random.default_rng(seed)
+    wager = rng.choice([5.0, 10.0], size=n)
+    net = wager * rng.choice([-1.0, 0.0, 1.0, 1.5], size=n, p=[0.48, 0.08, 0.40, 0.04])
+    return net, wager
+
+def test_z_score():
+    assert z_score(0.95) == pytest.approx(1.959964, abs=1e-6)
+    assert z_score(0.99) == pytest.approx(2.575829, abs=1e-6)
+
+def test_wilson_interval_matches_reference_values():
+    lows, highs = wilson_interval([5, 0, 10], [10, 10, 10])
+    assert lows == pytest.approx([0.236593, 0.0, 0.722467], abs=1e-6)
+    assert highs == pytest.approx([0.763407, 0.277533, 1.0], abs=1e-6)
+
+def test_wilson_interval_is_nan_without_trials():
+    lows, highs = wilson_interval([0], [0])
+    assert np.isnan(lows[0]) and np.isnan(highs[0])
+
+def test_mean_interval():
+    interval = mean_interval([1.0, 2.0, 3.0, 4.0])
+    half_width = z_score(0.95) * np.std([1, 2, 3, 4], ddof=1) / 2
+    assert interval == pytest.approx({'estimate': 2.5, 'low': 2.5 - half_width, 'high': 2.5 + half_width})
+    assert mean_interval([1.0]) is None
+
+def test_ratio_interval_with_unit_denominator_is_the_mean_interval():
+    net, _ = hand_results()
+    assert ratio_interval(net, np.ones_like(net)) == pytest.approx(mean_interval(net))
+    assert ratio_interval([1.0, 2.0], [0.0, 0.0]) is None
+
+def test_bootstrap_ratio_agrees_with_delta_method():
+    net, wager = hand_results()
+    boot = bootstrap_ratio(net, wager, resamples=4000, seed=1)
+    analytic = ratio_interval(net, wager)
+    assert boot['estimate'] == pytest.approx(net.sum() / wager.sum())
+    assert boot['low'] < boot['estimate'] < boot['high']
+    assert boot['low'] == pytest.approx(analytic['low'], abs=0.01)
+    assert boot['high'] == pytest.approx(analytic['high'], abs=0.01)
+
+def test_bootstrap_is_reproducible_with_a_seed():
+    net, wager = hand_results()
+    assert bootstrap_ratio(net, wager, resamples=500, seed=3) == bootstrap_ratio(net, wager, resamples=500, seed=3)
+
+def test_index_resampling_matches_multinomial_counts(monkeypatch):
+    net, wager = hand_results()
+    multinomial = bootstrap_ratio(net, wager, resamples=4000, seed=1)
+    monkeypatch.setattr(confidence, 'MAX_MULTINOMIAL_OUTCOMES', 0)
+    monkeypatch.setattr(confidence, 'MAX_RESAMPLE_CELLS', 1 << 16)
+    indexed = bootstrap_ratio(net, wager, resamples=4000, seed=1)
+    assert indexed['estimate'] == multinomial['estimate']
+    assert indexed['low'] == pytest.approx(multinomial['low'], abs=0.01)
+    assert indexed['high'] == pytest.approx(multinomial['high'], abs=0.01)
+
+def test_bootstrap_without_data():
+    assert bootstrap_mean([]) is None
+    assert bootstrap_ratio([1.0], [0.0]) is None
+
+@pytest.mark.filterwarnings('error')
+def test_bootstrap_proportions():
+    estimates, lows, highs = bootstrap_proportions([50, 0, 3], [100, 0, 3], resamples=2000, seed=2)
+    assert estimates[0] == 0.5 and np.isnan(estimates[1]) and estimates[2] == 1.0
+    assert 0.35 < lows[0] < 0.5 < highs[0] < 0.65
+    assert np.isnan(lows[1]) and np.isnan(highs[1])
+    assert lows[2] == highs[2] == 1.0
@@ -0,0 +1,67 @@
+import logging
+import sqlite3
+
+import pytest
+
+from database import SCHEMA_VERSION, Database, classify_hand, enable_incremental_vacuum, hand_net
+
+@pytest.mark.parametrize('cards, expected', [
+    (['8S', '8H'], ('pair', 16)),
+    (['XS', 'KH'], ('pair', 20)),
+    (['AS', 'AH'], ('pair', 12)),
+    (['AS', '6H'], ('soft', 17)),
+    (['AS', '6H', '9D'], ('hard', 16)),
+    (['AS', 'AH', '9D'], ('soft', 21)),
+    (['XS', '6H'], ('hard', 16)),
+    (['XS', '6H', '?'], ('hard', 16)),
+    ([], (None, 0)),
+    (['?'], (None, 0))
+])
+def test_classify_hand(cards, expected):
+    assert classify_hand(cards) == expected
+
+@pytest.mark.parametrize('status, wager, payout, net', [
+    ('WON', 10, 20, 10),
+    ('BLACKJACK', 10, 25, 15),
+    ('LOST', 10, 0, -10),
+    ('PUSHED', 10, 10, 0),
+    ('WON', None, None, 0),
+    ('PLAYING', 10, 0, 0)
+])
+def test_hand_net(status, wager, payout, net):
+    assert hand_net(status, wager, payout) == net
+
+def auto_vacuum(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute('PRAGMA auto_vacuum').fetchone()[0]
+    finally:
+        conn.close()
+
+def test_existing_database_is_converted_offline_not_on_open(tmp_path, caplog):
+    path = str(tmp_path / 'old.db')
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE legacy (id INTEGER PRIMARY KEY, note TEXT)')
+    conn.execute("INSERT INTO legacy (note) VALUES ('kept')")
+    conn.execute('PRAGMA user_version = 3')
+    conn.commit()
+    conn.close()
+    assert auto_vacuum(path) == 0
+    
+    # Opening it migrates the schema but leaves the full VACUUM to an offline run
+    with caplog.at_level(logging.WARNING, logger='database'):
+        Database(path)
+    assert auto_vacuum(path) == 0
+    assert any('--enable-incremental-vacuum' in record.getMessage() for record in caplog.records)
+    
+    assert enable_incremental_vacuum(path) is True
+    assert enable_incremental_vacuum(path) is False
+    
+    conn = sqlite3.connect(path)
+    assert conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2
+    assert conn.execute('PRAGMA user_version').fetchone()[0] == SCHEMA_VERSION
+    assert conn.execute('SELECT note FROM legacy').fetchall() == [('kept',)]
+    conn.close()
+
+def test_new_database_starts_in_incremental_vacuum_mode(db):
+    assert auto_vacuum(db.db_path) == 2
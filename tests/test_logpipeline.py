@@ -0,0 +1,27 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs fork')
+def test_forked_child_gets_its_own_listener():
+    script = textwrap.dedent('''
+        import logging, os, sys
+        sys.path.insert(0, %r)
+        from logpipeline import configure_logging
+        configure_logging(mode='async')
+        pid = os.fork()
+        if pid == 0:
+            logging.info('from child')
+            sys.exit(0)
+        os.waitpid(pid, 0)
+        logging.info('from parent')
+    ''' % os.path.join(ROOT, 'server'))
+    result = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, timeout=30)
+    assert result.returncode == 0, result.stderr
+    assert 'from child' in result.stderr
+    assert 'from parent' in result.stderr
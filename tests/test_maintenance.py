@@ -0,0 +1,21 @@
+import logging
+import sqlite3
+import time
+
+from maintenance import MaintenanceScheduler
+
+def test_non_incremental_database_is_reported_once(tmp_path, caplog):
+    path = str(tmp_path / 'plain.db')
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE t (x)')
+    conn.close()
+    
+    scheduler = MaintenanceScheduler(databases=None)
+    shard = scheduler._shard(path)
+    with caplog.at_level(logging.WARNING, logger='maintenance'):
+        scheduler._incremental_vacuum(shard, time.monotonic() + 1)
+        scheduler._incremental_vacuum(shard, time.monotonic() + 1)
+    
+    warnings = [record for record in caplog.records if 'auto_vacuum=INCREMENTAL' in record.getMessage()]
+    assert len(warnings) == 1
+    assert path in warnings[0].getMessage()
@@ -0,0 +1,55 @@
+import pytest
+
+from metrics import DEFAULT_BOUNDS, LatencyHistogram, Metrics
+
+def test_observe_fills_the_bucket_at_or_above_the_sample():
+    histogram = LatencyHistogram(bounds=(0.1, 0.2, 0.4))
+    for seconds in (0.05, 0.1, 0.15, 0.3, 1.0):
+        histogram.observe(seconds)
+    counts, total = histogram.snapshot()
+    assert counts == [2, 1, 1, 1]
+    assert total == pytest.approx(1.6)
+
+def test_quantile_interpolates_inside_the_bucket():
+    histogram = LatencyHistogram(bounds=(0.1, 0.2, 0.4))
+    assert histogram.quantile(0.5) is None
+    for _ in range(4):
+        histogram.observe(0.15)
+    assert histogram.quantile(0.5) == pytest.approx(0.15)
+    assert histogram.quantile(1.0) == pytest.approx(0.2)
+    histogram.observe(5.0)
+    assert histogram.quantile(0.99) == 0.4
+
+def test_default_buckets_keep_quantiles_within_a_bucket_width():
+    histogram = LatencyHistogram()
+    samples = [0.001 * (i + 1) for i in range(1000)]
+    for seconds in samples:
+        histogram.observe(seconds)
+    # Neighbouring default bounds are 2 ** 0.25 apart
+    for q in (0.5, 0.95, 0.99):
+        assert histogram.quantile(q) == pytest.approx(samples[int(q * len(samples)) - 1], rel=0.2)
+    assert DEFAULT_BOUNDS[0] == pytest.approx(1e-5) and DEFAULT_BOUNDS[-1] == pytest.approx(1e-5 * 2 ** 20)
+
+def test_render_prometheus_text():
+    metrics = Metrics(prefix='t')
+    metrics.observe_phase('decide', 0.002)
+    metrics.observe_request('/game', 200, 0.003)
+    metrics.observe_request('/game', 200, 0.004)
+    metrics.observe_request('/game', 400, 0.001)
+    metrics.count_action('HIT')
+    text = metrics.render()
+    lines = text.splitlines()
+    
+    assert text.endswith('\n')
+    assert '# TYPE t_phase_latency_seconds histogram' in lines
+    assert 't_phase_latency_seconds_bucket{phase="decide",le="+Inf"} 1' in lines
+    assert 't_request_latency_seconds_count{endpoint="/game"} 3' in lines
+    assert 't_request_latency_seconds_sum{endpoint="/game"} 0.008000000' in lines
+    assert 't_requests_total{endpoint="/game",status="200"} 2' in lines
+    assert 't_requests_total{endpoint="/game",status="400"} 1' in lines
+    assert 't_actions_total{action="HIT"} 1' in lines
+    assert any(line.startswith('t_request_latency_seconds_quantile{endpoint="/game",quantile="0.99"}') for line in lines)
+    
+    buckets = [int(line.rsplit(' ', 1)[1]) for line in lines
+               if line.startswith('t_request_latency_seconds_bucket{')]
+    assert buckets == sorted(buckets) and buckets[-1] == 3
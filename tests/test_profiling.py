@@ -0,0 +1,67 @@
+import threading
+
+import pytest
+
+from profiling import SamplingProfiler
+
+def test_dump_text_rejects_unknown_sort():
+    profiler = SamplingProfiler(rate=1.0)
+    with pytest.raises(ValueError):
+        profiler.dump_text(sort='bogus')
+    assert profiler.dump_text(sort='time') == 'No samples collected\n'
+
+def test_concurrent_calls_are_sampled_one_at_a_time():
+    profiler = SamplingProfiler(rate=1.0)
+    profiler.configure(enabled=True)
+    inside = threading.Event()
+    release = threading.Event()
+    
+    @profiler.profile
+    def slow():
+        inside.set()
+        release.wait(5)
+        return 'slow'
+    
+    @profiler.profile
+    def fast():
+        return 'fast'
+    
+    thread = threading.Thread(target=slow)
+    thread.start()
+    inside.wait(5)
+    # Runs unprofiled while the first sample is active instead of starting a second profiler
+    assert fast() == 'fast'
+    release.set()
+    thread.join()
+    
+    assert profiler.status()['sampled'] == 1
+    assert fast() == 'fast'
+    assert profiler.status()['sampled'] == 2
+
+def test_admin_profile_is_local_only_without_token(server, monkeypatch):
+    monkeypatch.delenv('BJ_ADMIN_TOKEN', raising=False)
+    client = server.app.test_client()
+    
+    assert client.get('/admin/profile').status_code == 200
+    remote = client.get('/admin/profile', environ_base={'REMOTE_ADDR': '203.0.113.7'})
+    assert remote.status_code == 403
+
+def test_admin_profile_requires_configured_token(server, monkeypatch):
+    monkeypatch.setenv('BJ_ADMIN_TOKEN', 'secret')
+    client = server.app.test_client()
+    
+    assert client.get('/admin/profile').status_code == 403
+    assert client.get('/admin/profile', headers={'X-Admin-Token': 'wrong'}).status_code == 403
+    assert client.get('/admin/profile', headers={'X-Admin-Token': 'secret'}).status_code == 200
+
+def test_admin_profile_rejects_bad_arguments(server, monkeypatch):
+    monkeypatch.delenv('BJ_ADMIN_TOKEN', raising=False)
+    client = server.app.test_client()
+    
+    assert client.get('/admin/profile?sort=bogus').status_code == 400
+    assert client.post('/admin/profile', json={'rate': 'often'}).status_code == 400
+
+def test_admin_profile_is_unavailable_with_several_workers(server, monkeypatch):
+    monkeypatch.delenv('BJ_ADMIN_TOKEN', raising=False)
+    monkeypatch.setattr(server, 'WORKERS', 4)
+    assert server.app.test_client().post('/admin/profile', json={'enabled': True}).status_code == 409
@@ -0,0 +1,62 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from replay import HttpTarget, diff_actions, replay
+
+def write_output(path, actions):
+    with open(path, 'w') as f:
+        for index, action in enumerate(actions):
+            f.write(json.dumps({'i': index, 'formkey': 'alice', 'status': 'PLAYING', 'action': action,
+                                'http_status': 200}) + '\n')
+    return str(path)
+
+def test_diff_actions_counts_changed_actions(tmp_path):
+    baseline = write_output(tmp_path / 'baseline.ndjson', ['hit', 'stay', 'none'])
+    current = write_output(tmp_path / 'current.ndjson', ['hit', 'hit', 'none'])
+    assert diff_actions(baseline, current) == 1
+
+def test_diff_actions_reports_missing_and_extra_requests(tmp_path, capsys):
+    baseline = write_output(tmp_path / 'baseline.ndjson', ['hit', 'stay', 'none'])
+    shorter = write_output(tmp_path / 'shorter.ndjson', ['hit'])
+    longer = write_output(tmp_path / 'longer.ndjson', ['hit', 'stay', 'none', 'hit'])
+    
+    assert diff_actions(baseline, shorter) == 2
+    assert '2 request(s) missing' in capsys.readouterr().out
+    assert diff_actions(baseline, longer) == 1
+    assert '1 extra request(s)' in capsys.readouterr().out
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    """Answers with an HTML error page every other request, JSON otherwise"""
+    protocol_version = 'HTTP/1.1'
+    requests = 0
+    
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        FlakyHandler.requests += 1
+        if FlakyHandler.requests % 2:
+            status, body = 500, b'<html><body>Internal Server Error</body></html>'
+        else:
+            status, body = 200, b'{"action": "hit"}'
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, *args):
+        pass
+
+def test_non_json_responses_count_as_errors():
+    server = HTTPServer(('127.0.0.1', 0), FlakyHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    target = HttpTarget(f'http://127.0.0.1:{server.server_port}')
+    try:
+        result = replay([(0.0, {'formkey': 'alice', 'state': {}})] * 4, target)
+    finally:
+        target.close()
+        server.shutdown()
+        server.server_close()
+    
+    assert result['requests'] == 4
+    assert result['errors'] == 2
@@ -0,0 +1,92 @@
+import pytest
+
+from sessions import HandSession, SequenceMismatch, SessionStore
+from states import playing_state
+
+def test_apply_appends_and_sets_fields():
+    session = HandSession('alice')
+    session.reset(playing_state(['9H', '5C']), {'coins': 100}, seq=1)
+    
+    session.apply(2, append={'player': ['4D']}, set_fields={'actions': ['HIT', 'STAY']})
+    
+    assert session.seq == 2
+    assert session.state['player'] == ['9H', '5C', '4D']
+    assert session.state['actions'] == ['HIT', 'STAY']
+
+def test_apply_rejects_gaps_and_repeats():
+    session = HandSession('alice')
+    session.reset(playing_state(['9H', '5C']), seq=1)
+    
+    with pytest.raises(SequenceMismatch) as error:
+        session.apply(3, append={'player': ['4D']})
+    assert error.value.expected == 2
+    with pytest.raises(SequenceMismatch):
+        session.apply(1, append={'player': ['4D']})
+    assert session.state['player'] == ['9H', '5C']
+
+def test_apply_rejects_malformed_deltas():
+    session = HandSession('alice')
+    session.reset(playing_state(['9H', '5C']), seq=1)
+    
+    with pytest.raises(ValueError):
+        session.apply(2, append={'status': ['WON']})
+    with pytest.raises(ValueError):
+        session.apply(2, set_fields=['status'])
+    assert session.seq == 1
+
+def test_reset_copies_the_state():
+    state = playing_state(['9H', '5C'])
+    session = HandSession('alice')
+    session.reset(state, seq=4)
+    session.apply(5, append={'player': ['4D']})
+    assert state['player'] == ['9H', '5C']
+
+def test_store_evicts_least_recently_used():
+    store = SessionStore(max_sessions=2)
+    store.get('a')
+    store.get('b')
+    store.get('a')
+    store.get('c')
+    
+    assert len(store) == 2
+    assert store.get('b', create=False) is None
+    assert store.get('a', create=False) is not None
+
+def test_delta_sequence_survives_alternating_workers(server, monkeypatch):
+    """Each delta lands on a different worker process, as with BJ_WORKERS > 1"""
+    workers = [SessionStore(shared=True), SessionStore(shared=True)]
+    
+    def send(worker, body):
+        monkeypatch.setattr(server, 'sessions', workers[worker])
+        return server.game_delta_response(dict(body, formkey='alice'))
+    
+    response, status = send(0, {'seq': 1, 'full_state': playing_state(['9H', '2C'])})
+    assert (status, response['action']) == (200, 'hit')
+    response, status = send(1, {'seq': 2, 'append': {'player': ['3D']}})
+    assert (status, response['action']) == (200, 'hit')
+    # Worker 0 still holds seq 1 in memory and must not answer from it
+    response, status = send(0, {'seq': 3, 'append': {'player': ['5S']}})
+    assert (status, response['action']) == (200, 'stay')
+    assert response['seq'] == 3
+    
+    # A retransmitted delta gets the stored response from whichever worker receives it
+    assert send(1, {'seq': 3, 'append': {'player': ['5S']}}) == (response, 200)
+    
+    _, status = send(1, {'seq': 5, 'append': {'player': ['2H']}})
+    assert status == 409
+
+def test_delta_without_session_asks_for_full_state(server, monkeypatch):
+    monkeypatch.setattr(server, 'sessions', SessionStore(shared=True))
+    response, status = server.game_delta_response({'formkey': 'nobody', 'seq': 2, 'append': {'player': ['3D']}})
+    assert status == 409
+    assert response['resync'] is True
+
+def test_concurrent_write_is_detected(db):
+    record = {'seq': 1, 'hand_id': None, 'strategy': 'basic_strategy', 'state': {}, 'gambler': {},
+              'last_response': None}
+    assert db.save_delta_session('alice', record, 0)
+    # A second worker that also started from version 0 lost the race
+    assert not db.save_delta_session('alice', dict(record, seq=2), 0)
+    assert db.load_delta_session('alice')['seq'] == 1
+    assert db.save_delta_session('alice', dict(record, seq=2), 1)
+    assert db.load_delta_session('alice')['version'] == 2
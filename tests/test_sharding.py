@@ -0,0 +1,50 @@
+from database import merge_statistics, summarize_statistics
+from sharding import ShardRouter, shard_path
+from states import finished_state
+
+def stats(**counters):
+    values = dict.fromkeys(('total_hands', 'wins', 'losses', 'pushes', 'blackjacks', 'busts',
+                            'total_wagered', 'total_won', 'total_lost'), 0)
+    values.update(counters)
+    return summarize_statistics(**values)
+
+def test_merge_statistics_sums_counters_and_recomputes_rates():
+    merged = merge_statistics([
+        stats(total_hands=2, wins=2, total_wagered=10, total_won=10),
+        stats(total_hands=2, losses=1, pushes=1, total_wagered=10, total_lost=5)
+    ])
+    assert merged['total_hands'] == 4
+    assert merged['win_rate'] == 50.0
+    assert merged['net_profit'] == 5
+    assert merged['roi'] == 25.0
+
+def test_merge_statistics_of_nothing_is_empty():
+    merged = merge_statistics([])
+    assert merged['total_hands'] == 0
+    assert merged['win_rate'] == 0
+
+def test_shard_paths():
+    assert shard_path('db/bj.db', 0, 1) == 'db/bj.db'
+    assert shard_path('db/bj.db', 3, 4) == 'db/bj.shard03.db'
+
+def test_formkeys_stay_on_their_shard_and_stats_fan_out(tmp_path):
+    router = ShardRouter(str(tmp_path / 'bj.db'), shards=4)
+    formkeys = [f'bot-{i}' for i in range(12)]
+    assert [router.shard_index(formkey) for formkey in formkeys] == \
+        [ShardRouter(str(tmp_path / 'other.db'), shards=4).shard_index(formkey) for formkey in formkeys]
+    
+    for formkey in formkeys:
+        db = router.for_formkey(formkey)
+        state = finished_state(['XH', '9C'], ['XS', '7C'], 'WON', payout=10, player_value=19)
+        db.update_hand_outcome(db.store_hand(state, {'coins': 100}, '2024-01-01T00:00:00', formkey), state, formkey)
+    
+    assert len({router.shard_index(formkey) for formkey in formkeys}) > 1
+    assert router.get_statistics()['total_hands'] == 12
+    assert router.get_statistics('bot-3')['total_hands'] == 1
+    
+    etag = router.get_statistics_etag()
+    db = router.for_formkey('bot-5')
+    state = finished_state(['XH', '9C'], ['XS', '8C'], 'LOST', player_value=19, dealer_value=20)
+    db.update_hand_outcome(db.store_hand(state, {'coins': 100}, '2024-01-01T00:00:00', 'bot-5'), state, 'bot-5')
+    assert router.get_statistics_etag() != etag
+    assert router.get_statistics()['total_hands'] == 13
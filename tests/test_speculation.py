@@ -0,0 +1,50 @@
+from strategy_replay import ConformanceReplay
+from states import finished_state, playing_state
+
+FINAL = finished_state(['9H', '5C', '2D', '4S'], ['XS', '7C'], 'WON', payout=10, player_value=20)
+
+# Taken from the map returned with the hit at 14: hit on the 2 (16), stay on the 4 (20)
+LOCAL_ACTIONS = [
+    {'action': 'hit', 'player_value': 16, 'dealer_value': 10},
+    {'action': 'stay', 'player_value': 20, 'dealer_value': 10}
+]
+
+def test_local_action_states_follow_the_reported_hand(server):
+    states = server.local_action_states(FINAL, LOCAL_ACTIONS)
+    
+    assert [state['player'] for state in states] == [['9H', '5C', '2D'], ['9H', '5C', '2D', '4S']]
+    assert all(state['status'] == 'PLAYING' and state['dealer'] == ['XS', '?'] for state in states)
+    assert states[0]['actions'] == ['HIT', 'STAY']
+
+def test_local_action_cards_sent_by_the_client_win(server):
+    actions = [dict(LOCAL_ACTIONS[0], cards=['9H', '5C', '2D'])]
+    assert server.local_action_states(FINAL, actions)[0]['player'] == ['9H', '5C', '2D']
+
+def test_local_action_from_another_hand_has_no_state(server):
+    assert server.local_action_states(playing_state(['XH', 'XC']), LOCAL_ACTIONS) == [None, None]
+
+def test_speculated_hand_replays_without_false_mismatches(server):
+    client = server.app.test_client()
+    response = client.post('/game_state', json={'state': playing_state(['9H', '5C']), 'formkey': 'alice',
+                                                'speculate': 2}).get_json()
+    assert response['action'] == 'hit'
+    assert response['next']['2']['action'] == 'hit'
+    assert response['next']['2']['next']['4']['action'] == 'stay'
+    
+    response = client.post('/game_state', json={'state': FINAL, 'formkey': 'alice',
+                                                'local_actions': LOCAL_ACTIONS}).get_json()
+    assert response['action'] == 'none'
+    
+    cells = ConformanceReplay(server.databases.for_formkey('alice').db_path).run()
+    assert set(cells) == {(14, 10), (16, 10), (20, 10)}
+    assert sum(cell['mismatches'] for cell in cells.values()) == 0
+    assert sum(cell['conform_hands'] for cell in cells.values()) == 3
+
+def test_local_actions_without_state_are_not_replayed(server):
+    client = server.app.test_client()
+    client.post('/game_state', json={'state': playing_state(['XH', 'XC']), 'formkey': 'bob',
+                                     'local_actions': LOCAL_ACTIONS})
+    
+    cells = ConformanceReplay(server.databases.for_formkey('bob').db_path).run()
+    assert set(cells) == {(20, 10)}
+    assert cells[(20, 10)]['decisions'] == 1
@@ -0,0 +1,37 @@
+from states import finished_state, playing_state
+
+def play_hand(client, formkey):
+    """One hand through /game_state: a decision, then the finished state"""
+    client.post('/game_state', json={'state': playing_state(['9H', '5C']), 'formkey': formkey})
+    final = finished_state(['9H', '5C', '4D'], ['XS', '7C'], 'WON', payout=10, player_value=18)
+    client.post('/game_state', json={'state': final, 'formkey': formkey})
+
+def test_matching_etag_gets_304(server):
+    client = server.app.test_client()
+    play_hand(client, 'alice')
+    
+    first = client.get('/stats?formkey=alice')
+    assert first.status_code == 200
+    assert first.get_json()['total_hands'] == 1
+    etag = first.headers['ETag']
+    
+    again = client.get('/stats?formkey=alice', headers={'If-None-Match': etag})
+    assert again.status_code == 304
+    assert again.data == b''
+    assert again.headers['ETag'] == etag
+
+def test_new_hand_changes_only_its_formkeys_etag(server):
+    client = server.app.test_client()
+    play_hand(client, 'alice')
+    alice = client.get('/stats?formkey=alice').headers['ETag']
+    bob = client.get('/stats?formkey=bob').headers['ETag']
+    overall = client.get('/stats').headers['ETag']
+    
+    play_hand(client, 'alice')
+    
+    response = client.get('/stats?formkey=alice', headers={'If-None-Match': alice})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != alice
+    assert response.get_json()['total_hands'] == 2
+    assert client.get('/stats', headers={'If-None-Match': overall}).status_code == 200
+    assert client.get('/stats?formkey=bob', headers={'If-None-Match': bob}).status_code == 304
@@ -0,0 +1,75 @@
+import pytest
+
+import strategy_compare
+from strategy_compare import (
+    PLAYER_DRAWS, RANK_CARDS, STREAM_CARDS, StrategyComparison, play_hand
+)
+from strategy_replay import load_strategy
+
+class Scripted:
+    """Strategy that plays a fixed action for its first decisions, then stays"""
+    
+    def __init__(self, *actions):
+        self.actions = list(actions)
+    
+    def get_action(self, player_value, dealer_value, available_actions, is_split=False, cards=None):
+        return self.actions.pop(0) if self.actions else ('stay_split' if is_split else 'stay')
+
+class AlwaysHit:
+    def get_action(self, player_value, dealer_value, available_actions, is_split=False, cards=None):
+        return 'hit_split' if is_split else 'hit'
+
+def stream(player, dealer, player_draws=(), dealer_draws=()):
+    """A pre-dealt stream from rank characters; undrawn cards are 2s"""
+    player_draws = list(player_draws) + ['2'] * (PLAYER_DRAWS - len(player_draws))
+    cards = list(player) + list(dealer) + player_draws + list(dealer_draws)
+    cards += ['2'] * (STREAM_CARDS - len(cards))
+    assert len(cards) == STREAM_CARDS
+    return [RANK_CARDS.index(card) for card in cards]
+
+def play(strategy, *args, **kwargs):
+    return play_hand(strategy, {}, stream(*args, **kwargs))
+
+def test_dealer_peek_settles_before_the_player_acts():
+    assert play(Scripted('hit'), '97', 'AX') == -1.0
+    assert play(Scripted(), 'AX', 'XA') == 0.0
+
+def test_player_natural_pays_three_to_two():
+    assert play(Scripted(), 'XA', '97') == 1.5
+
+def test_bust_loses_without_the_dealer_drawing():
+    assert play(Scripted('hit'), 'X6', 'X2', player_draws='X', dealer_draws='X') == -1.0
+
+def test_double_takes_one_card_at_twice_the_stake():
+    assert play(Scripted('double'), '56', 'X7', player_draws='X') == 2.0
+    assert play(Scripted('double'), '56', 'X7', player_draws='2') == -2.0
+
+def test_split_plays_two_hands():
+    # Split 8s: the split hand draws first (18), the main hand next (8 + 2, hit to 19)
+    assert play(Scripted('split', 'stay_split', 'hit'), '88', 'X7', player_draws='X29') == 2.0
+    assert play(Scripted('split'), '88', 'X7', player_draws='X2') == 0.0
+
+@pytest.fixture
+def fake_strategies(monkeypatch):
+    basic = load_strategy('basic_strategy')
+    strategies = {'basic': lambda: basic, 'basic_again': lambda: basic, 'always_hit': AlwaysHit}
+    monkeypatch.setattr(strategy_compare, 'load_strategy', lambda name: strategies[name]())
+
+def test_strategy_against_itself_is_identical_and_undecided(fake_strategies):
+    comparison = StrategyComparison(['basic', 'basic_again'], max_hands=4000, batch_size=2000, seed=1)
+    summary = comparison.run()
+    result = summary['comparisons']['basic_again']
+    assert result['identical'] == 1.0
+    assert result['estimate'] == 0.0
+    assert result['verdict'] == 'undecided'
+    assert summary['hands'] == 4000 and not summary['stopped_early']
+
+def test_clearly_worse_challenger_stops_early(fake_strategies):
+    comparison = StrategyComparison(['basic', 'always_hit'], max_hands=200000, batch_size=2000, seed=1)
+    summary = comparison.run()
+    assert summary['comparisons']['always_hit']['verdict'] == 'worse'
+    assert summary['stopped_early'] and summary['hands'] < 200000
+
+def test_same_strategy_twice_is_rejected():
+    with pytest.raises(ValueError):
+        StrategyComparison(['basic', 'basic'])
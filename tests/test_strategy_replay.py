@@ -0,0 +1,62 @@
+import sqlite3
+
+from strategy_replay import ConformanceReplay
+from states import finished_state, playing_state
+
+def play_delta_hand(server, formkey='alice'):
+    """9+2 against a ten: hit to 14, hit to 19, stay, then win, all over /game_delta"""
+    deltas = [
+        {'seq': 1, 'full_state': playing_state(['9H', '2C'])},
+        {'seq': 2, 'append': {'player': ['3D']}},
+        {'seq': 3, 'append': {'player': ['5S']}},
+        {'seq': 4, 'set': {'status': 'WON', 'payout': 10, 'dealer': ['XS', '7C'], 'dealer_value': 17,
+                           'player_value': 19, 'actions': ['DEAL']}}
+    ]
+    actions = []
+    for delta in deltas:
+        response, status = server.game_delta_response(dict(delta, formkey=formkey))
+        assert status == 200
+        actions.append(response['action'])
+    assert actions == ['hit', 'hit', 'stay', 'none']
+
+def situation_rows(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return sorted(conn.execute('''
+            SELECT s.hand_class, s.total, s.upcard, s.action, p.hand_id
+            FROM situation_postings p JOIN situations s ON s.id = p.situation_id
+        ''').fetchall())
+    finally:
+        conn.close()
+
+def test_replay_uses_decision_time_state_of_delta_hands(server):
+    play_delta_hand(server)
+    db_path = server.databases.for_formkey('alice').db_path
+    
+    cells = ConformanceReplay(db_path).run()
+    
+    assert sum(cell['decisions'] for cell in cells.values()) == 3
+    assert sum(cell['mismatches'] for cell in cells.values()) == 0
+    assert set(cells) == {(11, 10), (14, 10), (19, 10)}
+
+def test_replay_of_game_state_hands(server):
+    client = server.app.test_client()
+    for state in (playing_state(['9H', '2C']), playing_state(['9H', '2C', '3D']),
+                  finished_state(['9H', '2C', '3D', '5S'], ['XS', '7C'], 'WON', payout=10, player_value=19)):
+        assert client.post('/game_state', json={'state': state, 'formkey': 'bob'}).status_code == 200
+    
+    cells = ConformanceReplay(server.databases.for_formkey('bob').db_path).run()
+    
+    assert set(cells) == {(11, 10), (14, 10)}
+    assert all(cell['mismatches'] == 0 and cell['conform_net'] == 5 for cell in cells.values())
+
+def test_situation_rebuild_matches_write_time_index(server):
+    play_delta_hand(server)
+    database = server.databases.for_formkey('alice')
+    written = situation_rows(database.db_path)
+    
+    database.rebuild_situation_index()
+    
+    assert situation_rows(database.db_path) == written
+    assert [row[:4] for row in written] == [('hard', 11, 'X', 'hit'), ('hard', 14, 'X', 'hit'),
+                                            ('hard', 19, 'X', 'stay')]